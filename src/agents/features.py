@@ -0,0 +1,444 @@
+import math
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from agents.state import AgentState, payload, store_payload
+from tools.api import INTERVALS, prices_to_df
+from tools.market_panel import (MARKET_BENCHMARK, benchmark_panel, relative_strength,
+                                rolling_beta, rolling_correlation, sector_benchmark)
+from tools.transport import ReplayMiss
+
+# 指标注册表：名称 -> build(frame, *params)
+INDICATORS: Dict[str, Callable[..., Any]] = {}
+
+
+def register_indicator(name: str):
+    """Register an indicator builder under name; builders take (frame, *params)"""
+    def decorator(build):
+        INDICATORS[name] = build
+        return build
+    return decorator
+
+
+class IndicatorProfiler:
+    """Thread-safe per-indicator compute counts and self time across runs"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _indicator_stats(self, name: str) -> Dict[str, float]:
+        return self._stats.setdefault(
+            name, {"computed": 0, "hits": 0, "seconds": 0.0})
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._indicator_stats(name)
+            stats["computed"] += 1
+            stats["seconds"] += seconds
+
+    def record_hit(self, name: str):
+        with self._lock:
+            self._indicator_stats(name)["hits"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Statistics per indicator, most expensive first"""
+        with self._lock:
+            ordered = sorted(self._stats.items(),
+                             key=lambda item: item[1]["seconds"], reverse=True)
+            return {
+                name: {
+                    **counts,
+                    "mean_ms": counts["seconds"] / counts["computed"] * 1000 if counts["computed"] else 0.0,
+                }
+                for name, counts in ordered
+            }
+
+    def report(self) -> str:
+        """Text table of where indicator time goes"""
+        lines = [f"{'Indicator':<24} {'Computed':>8} {'Hits':>8} {'Total ms':>10} {'Mean ms':>9}",
+                 "-" * 63]
+        for name, s in self.stats().items():
+            lines.append(f"{name:<24} {s['computed']:>8} {s['hits']:>8} "
+                         f"{s['seconds'] * 1000:>10.2f} {s['mean_ms']:>9.3f}")
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+indicator_profiler = IndicatorProfiler()
+
+
+class FeatureFrame:
+    """
+    Columnar store of the price-derived series shared by the agents of one run.
+
+    Raw OHLCV columns come from the prices DataFrame. Derived columns are
+    evaluated through the indicator registry on first request and kept, so an
+    indicator is computed at most once per graph run and never if no strategy
+    asks for it.
+    """
+
+    RAW_COLUMNS = ("open", "high", "low", "close", "volume")
+
+    def __init__(self, prices_df: pd.DataFrame, profiler: IndicatorProfiler = indicator_profiler,
+                 benchmarks: Dict[str, pd.Series] = None, periods_per_year: int = 252):
+        self.df = prices_df
+        self.profiler = profiler
+        # 年化所用的每年 bar 数（日线 252，分钟/小时线见 tools.api.INTERVALS）
+        self.periods_per_year = periods_per_year
+        # 基准收盘价（如 {"market": SPY, "sector": XLK}），已按日期对齐
+        self.benchmarks = {
+            name: closes.reindex(prices_df.index)
+            for name, closes in (benchmarks or {}).items()
+        }
+        self._columns: Dict[Hashable, Any] = {}
+        # 嵌套计算时子指标耗时，用于得到各指标自身耗时
+        self._child_seconds: List[float] = []
+
+    @classmethod
+    def from_prices(cls, prices, benchmarks: Dict[str, pd.Series] = None,
+                    periods_per_year: int = 252) -> "FeatureFrame":
+        return cls(prices_to_df(prices), benchmarks=benchmarks,
+                   periods_per_year=periods_per_year)
+
+    def __len__(self):
+        return len(self.df)
+
+    def compute(self, name: str, *params):
+        """Evaluate a registered indicator, memoized on (name, *params)"""
+        key = (name, *params)
+        if key in self._columns:
+            self.profiler.record_hit(name)
+            return self._columns[key]
+
+        build = INDICATORS.get(name)
+        if build is None:
+            raise KeyError(f"Unknown indicator: {name}")
+
+        self._child_seconds.append(0.0)
+        start = time.perf_counter()
+        try:
+            value = build(self, *params)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._child_seconds.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+        self.profiler.record(name, elapsed - children)
+        self._columns[key] = value
+        return value
+
+    def require(self, specs: Sequence[Tuple]) -> Dict[Tuple, Any]:
+        """Evaluate the declared (name, *params) indicator specs"""
+        return {tuple(spec): self.compute(*spec) for spec in specs}
+
+    def computed(self) -> List[Tuple]:
+        """Keys of the indicators evaluated so far"""
+        return list(self._columns)
+
+    def series(self, name: str) -> pd.Series:
+        """A raw OHLCV column or a derived series addressed by name"""
+        if name in self.RAW_COLUMNS:
+            return self.df[name]
+        if name in ("returns", "log_returns"):
+            return self.compute(name)
+        raise KeyError(f"Unknown feature column: {name}")
+
+    @property
+    def close(self) -> pd.Series:
+        return self.df["close"]
+
+    @property
+    def volume(self) -> pd.Series:
+        return self.df["volume"]
+
+    def returns(self) -> pd.Series:
+        """Close-to-close simple returns"""
+        return self.compute("returns")
+
+    def log_returns(self) -> pd.Series:
+        return self.compute("log_returns")
+
+    def ema(self, span: int, column: str = "close") -> pd.Series:
+        return self.compute("ema", span, column)
+
+    def rolling_mean(self, window: int, column: str = "close") -> pd.Series:
+        return self.compute("rolling_mean", window, column)
+
+    def rolling_std(self, window: int, column: str = "close") -> pd.Series:
+        return self.compute("rolling_std", window, column)
+
+    def rolling_sum(self, window: int, column: str = "returns") -> pd.Series:
+        return self.compute("rolling_sum", window, column)
+
+    def rolling_max(self, window: int, column: str = "close") -> pd.Series:
+        return self.compute("rolling_max", window, column)
+
+    def bollinger_bands(self, window: int = 20, num_std: float = 2):
+        """Upper and lower Bollinger Bands built from the shared rolling stats"""
+        return self.compute("bollinger", window, num_std)
+
+    def rsi(self, period: int = 14) -> pd.Series:
+        return self.compute("rsi", period)
+
+    def true_range(self) -> pd.Series:
+        return self.compute("true_range")
+
+    def atr(self, period: int = 14) -> pd.Series:
+        return self.compute("atr", period)
+
+    def adx(self, period: int = 14) -> pd.DataFrame:
+        return self.compute("adx", period)
+
+    def historical_volatility(self, window: int = 21) -> pd.Series:
+        """Annualized rolling volatility of returns"""
+        return self.compute("historical_volatility", window)
+
+    def obv(self) -> pd.Series:
+        """On-Balance Volume"""
+        return self.compute("obv")
+
+    def benchmark_returns(self, benchmark: str = "market"):
+        """Returns of a benchmark aligned to the prices, None if not loaded"""
+        return self.compute("benchmark_returns", benchmark)
+
+    def beta(self, window: int = 63, benchmark: str = "market"):
+        return self.compute("beta", window, benchmark)
+
+    def correlation(self, window: int = 63, benchmark: str = "market"):
+        return self.compute("correlation", window, benchmark)
+
+    def relative_strength(self, window: int = 63, benchmark: str = "market"):
+        return self.compute("relative_strength", window, benchmark)
+
+
+##### Indicators #####
+@register_indicator("returns")
+def _returns(frame: FeatureFrame):
+    return frame.close.pct_change()
+
+
+@register_indicator("log_returns")
+def _log_returns(frame: FeatureFrame):
+    return np.log(frame.close / frame.close.shift())
+
+
+@register_indicator("ema")
+def _ema(frame: FeatureFrame, span: int, column: str = "close"):
+    return frame.series(column).ewm(span=span, adjust=False).mean()
+
+
+@register_indicator("rolling_mean")
+def _rolling_mean(frame: FeatureFrame, window: int, column: str = "close"):
+    return frame.series(column).rolling(window).mean()
+
+
+@register_indicator("rolling_std")
+def _rolling_std(frame: FeatureFrame, window: int, column: str = "close"):
+    return frame.series(column).rolling(window).std()
+
+
+@register_indicator("rolling_sum")
+def _rolling_sum(frame: FeatureFrame, window: int, column: str = "returns"):
+    return frame.series(column).rolling(window).sum()
+
+
+@register_indicator("rolling_max")
+def _rolling_max(frame: FeatureFrame, window: int, column: str = "close"):
+    return frame.series(column).rolling(window).max()
+
+
+@register_indicator("bollinger")
+def _bollinger(frame: FeatureFrame, window: int = 20, num_std: float = 2):
+    sma = frame.rolling_mean(window)
+    std_dev = frame.rolling_std(window)
+    return sma + std_dev * num_std, sma - std_dev * num_std
+
+
+@register_indicator("macd")
+def _macd(frame: FeatureFrame, fast: int = 12, slow: int = 26, signal: int = 9):
+    macd_line = frame.ema(fast) - frame.ema(slow)
+    return macd_line, macd_line.ewm(span=signal, adjust=False).mean()
+
+
+@register_indicator("rsi")
+def _rsi(frame: FeatureFrame, period: int = 14):
+    delta = frame.close.diff()
+    gain = (delta.where(delta > 0, 0)).fillna(0)
+    loss = (-delta.where(delta < 0, 0)).fillna(0)
+    avg_gain = gain.rolling(window=period).mean()
+    avg_loss = loss.rolling(window=period).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+@register_indicator("true_range")
+def _true_range(frame: FeatureFrame):
+    prev_close = frame.close.shift()
+    high, low = frame.df["high"], frame.df["low"]
+    return pd.concat([high - low, (high - prev_close).abs(),
+                      (low - prev_close).abs()], axis=1).max(axis=1)
+
+
+@register_indicator("atr")
+def _atr(frame: FeatureFrame, period: int = 14):
+    return frame.true_range().rolling(period).mean()
+
+
+@register_indicator("adx")
+def _adx(frame: FeatureFrame, period: int = 14):
+    high, low = frame.df["high"], frame.df["low"]
+    tr_ema = frame.true_range().ewm(span=period).mean()
+
+    # Directional Movement
+    up_move = high - high.shift()
+    down_move = low.shift() - low
+    plus_dm = pd.Series(np.where(
+        (up_move > down_move) & (up_move > 0), up_move, 0), index=high.index)
+    minus_dm = pd.Series(np.where(
+        (down_move > up_move) & (down_move > 0), down_move, 0), index=high.index)
+
+    plus_di = 100 * (plus_dm.ewm(span=period).mean() / tr_ema)
+    minus_di = 100 * (minus_dm.ewm(span=period).mean() / tr_ema)
+    dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
+    adx = dx.ewm(span=period).mean()
+    return pd.DataFrame({"adx": adx, "+di": plus_di, "-di": minus_di})
+
+
+@register_indicator("historical_volatility")
+def _historical_volatility(frame: FeatureFrame, window: int = 21):
+    return frame.rolling_std(window, "returns") * math.sqrt(frame.periods_per_year)
+
+
+@register_indicator("obv")
+def _obv(frame: FeatureFrame):
+    direction = np.sign(frame.close.diff()).fillna(0)
+    return (direction * frame.volume).cumsum()
+
+
+@register_indicator("ichimoku")
+def _ichimoku(frame: FeatureFrame):
+    high, low = frame.df["high"], frame.df["low"]
+    tenkan_sen = (high.rolling(window=9).max() + low.rolling(window=9).min()) / 2
+    kijun_sen = (high.rolling(window=26).max() + low.rolling(window=26).min()) / 2
+    return {
+        "tenkan_sen": tenkan_sen,
+        "kijun_sen": kijun_sen,
+        "senkou_span_a": ((tenkan_sen + kijun_sen) / 2).shift(26),
+        "senkou_span_b": ((high.rolling(window=52).max() +
+                           low.rolling(window=52).min()) / 2).shift(26),
+        "chikou_span": frame.close.shift(-26),
+    }
+
+
+@register_indicator("benchmark_returns")
+def _benchmark_returns(frame: FeatureFrame, benchmark: str = "market"):
+    closes = frame.benchmarks.get(benchmark)
+    if closes is None or closes.isna().all():
+        return None
+    return closes.pct_change()
+
+
+@register_indicator("beta")
+def _beta(frame: FeatureFrame, window: int = 63, benchmark: str = "market"):
+    benchmark_returns = frame.benchmark_returns(benchmark)
+    if benchmark_returns is None:
+        return None
+    return rolling_beta(frame.returns(), benchmark_returns, window)
+
+
+@register_indicator("correlation")
+def _correlation(frame: FeatureFrame, window: int = 63, benchmark: str = "market"):
+    benchmark_returns = frame.benchmark_returns(benchmark)
+    if benchmark_returns is None:
+        return None
+    return rolling_correlation(frame.returns(), benchmark_returns, window)
+
+
+@register_indicator("relative_strength")
+def _relative_strength(frame: FeatureFrame, window: int = 63, benchmark: str = "market"):
+    if frame.benchmark_returns(benchmark) is None:
+        return None
+    return relative_strength(frame.close, frame.benchmarks[benchmark], window)
+
+
+def as_feature_frame(prices) -> FeatureFrame:
+    """Accept a FeatureFrame or a prices DataFrame"""
+    if isinstance(prices, FeatureFrame):
+        return prices
+    return FeatureFrame(prices)
+
+
+def uses_indicators(*specs: Tuple):
+    """
+    Declare the indicators a strategy reads as (name, *params) specs.
+
+    The wrapped strategy receives a FeatureFrame with exactly those indicators
+    evaluated; nothing else is computed on its behalf.
+    """
+    for spec in specs:
+        if spec[0] not in INDICATORS:
+            raise KeyError(f"Unknown indicator: {spec[0]}")
+
+    def decorator(strategy):
+        @wraps(strategy)
+        def wrapper(prices, *args, **kwargs):
+            features = as_feature_frame(prices)
+            features.require(specs)
+            return strategy(features, *args, **kwargs)
+        wrapper.indicators = specs
+        return wrapper
+    return decorator
+
+
+def get_feature_frame(data: Dict[str, Any]) -> FeatureFrame:
+    """The run's FeatureFrame, built from data["prices"] if the stage did not run"""
+    features = payload(data, "features")
+    if features is None:
+        features = FeatureFrame.from_prices(
+            payload(data, "prices"), periods_per_year=_periods_per_year(data))
+    return features
+
+
+def _periods_per_year(data: Dict[str, Any]) -> int:
+    return INTERVALS[data.get("interval", "1d")]["periods_per_year"]
+
+
+def load_benchmarks(data: Dict[str, Any]) -> Dict[str, pd.Series]:
+    """Market and sector benchmark closes for the run, served from the session panel"""
+    # 基准面板为日线，分钟/小时线不做对齐
+    if data.get("interval", "1d") != "1d":
+        return {}
+
+    symbols = {"market": MARKET_BENCHMARK}
+    sector_etf = sector_benchmark(
+        (data.get("market_data") or {}).get("sector"))
+    if sector_etf:
+        symbols["sector"] = sector_etf
+
+    try:
+        closes = benchmark_panel.closes(data["start_date"], data["end_date"])
+    except ReplayMiss:
+        raise
+    except Exception as e:
+        print(f"Warning: Error loading benchmark prices: {e}")
+        return {}
+    return {name: closes[symbol] for name, symbol in symbols.items()
+            if symbol in closes.columns}
+
+
+##### Feature Frame Stage #####
+def feature_frame_agent(state: AgentState):
+    """Builds the shared feature frame right after market data is gathered"""
+    data = state["data"]
+    features = FeatureFrame.from_prices(
+        payload(data, "prices"), load_benchmarks(data), _periods_per_year(data))
+    return {"data": {"features": store_payload("features", features)}}
@@ -1,15 +1,14 @@
-from langchain_core.messages import HumanMessage
-
-from agents.state import AgentState, show_agent_reasoning
-
-import json
+from agents.state import AgentState, payload, show_agent_reasoning
+from agents.node_cache import memoize_node
+from agents.signals import AgentSignal
 
 ##### Fundamental Agent #####
+@memoize_node("fundamentals_agent", ("financial_metrics",), "Fundamental Analysis Agent")
 def fundamentals_agent(state: AgentState):
     """Analyzes fundamental data and generates trading signals."""
     show_reasoning = state["metadata"]["show_reasoning"]
     data = state["data"]
-    metrics = data["financial_metrics"][0]
+    metrics = payload(data, "financial_metrics")[0]
 
     # Initialize signals list for different fundamental aspects
     signals = []
@@ -134,23 +133,11 @@ def fundamentals_agent(state: AgentState):
     total_signals = len(signals)
     confidence = max(bullish_signals, bearish_signals) / total_signals
     
-    message_content = {
-        "signal": overall_signal,
-        "confidence": f"{round(confidence * 100)}%",
-        "reasoning": reasoning
-    }
-    
-    # Create the fundamental analysis message
-    message = HumanMessage(
-        content=json.dumps(message_content),
-        name="fundamentals_agent",
-    )
-    
+    signal = AgentSignal("fundamentals_agent",
+                         overall_signal, confidence, reasoning)
+
     # Print the reasoning if the flag is set
     if show_reasoning:
-        show_agent_reasoning(message_content, "Fundamental Analysis Agent")
-    
-    return {
-        "messages": [message],
-        "data": data,
-    }
+        show_agent_reasoning(signal.to_dict(), "Fundamental Analysis Agent")
+
+    return {"signals": {"fundamentals_agent": signal}}
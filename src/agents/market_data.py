@@ -1,52 +1,80 @@
 from langchain_core.messages import HumanMessage
 from tools.openrouter_config import get_chat_completion
-from agents.state import AgentState
-from tools.api import get_financial_metrics, get_financial_statements, get_insider_trades, get_market_data, get_price_history
+from agents.state import AgentState, payload, store_payload
+from tools.api import INTERVALS, get_financial_metrics, get_financial_statements, get_insider_trades, get_market_data, get_price_history
+from tools.fundamentals_store import fundamentals_store, insider_trades_as_of, is_historical
 
 from datetime import datetime, timedelta
 
 
+def lookback_start(start_date: str, current_date: str, interval: str = "1d") -> str:
+    """Start of the price history the agent needs: start_date, or earlier to cover the lookback"""
+    # 确保至少有一年的历史数据用于技术分析（分钟/小时线受 yfinance 回看上限约束）
+    lookback_days = INTERVALS[interval]["max_lookback_days"] or 365
+    current_date_obj = datetime.strptime(current_date, '%Y-%m-%d')
+    min_start_date = (current_date_obj - timedelta(days=min(lookback_days, 365))
+                      ).strftime('%Y-%m-%d')
+
+    # 使用原始的start_date和min_start_date中较早的那个
+    return min(start_date, min_start_date) if start_date else min_start_date
+
+
 def market_data_agent(state: AgentState):
     """Responsible for gathering and preprocessing market data"""
-    messages = state["messages"]
     data = state["data"]
 
     # Get current_date from state
     current_date = data.get("current_date") or data["end_date"]
-
-    # 确保至少有一年的历史数据用于技术分析
-    current_date_obj = datetime.strptime(current_date, '%Y-%m-%d')
-    min_start_date = (current_date_obj - timedelta(days=365)
-                      ).strftime('%Y-%m-%d')
-
-    # 使用原始的start_date和min_start_date中较早的那个
-    original_start_date = data["start_date"]
-    start_date = min(original_start_date,
-                     min_start_date) if original_start_date else min_start_date
+    interval = data.get("interval", "1d")
+    start_date = lookback_start(data["start_date"], current_date, interval)
 
     # Get all required data
     ticker = data["ticker"]
 
-    # 获取从start_date到current_date的所有数据
-    prices = get_price_history(ticker, start_date, current_date)
+    # 获取从start_date到current_date的所有数据（调用方已提供价格时直接使用）
+    prices = payload(data, "prices")
+    if prices is None:
+        prices = get_price_history(
+            ticker, start_date, current_date, interval=interval)
 
     # 获取当前日期的财务和市场数据
-    financial_metrics = get_financial_metrics(ticker)
-    financial_line_items = get_financial_statements(ticker)
-    insider_trades = get_insider_trades(ticker)
-    market_data = get_market_data(ticker)
+    # 历史日期（回测）使用时点基本面：只用决策日前已公布的报表，市值按当日收盘价计算
+    as_of = current_date[:10] if is_historical(current_date[:10]) else None
+    price = float(prices.close[-1]) if as_of is not None and len(prices) else None
+    # 调用方（如决策服务）已为当日取好的报表数据直接使用
+    financial_metrics = payload(data, "financial_metrics")
+    if financial_metrics is None:
+        financial_metrics = get_financial_metrics(ticker, as_of=as_of, price=price)
+    financial_line_items = payload(data, "financial_line_items")
+    if financial_line_items is None:
+        financial_line_items = get_financial_statements(ticker, as_of=as_of)
+    # 回测开始时预取的公司信息和内部交易由各交易日共用
+    insider_trades = payload(data, "insider_trades")
+    if insider_trades is None:
+        insider_trades = get_insider_trades(ticker)
+    market_data = data.get("market_data")
+    if market_data is None:
+        market_data = get_market_data(ticker)
+    if as_of is not None:
+        # 历史日期：除行业分类外的市场数据按决策日计算，内部交易只看决策日之前的
+        insider_trades = insider_trades_as_of(insider_trades, as_of)
+        point_in_time = fundamentals_store.market_data(ticker, as_of, prices)
+        if not point_in_time["market_cap"]:
+            # 报表中没有股数时只能沿用当前市值
+            point_in_time["market_cap"] = market_data["market_cap"]
+        market_data = {**market_data, **point_in_time}
 
+    # 价格历史和财务数据放进本次运行的存储，state 中只保留句柄
     return {
-        "messages": messages,
         "data": {
-            **data,
-            "prices": prices,
+            "prices": store_payload("prices", prices),
             "start_date": start_date,
             "end_date": current_date,
             "current_date": current_date,
-            "financial_metrics": financial_metrics,
-            "financial_line_items": financial_line_items,
-            "insider_trades": insider_trades,
+            "interval": interval,
+            "financial_metrics": store_payload("financial_metrics", financial_metrics),
+            "financial_line_items": store_payload("financial_line_items", financial_line_items),
+            "insider_trades": store_payload("insider_trades", insider_trades),
             "market_cap": market_data["market_cap"],
             "market_data": market_data,
         }
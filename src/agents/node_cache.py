@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Sequence
+
+from agents.state import payload, show_agent_reasoning
+from tools.instrumentation import tracer
+
+# 随调用日期变化但不影响计算结果的字段，不参与指纹计算
+VOLATILE_FIELDS = ("days_since_update",)
+
+
+def fingerprint(obj: Any) -> str:
+    """Stable hash of a JSON-like object (key order independent)"""
+    payload = json.dumps(obj, sort_keys=True, default=str,
+                         separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _without_fields(obj: Any, fields: Sequence[str]) -> Any:
+    if isinstance(obj, dict):
+        return {k: _without_fields(v, fields) for k, v in obj.items() if k not in fields}
+    if isinstance(obj, (list, tuple)):
+        return [_without_fields(item, fields) for item in obj]
+    return obj
+
+
+class NodeCache:
+    """Thread-safe LRU cache of graph node outputs with per-agent hit/miss counts"""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _agent_stats(self, agent_name: str) -> Dict[str, int]:
+        return self._stats.setdefault(agent_name, {"hits": 0, "misses": 0})
+
+    def get(self, agent_name: str, key: str):
+        with self._lock:
+            entry = self._entries.get((agent_name, key))
+            if entry is None:
+                self._agent_stats(agent_name)["misses"] += 1
+                return None
+            self._entries.move_to_end((agent_name, key))
+            self._agent_stats(agent_name)["hits"] += 1
+            return entry
+
+    def put(self, agent_name: str, key: str, value: Any):
+        with self._lock:
+            self._entries[(agent_name, key)] = value
+            self._entries.move_to_end((agent_name, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss statistics per agent"""
+        with self._lock:
+            result = {}
+            for agent_name, counts in self._stats.items():
+                total = counts["hits"] + counts["misses"]
+                result[agent_name] = {
+                    **counts,
+                    "hit_rate": counts["hits"] / total if total else 0.0,
+                }
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+node_cache = NodeCache()
+
+
+def memoize_node(agent_name: str, input_keys: Sequence[str], display_name: str = None,
+                 volatile_fields: Sequence[str] = VOLATILE_FIELDS, cache: NodeCache = node_cache):
+    """
+    Memoize a pure graph node on a fingerprint of the state["data"] keys it reads.
+
+    The node must be a deterministic function of those keys and must not
+    update state["data"]; what it returns (its signals) is cached. Keys held
+    in the run store are fingerprinted by their payload.
+
+    Args:
+        agent_name: Name used for the cache entries and statistics
+        input_keys: Keys of state["data"] the node depends on
+        display_name: Title used when re-showing cached reasoning
+        volatile_fields: Nested fields left out of the fingerprint
+        cache: Cache instance (defaults to the process-wide node_cache)
+    """
+    def decorator(node):
+        @wraps(node)
+        def wrapper(state):
+            data = state["data"]
+            key = fingerprint(_without_fields(
+                {k: payload(data, k) for k in input_keys}, volatile_fields))
+
+            output = cache.get(agent_name, key)
+            if output is not None:
+                tracer.count("node", agent_name, cache_hits=1)
+                if state["metadata"]["show_reasoning"]:
+                    for signal in output.get("signals", {}).values():
+                        show_agent_reasoning(
+                            signal.to_dict(), display_name or agent_name)
+                return output
+
+            result = node(state)
+            cache.put(agent_name, key, result)
+            return result
+        return wrapper
+    return decorator
@@ -1,5 +1,4 @@
 from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
 from tools.openrouter_config import get_chat_completion
 
 from agents.state import AgentState, show_agent_reasoning
@@ -11,17 +10,8 @@ def portfolio_management_agent(state: AgentState):
     show_reasoning = state["metadata"]["show_reasoning"]
     portfolio = state["data"]["portfolio"]
 
-    # Get the technical analyst, fundamentals agent, and risk management agent messages
-    technical_message = next(
-        msg for msg in state["messages"] if msg.name == "technical_analyst_agent")
-    fundamentals_message = next(
-        msg for msg in state["messages"] if msg.name == "fundamentals_agent")
-    sentiment_message = next(
-        msg for msg in state["messages"] if msg.name == "sentiment_agent")
-    valuation_message = next(
-        msg for msg in state["messages"] if msg.name == "valuation_agent")
-    risk_message = next(
-        msg for msg in state["messages"] if msg.name == "risk_management_agent")
+    # Get the analysts' and risk management signals from the registry
+    signals = state["signals"]
 
     # Create the system message
     system_message = {
@@ -80,11 +70,11 @@ def portfolio_management_agent(state: AgentState):
         "role": "user",
         "content": f"""Based on the team's analysis below, make your trading decision.
 
-            Technical Analysis Trading Signal: {technical_message.content}
-            Fundamental Analysis Trading Signal: {fundamentals_message.content}
-            Sentiment Analysis Trading Signal: {sentiment_message.content}
-            Valuation Analysis Trading Signal: {valuation_message.content}
-            Risk Management Trading Signal: {risk_message.content}
+            Technical Analysis Trading Signal: {signals["technical_analyst_agent"].to_json()}
+            Fundamental Analysis Trading Signal: {signals["fundamentals_agent"].to_json()}
+            Sentiment Analysis Trading Signal: {signals["sentiment_agent"].to_json()}
+            Valuation Analysis Trading Signal: {signals["valuation_agent"].to_json()}
+            Risk Management Trading Signal: {signals["risk_management_agent"].to_json()}
 
             Here is the current portfolio:
             Portfolio:
@@ -129,4 +119,4 @@ def portfolio_management_agent(state: AgentState):
     if show_reasoning:
         show_agent_reasoning(message.content, "Portfolio Management Agent")
 
-    return {"messages": state["messages"] + [message]}
+    return {"messages": [message]}
@@ -1,12 +1,10 @@
 import math
 
-from langchain_core.messages import HumanMessage
-
 from agents.state import AgentState, show_agent_reasoning
-from tools.api import prices_to_df
-
-import json
-import ast
+from agents.signals import RiskAssessment
+from agents.features import get_feature_frame
+from tools.risk_kernels import (drawdown, historical_cvar, historical_var, rolling_volatility,
+                                volatility_zscore)
 
 ##### Risk Management Agent #####
 
@@ -17,53 +15,36 @@ def risk_management_agent(state: AgentState):
     portfolio = state["data"]["portfolio"]
     data = state["data"]
 
-    prices_df = prices_to_df(data["prices"])
-
-    # Fetch messages from other agents
-    technical_message = next(
-        msg for msg in state["messages"] if msg.name == "technical_analyst_agent")
-    fundamentals_message = next(
-        msg for msg in state["messages"] if msg.name == "fundamentals_agent")
-    sentiment_message = next(
-        msg for msg in state["messages"] if msg.name == "sentiment_agent")
-    valuation_message = next(
-        msg for msg in state["messages"] if msg.name == "valuation_agent")
-
-    try:
-        fundamental_signals = json.loads(fundamentals_message.content)
-        technical_signals = json.loads(technical_message.content)
-        sentiment_signals = json.loads(sentiment_message.content)
-        valuation_signals = json.loads(valuation_message.content)
-    except Exception as e:
-        fundamental_signals = ast.literal_eval(fundamentals_message.content)
-        technical_signals = ast.literal_eval(technical_message.content)
-        sentiment_signals = ast.literal_eval(sentiment_message.content)
-        valuation_signals = ast.literal_eval(valuation_message.content)
+    features = get_feature_frame(data)
+    prices_df = features.df
+
+    # Read the other agents' signals from the registry
+    signals = state["signals"]
+    technical_signals = signals["technical_analyst_agent"]
+    fundamental_signals = signals["fundamentals_agent"]
 
     agent_signals = {
         "fundamental": fundamental_signals,
         "technical": technical_signals,
-        "sentiment": sentiment_signals,
-        "valuation": valuation_signals
+        "sentiment": signals["sentiment_agent"],
+        "valuation": signals["valuation_agent"]
     }
 
     # 1. Calculate Risk Metrics
-    returns = prices_df['close'].pct_change().dropna()
+    returns = features.returns().dropna()
     daily_vol = returns.std()
     # Annualized volatility approximation
-    volatility = daily_vol * (252 ** 0.5)
+    volatility = daily_vol * (features.periods_per_year ** 0.5)
 
-    # Calculate volatility distribution
-    rolling_std = returns.rolling(window=120).std() * (252 ** 0.5)
-    volatility_mean = rolling_std.mean()
-    volatility_std = rolling_std.std()
-    volatility_percentile = (volatility - volatility_mean) / volatility_std
+    # Calculate volatility distribution (z-score of the current volatility)
+    rolling_vol = rolling_volatility(returns, 120, features.periods_per_year)
+    volatility_percentile = volatility_zscore(volatility, rolling_vol)
 
-    # Simple historical VaR at 95% confidence
-    var_95 = returns.quantile(0.05)
+    # Historical VaR and expected shortfall at 95% confidence
+    var_95 = historical_var(returns, 0.95)
+    cvar_95 = historical_cvar(returns, 0.95)
     # Calculate max drawdown using 60-day window
-    max_drawdown = (
-        prices_df['close'] / prices_df['close'].rolling(window=60).max() - 1).min()
+    max_drawdown = drawdown(features.close, 60).min()
 
     # 2. Market Risk Assessment
     market_risk_score = 0
@@ -102,20 +83,12 @@ def risk_management_agent(state: AgentState):
         max_position_size = base_position_size  # Keep base size for low risk
 
     # 4. Risk-Adjusted Signals Analysis
-    def parse_confidence(conf_str):
-        try:
-            if isinstance(conf_str, str):
-                return float(conf_str.replace('%', '')) / 100.0
-            return float(conf_str)
-        except:
-            return 0.0
-
     # Check for low confidence signals
-    low_confidence = any(parse_confidence(
-        signal['confidence']) < 0.30 for signal in agent_signals.values())
+    low_confidence = any(
+        signal.confidence < 0.30 for signal in agent_signals.values())
 
     # Check signal divergence
-    unique_signals = set(signal['signal'] for signal in agent_signals.values())
+    unique_signals = set(signal.signal for signal in agent_signals.values())
     signal_divergence = (2 if len(unique_signals) == 3 else 0)
 
     # Calculate final risk score
@@ -125,54 +98,45 @@ def risk_management_agent(state: AgentState):
 
     # 5. Determine Trading Action
     # More flexible approach considering technical signals
-    technical_confidence = parse_confidence(
-        agent_signals['technical']['confidence'])
-    fundamental_confidence = parse_confidence(
-        agent_signals['fundamental']['confidence'])
+    technical_confidence = technical_signals.confidence
 
     if risk_score >= 9:
         trading_action = "hold"  # Extreme risk, force hold
     elif risk_score >= 7:
         # High risk but consider strong technical signals
-        if (technical_signals['signal'] == 'bullish' and technical_confidence > 0.7 and
-                fundamental_signals['signal'] == 'bullish'):
+        if (technical_signals.signal == 'bullish' and technical_confidence > 0.7 and
+                fundamental_signals.signal == 'bullish'):
             trading_action = "buy"
         else:
             trading_action = "reduce"
     else:
         # Normal risk environment
-        if technical_signals['signal'] == 'bullish' and technical_confidence > 0.5:
+        if technical_signals.signal == 'bullish' and technical_confidence > 0.5:
             trading_action = "buy"
-        elif technical_signals['signal'] == 'bearish' and technical_confidence > 0.5:
+        elif technical_signals.signal == 'bearish' and technical_confidence > 0.5:
             trading_action = "sell"
         else:
             trading_action = "hold"
 
-    message_content = {
-        "max_position_size": float(max_position_size),
-        "risk_score": risk_score,
-        "trading_action": trading_action,
-        "risk_metrics": {
+    risk_assessment = RiskAssessment(
+        agent="risk_management_agent",
+        max_position_size=float(max_position_size),
+        risk_score=risk_score,
+        trading_action=trading_action,
+        risk_metrics={
             "volatility": float(volatility),
             "value_at_risk_95": float(var_95),
+            "conditional_var_95": float(cvar_95),
             "max_drawdown": float(max_drawdown),
             "market_risk_score": market_risk_score
         },
-        "reasoning": f"Risk Score {risk_score}/10: Market Risk={market_risk_score}, "
-                     f"Volatility={volatility:.2%}, VaR={var_95:.2%}, "
-                     f"Max Drawdown={max_drawdown:.2%}"
-    }
-
-    # Create the risk management message
-    message = HumanMessage(
-        content=json.dumps(message_content),
-        name="risk_management_agent",
+        reasoning=f"Risk Score {risk_score}/10: Market Risk={market_risk_score}, "
+                  f"Volatility={volatility:.2%}, VaR={var_95:.2%}, CVaR={cvar_95:.2%}, "
+                  f"Max Drawdown={max_drawdown:.2%}"
     )
 
     if show_reasoning:
-        show_agent_reasoning(message_content, "Risk Management Agent")
+        show_agent_reasoning(risk_assessment.to_dict(),
+                             "Risk Management Agent")
 
-    return {
-        "messages": state["messages"] + [message],
-        "data": data,
-    }
+    return {"signals": {"risk_management_agent": risk_assessment}}
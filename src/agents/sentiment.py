@@ -1,8 +1,6 @@
-from langchain_core.messages import HumanMessage
 from agents.state import AgentState, show_agent_reasoning
+from agents.signals import AgentSignal
 from tools.news_crawler import get_stock_news, get_news_sentiment
-from tools.openrouter_config import get_chat_completion
-import json
 from datetime import datetime, timedelta
 
 
@@ -26,37 +24,30 @@ def sentiment_agent(state: AgentState):
                    if datetime.strptime(news['publish_time'], '%Y-%m-%d %H:%M:%S') > cutoff_date]
 
     sentiment_score = get_news_sentiment(
-        recent_news, date=current_date, num_of_news=num_of_news)
+        recent_news, date=current_date, num_of_news=num_of_news, symbol=symbol)
 
     # Generate trading signal and confidence based on sentiment score
     if sentiment_score >= 0.5:
         signal = "bullish"
-        confidence = str(round(abs(sentiment_score) * 100)) + "%"
+        confidence = abs(sentiment_score)
     elif sentiment_score <= -0.5:
         signal = "bearish"
-        confidence = str(round(abs(sentiment_score) * 100)) + "%"
+        confidence = abs(sentiment_score)
     else:
         signal = "neutral"
-        confidence = str(round((1 - abs(sentiment_score)) * 100)) + "%"
+        confidence = 1 - abs(sentiment_score)
 
     # Generate analysis results
-    message_content = {
-        "signal": signal,
-        "confidence": confidence,
-        "reasoning": f"Based on {len(recent_news)} recent news articles up to {current_date}, sentiment score: {sentiment_score:.2f}"
-    }
+    sentiment_signal = AgentSignal(
+        "sentiment_agent",
+        signal,
+        confidence,
+        f"Based on {len(recent_news)} recent news articles up to {current_date}, sentiment score: {sentiment_score:.2f}"
+    )
 
     # Show reasoning if flag is set
     if show_reasoning:
-        show_agent_reasoning(message_content, "Sentiment Analysis Agent")
-
-    # Create message
-    message = HumanMessage(
-        content=json.dumps(message_content),
-        name="sentiment_agent",
-    )
+        show_agent_reasoning(sentiment_signal.to_dict(),
+                             "Sentiment Analysis Agent")
 
-    return {
-        "messages": [message],
-        "data": data,
-    }
+    return {"signals": {"sentiment_agent": sentiment_signal}}
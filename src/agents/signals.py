@@ -0,0 +1,55 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+def format_confidence(confidence: float) -> str:
+    return f"{round(confidence * 100)}%"
+
+
+@dataclass
+class AgentSignal:
+    """An analyst's signal as stored in state["signals"][agent]"""
+    __slots__ = ("agent", "signal", "confidence", "reasoning")
+
+    agent: str
+    signal: str          # bullish | bearish | neutral
+    confidence: float    # 0-1 (valuation gaps may exceed 1)
+    reasoning: Any
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Display/prompt form, matching the agents' original JSON messages"""
+        return {
+            "signal": self.signal,
+            "confidence": format_confidence(self.confidence),
+            "reasoning": self.reasoning,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+@dataclass
+class RiskAssessment:
+    """risk_management_agent's output as stored in state["signals"]"""
+    __slots__ = ("agent", "max_position_size", "risk_score",
+                 "trading_action", "risk_metrics", "reasoning")
+
+    agent: str
+    max_position_size: float
+    risk_score: int
+    trading_action: str
+    risk_metrics: Dict[str, float]
+    reasoning: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_position_size": self.max_position_size,
+            "risk_score": self.risk_score,
+            "trading_action": self.trading_action,
+            "risk_metrics": self.risk_metrics,
+            "reasoning": self.reasoning,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
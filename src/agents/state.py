@@ -1,20 +1,122 @@
-from typing import Annotated, Any, Dict, Sequence, TypedDict
+from typing import Annotated, Any, Dict, List, Optional, Sequence, TypedDict
 
-import operator
+import contextvars
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from langchain_core.messages import BaseMessage
 
 
 import json
 
 
+# 状态通道的合并函数：LangGraph 为每次运行的每个通道新建一个空 dict/list，
+# 节点只返回新增的键或消息，这里原地合并，不再每步复制整个 dict/list。
+# （图在没有 checkpointer 的情况下运行，旧的中间状态不会被再次读取）
+# BinaryOperatorAggregate.from_checkpoint 每次运行都以 typ() 新建通道值，
+# 在 langgraph 0.2.56（pyproject 锁定的版本）和 1.2 上均已验证，见 agents/test_state.py
 def merge_dicts(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
-    return {**a, **b}
+    if b and b is not a:
+        a.update(b)
+    return a
+
+
+def append_messages(a: List[BaseMessage], b: Sequence[BaseMessage]) -> List[BaseMessage]:
+    if b:
+        a.extend(b)
+    return a
+
+
+##### Run Store #####
+# 大对象（价格历史、特征表、财务数据）不放进 state["data"]，而是放进本次运行的
+# 旁路存储，state 里只保存句柄。存储随运行创建、随运行结束释放。
+@dataclass(frozen=True)
+class Handle:
+    """Reference to a payload in the current run's store"""
+    name: str
+
+    def __repr__(self) -> str:
+        return f"<handle {self.name}>"
+
+
+class RunStore:
+    """Large payloads of one graph run, referenced from state["data"] by Handle"""
+
+    def __init__(self):
+        self._payloads: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, value: Any) -> Handle:
+        with self._lock:
+            self._payloads[name] = value
+        return Handle(name)
+
+    def get(self, handle: Handle) -> Any:
+        return self._payloads[handle.name]
+
+    def materialize(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """data with every handle replaced by its payload"""
+        return {key: self.get(value) if isinstance(value, Handle) else value
+                for key, value in data.items()}
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+
+# 当前运行的存储；LangGraph 在工作线程中执行节点时会带上调用方的上下文
+current_store: contextvars.ContextVar[Optional[RunStore]] = contextvars.ContextVar(
+    "current_store", default=None)
+
+
+@contextmanager
+def run_store():
+    """Give the graph run inside the block its own store"""
+    store = RunStore()
+    token = current_store.set(store)
+    try:
+        yield store
+    finally:
+        current_store.reset(token)
+
+
+def store_payload(name: str, value: Any) -> Any:
+    """Keep value in the run's store and return its handle (the value itself outside a run)"""
+    store = current_store.get()
+    return store.put(name, value) if store is not None else value
+
+
+def payload(data: Dict[str, Any], key: str, default: Any = None) -> Any:
+    """
+    data[key], following a handle to the run's store
+
+    Raises:
+        RuntimeError: If data holds a handle and no run store is active
+    """
+    value = data.get(key, default)
+    if isinstance(value, Handle):
+        store = current_store.get()
+        if store is None:
+            raise RuntimeError(
+                f"{key} is {value!r} but no run store is active; run the graph with invoke_graph()")
+        return store.get(value)
+    return value
+
+
+def invoke_graph(app, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoke a compiled graph with a fresh run store; the final state holds the payloads again"""
+    with run_store() as store:
+        final_state = app.invoke(inputs)
+        final_state["data"] = store.materialize(final_state["data"])
+    return final_state
+
 
 # Define agent state
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], operator.add]
+    messages: Annotated[Sequence[BaseMessage], append_messages]
     data: Annotated[Dict[str, Any], merge_dicts]
     metadata: Annotated[Dict[str, Any], merge_dicts]
+    # agent name -> AgentSignal / RiskAssessment (see agents/signals.py)
+    signals: Annotated[Dict[str, Any], merge_dicts]
 
 
 
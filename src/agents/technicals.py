@@ -1,15 +1,20 @@
-import math
 from typing import Dict
 
-from langchain_core.messages import HumanMessage
-
 from agents.state import AgentState, show_agent_reasoning
+from agents.signals import AgentSignal
+from agents.features import as_feature_frame, get_feature_frame, uses_indicators
 
-import json
 import pandas as pd
 import numpy as np
 
-from tools.api import prices_to_df
+# Weights of the strategy ensemble (shared with the cross-sectional screener)
+STRATEGY_WEIGHTS = {
+    'trend': 0.25,
+    'mean_reversion': 0.20,
+    'momentum': 0.25,
+    'volatility': 0.15,
+    'stat_arb': 0.15
+}
 
 
 ##### Technical Analyst #####
@@ -24,200 +29,86 @@ def technical_analyst_agent(state: AgentState):
     """
     show_reasoning = state["metadata"]["show_reasoning"]
     data = state["data"]
-    prices = data["prices"]
-    prices_df = prices_to_df(prices)
-
-    # Calculate indicators
-    # 1. MACD (Moving Average Convergence Divergence)
-    macd_line, signal_line = calculate_macd(prices_df)
-
-    # 2. RSI (Relative Strength Index)
-    rsi = calculate_rsi(prices_df)
-
-    # 3. Bollinger Bands (Bollinger Bands)
-    upper_band, lower_band = calculate_bollinger_bands(prices_df)
-
-    # 4. OBV (On-Balance Volume)
-    obv = calculate_obv(prices_df)
-
-    # Generate individual signals
-    signals = []
-
-    # MACD signal
-    if macd_line.iloc[-2] < signal_line.iloc[-2] and macd_line.iloc[-1] > signal_line.iloc[-1]:
-        signals.append('bullish')
-    elif macd_line.iloc[-2] > signal_line.iloc[-2] and macd_line.iloc[-1] < signal_line.iloc[-1]:
-        signals.append('bearish')
-    else:
-        signals.append('neutral')
-
-    # RSI signal
-    if rsi.iloc[-1] < 30:
-        signals.append('bullish')
-    elif rsi.iloc[-1] > 70:
-        signals.append('bearish')
-    else:
-        signals.append('neutral')
-
-    # Bollinger Bands signal
-    current_price = prices_df['close'].iloc[-1]
-    if current_price < lower_band.iloc[-1]:
-        signals.append('bullish')
-    elif current_price > upper_band.iloc[-1]:
-        signals.append('bearish')
-    else:
-        signals.append('neutral')
-
-    # OBV signal
-    obv_slope = obv.diff().iloc[-5:].mean()
-    if obv_slope > 0:
-        signals.append('bullish')
-    elif obv_slope < 0:
-        signals.append('bearish')
-    else:
-        signals.append('neutral')
-
-    # Add reasoning collection
-    reasoning = {
-        "MACD": {
-            "signal": signals[0],
-            "details": f"MACD Line crossed {'above' if signals[0] == 'bullish' else 'below' if signals[0] == 'bearish' else 'neither above nor below'} Signal Line"
-        },
-        "RSI": {
-            "signal": signals[1],
-            "details": f"RSI is {rsi.iloc[-1]:.2f} ({'oversold' if signals[1] == 'bullish' else 'overbought' if signals[1] == 'bearish' else 'neutral'})"
-        },
-        "Bollinger": {
-            "signal": signals[2],
-            "details": f"Price is {'below lower band' if signals[2] == 'bullish' else 'above upper band' if signals[2] == 'bearish' else 'within bands'}"
-        },
-        "OBV": {
-            "signal": signals[3],
-            "details": f"OBV slope is {obv_slope:.2f} ({signals[3]})"
-        }
-    }
-
-    # Determine overall signal
-    bullish_signals = signals.count('bullish')
-    bearish_signals = signals.count('bearish')
-
-    if bullish_signals > bearish_signals:
-        overall_signal = 'bullish'
-    elif bearish_signals > bullish_signals:
-        overall_signal = 'bearish'
-    else:
-        overall_signal = 'neutral'
-
-    # Calculate confidence level based on the proportion of indicators agreeing
-    total_signals = len(signals)
-    confidence = max(bullish_signals, bearish_signals) / total_signals
-
-    # Generate the message content
-    message_content = {
-        "signal": overall_signal,
-        "confidence": f"{round(confidence * 100)}%",
-        "reasoning": {
-            "MACD": reasoning["MACD"],
-            "RSI": reasoning["RSI"],
-            "Bollinger": reasoning["Bollinger"],
-            "OBV": reasoning["OBV"]
-        }
-    }
+    features = get_feature_frame(data)
 
     # 1. Trend Following Strategy
-    trend_signals = calculate_trend_signals(prices_df)
+    trend_signals = calculate_trend_signals(features)
 
     # 2. Mean Reversion Strategy
-    mean_reversion_signals = calculate_mean_reversion_signals(prices_df)
+    mean_reversion_signals = calculate_mean_reversion_signals(features)
 
     # 3. Momentum Strategy
-    momentum_signals = calculate_momentum_signals(prices_df)
+    momentum_signals = calculate_momentum_signals(features)
 
     # 4. Volatility Strategy
-    volatility_signals = calculate_volatility_signals(prices_df)
+    volatility_signals = calculate_volatility_signals(features)
 
     # 5. Statistical Arbitrage Signals
-    stat_arb_signals = calculate_stat_arb_signals(prices_df)
+    stat_arb_signals = calculate_stat_arb_signals(features)
 
     # Combine all signals using a weighted ensemble approach
-    strategy_weights = {
-        'trend': 0.25,
-        'mean_reversion': 0.20,
-        'momentum': 0.25,
-        'volatility': 0.15,
-        'stat_arb': 0.15
-    }
-
     combined_signal = weighted_signal_combination({
         'trend': trend_signals,
         'mean_reversion': mean_reversion_signals,
         'momentum': momentum_signals,
         'volatility': volatility_signals,
         'stat_arb': stat_arb_signals
-    }, strategy_weights)
+    }, STRATEGY_WEIGHTS)
 
     # Generate detailed analysis report
-    analysis_report = {
-        "signal": combined_signal['signal'],
-        "confidence": f"{round(combined_signal['confidence'] * 100)}%",
-        "strategy_signals": {
-            "trend_following": {
-                "signal": trend_signals['signal'],
-                "confidence": f"{round(trend_signals['confidence'] * 100)}%",
-                "metrics": normalize_pandas(trend_signals['metrics'])
-            },
-            "mean_reversion": {
-                "signal": mean_reversion_signals['signal'],
-                "confidence": f"{round(mean_reversion_signals['confidence'] * 100)}%",
-                "metrics": normalize_pandas(mean_reversion_signals['metrics'])
-            },
-            "momentum": {
-                "signal": momentum_signals['signal'],
-                "confidence": f"{round(momentum_signals['confidence'] * 100)}%",
-                "metrics": normalize_pandas(momentum_signals['metrics'])
-            },
-            "volatility": {
-                "signal": volatility_signals['signal'],
-                "confidence": f"{round(volatility_signals['confidence'] * 100)}%",
-                "metrics": normalize_pandas(volatility_signals['metrics'])
-            },
-            "statistical_arbitrage": {
-                "signal": stat_arb_signals['signal'],
-                "confidence": f"{round(stat_arb_signals['confidence'] * 100)}%",
-                "metrics": normalize_pandas(stat_arb_signals['metrics'])
-            }
+    strategy_report = {
+        "trend_following": {
+            "signal": trend_signals['signal'],
+            "confidence": f"{round(trend_signals['confidence'] * 100)}%",
+            "metrics": normalize_pandas(trend_signals['metrics'])
+        },
+        "mean_reversion": {
+            "signal": mean_reversion_signals['signal'],
+            "confidence": f"{round(mean_reversion_signals['confidence'] * 100)}%",
+            "metrics": normalize_pandas(mean_reversion_signals['metrics'])
+        },
+        "momentum": {
+            "signal": momentum_signals['signal'],
+            "confidence": f"{round(momentum_signals['confidence'] * 100)}%",
+            "metrics": normalize_pandas(momentum_signals['metrics'])
+        },
+        "volatility": {
+            "signal": volatility_signals['signal'],
+            "confidence": f"{round(volatility_signals['confidence'] * 100)}%",
+            "metrics": normalize_pandas(volatility_signals['metrics'])
+        },
+        "statistical_arbitrage": {
+            "signal": stat_arb_signals['signal'],
+            "confidence": f"{round(stat_arb_signals['confidence'] * 100)}%",
+            "metrics": normalize_pandas(stat_arb_signals['metrics'])
         }
     }
 
-    # Create the technical analyst message
-    message = HumanMessage(
-        content=json.dumps(analysis_report),
-        name="technical_analyst_agent",
+    technical_signal = AgentSignal(
+        "technical_analyst_agent",
+        combined_signal['signal'],
+        combined_signal['confidence'],
+        strategy_report
     )
 
     if show_reasoning:
-        show_agent_reasoning(analysis_report, "Technical Analyst")
+        show_agent_reasoning(technical_signal.to_dict(), "Technical Analyst")
 
-    return {
-        "messages": [message],
-        "data": data,
-    }
+    return {"signals": {"technical_analyst_agent": technical_signal}}
 
 
-def calculate_trend_signals(prices_df):
+@uses_indicators(("ema", 8, "close"), ("ema", 21, "close"), ("ema", 55, "close"), ("adx", 14))
+def calculate_trend_signals(features):
     """
     Advanced trend following strategy using multiple timeframes and indicators
     """
     # Calculate EMAs for multiple timeframes
-    ema_8 = calculate_ema(prices_df, 8)
-    ema_21 = calculate_ema(prices_df, 21)
-    ema_55 = calculate_ema(prices_df, 55)
+    ema_8 = features.ema(8)
+    ema_21 = features.ema(21)
+    ema_55 = features.ema(55)
 
     # Calculate ADX for trend strength
-    adx = calculate_adx(prices_df, 14)
-
-    # Calculate Ichimoku Cloud
-    ichimoku = calculate_ichimoku(prices_df)
+    adx = features.adx(14)
 
     # Determine trend direction and strength
     short_trend = ema_8 > ema_21
@@ -242,30 +133,33 @@ def calculate_trend_signals(prices_df):
         'metrics': {
             'adx': float(adx['adx'].iloc[-1]),
             'trend_strength': float(trend_strength),
-            # 'ichimoku': ichimoku
         }
     }
 
 
-def calculate_mean_reversion_signals(prices_df):
+@uses_indicators(("rolling_mean", 50, "close"), ("rolling_std", 50, "close"),
+                 ("bollinger", 20, 2), ("rsi", 14), ("rsi", 28))
+def calculate_mean_reversion_signals(features):
     """
     Mean reversion strategy using statistical measures and Bollinger Bands
     """
+    close = features.close
+
     # Calculate z-score of price relative to moving average
-    ma_50 = prices_df['close'].rolling(window=50).mean()
-    std_50 = prices_df['close'].rolling(window=50).std()
-    z_score = (prices_df['close'] - ma_50) / std_50
+    ma_50 = features.rolling_mean(50)
+    std_50 = features.rolling_std(50)
+    z_score = (close - ma_50) / std_50
 
     # Calculate Bollinger Bands
-    bb_upper, bb_lower = calculate_bollinger_bands(prices_df)
+    bb_upper, bb_lower = features.bollinger_bands(20)
 
     # Calculate RSI with multiple timeframes
-    rsi_14 = calculate_rsi(prices_df, 14)
-    rsi_28 = calculate_rsi(prices_df, 28)
+    rsi_14 = features.rsi(14)
+    rsi_28 = features.rsi(28)
 
     # Mean reversion signals
     extreme_z_score = abs(z_score.iloc[-1]) > 2
-    price_vs_bb = (prices_df['close'].iloc[-1] - bb_lower.iloc[-1]
+    price_vs_bb = (close.iloc[-1] - bb_lower.iloc[-1]
                    ) / (bb_upper.iloc[-1] - bb_lower.iloc[-1])
 
     # Combine signals
@@ -291,22 +185,26 @@ def calculate_mean_reversion_signals(prices_df):
     }
 
 
-def calculate_momentum_signals(prices_df):
+@uses_indicators(("rolling_sum", 21, "returns"), ("rolling_sum", 63, "returns"),
+                 ("rolling_sum", 126, "returns"), ("rolling_mean", 21, "volume"),
+                 ("relative_strength", 63, "market"), ("relative_strength", 63, "sector"))
+def calculate_momentum_signals(features):
     """
     Multi-factor momentum strategy
     """
+
     # Price momentum
-    returns = prices_df['close'].pct_change()
-    mom_1m = returns.rolling(21).sum()
-    mom_3m = returns.rolling(63).sum()
-    mom_6m = returns.rolling(126).sum()
+    mom_1m = features.rolling_sum(21)
+    mom_3m = features.rolling_sum(63)
+    mom_6m = features.rolling_sum(126)
 
     # Volume momentum
-    volume_ma = prices_df['volume'].rolling(21).mean()
-    volume_momentum = prices_df['volume'] / volume_ma
+    volume_ma = features.rolling_mean(21, "volume")
+    volume_momentum = features.volume / volume_ma
 
-    # Relative strength
-    # (would compare to market/sector in real implementation)
+    # Relative strength against the market and sector benchmarks
+    rs_market = features.relative_strength(63, "market")
+    rs_sector = features.relative_strength(63, "sector")
 
     # Calculate momentum score
     momentum_score = (
@@ -328,27 +226,32 @@ def calculate_momentum_signals(prices_df):
         signal = 'neutral'
         confidence = 0.5
 
+    metrics = {
+        'momentum_1m': float(mom_1m.iloc[-1]),
+        'momentum_3m': float(mom_3m.iloc[-1]),
+        'momentum_6m': float(mom_6m.iloc[-1]),
+        'volume_momentum': float(volume_momentum.iloc[-1])
+    }
+    if rs_market is not None:
+        metrics['relative_strength_market_3m'] = float(rs_market.iloc[-1])
+    if rs_sector is not None:
+        metrics['relative_strength_sector_3m'] = float(rs_sector.iloc[-1])
+
     return {
         'signal': signal,
         'confidence': confidence,
-        'metrics': {
-            'momentum_1m': float(mom_1m.iloc[-1]),
-            'momentum_3m': float(mom_3m.iloc[-1]),
-            'momentum_6m': float(mom_6m.iloc[-1]),
-            'volume_momentum': float(volume_momentum.iloc[-1])
-        }
+        'metrics': metrics
     }
 
 
-def calculate_volatility_signals(prices_df):
+@uses_indicators(("historical_volatility", 21), ("atr", 14))
+def calculate_volatility_signals(features):
     """
     Volatility-based trading strategy
     """
-    # Calculate various volatility metrics
-    returns = prices_df['close'].pct_change()
 
     # Historical volatility
-    hist_vol = returns.rolling(21).std() * math.sqrt(252)
+    hist_vol = features.historical_volatility(21)
 
     # Volatility regime detection
     vol_ma = hist_vol.rolling(63).mean()
@@ -358,8 +261,8 @@ def calculate_volatility_signals(prices_df):
     vol_z_score = (hist_vol - vol_ma) / hist_vol.rolling(63).std()
 
     # ATR ratio
-    atr = calculate_atr(prices_df)
-    atr_ratio = atr / prices_df['close']
+    atr = features.atr(14)
+    atr_ratio = atr / features.close
 
     # Generate signal based on volatility regime
     current_vol_regime = vol_regime.iloc[-1]
@@ -387,22 +290,25 @@ def calculate_volatility_signals(prices_df):
     }
 
 
-def calculate_stat_arb_signals(prices_df):
+@uses_indicators(("returns",), ("beta", 63, "market"), ("correlation", 63, "market"))
+def calculate_stat_arb_signals(features):
     """
     Statistical arbitrage signals based on price action analysis
     """
+
     # Calculate price distribution statistics
-    returns = prices_df['close'].pct_change()
+    returns = features.returns()
 
     # Skewness and kurtosis
     skew = returns.rolling(63).skew()
     kurt = returns.rolling(63).kurt()
 
     # Test for mean reversion using Hurst exponent
-    hurst = calculate_hurst_exponent(prices_df['close'])
+    hurst = calculate_hurst_exponent(features.close)
 
-    # Correlation analysis
-    # (would include correlation with related securities in real implementation)
+    # Correlation analysis against the market benchmark
+    beta = features.beta(63, "market")
+    correlation = features.correlation(63, "market")
 
     # Generate signal based on statistical properties
     if hurst < 0.4 and skew.iloc[-1] > 1:
@@ -415,14 +321,19 @@ def calculate_stat_arb_signals(prices_df):
         signal = 'neutral'
         confidence = 0.5
 
+    metrics = {
+        'hurst_exponent': float(hurst),
+        'skewness': float(skew.iloc[-1]),
+        'kurtosis': float(kurt.iloc[-1])
+    }
+    if beta is not None:
+        metrics['market_beta'] = float(beta.iloc[-1])
+        metrics['market_correlation'] = float(correlation.iloc[-1])
+
     return {
         'signal': signal,
         'confidence': confidence,
-        'metrics': {
-            'hurst_exponent': float(hurst),
-            'skewness': float(skew.iloc[-1]),
-            'kurtosis': float(kurt.iloc[-1])
-        }
+        'metrics': metrics
     }
 
 
@@ -482,33 +393,18 @@ def normalize_pandas(obj):
 
 
 def calculate_macd(prices_df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
-    ema_12 = prices_df['close'].ewm(span=12, adjust=False).mean()
-    ema_26 = prices_df['close'].ewm(span=26, adjust=False).mean()
-    macd_line = ema_12 - ema_26
-    signal_line = macd_line.ewm(span=9, adjust=False).mean()
-    return macd_line, signal_line
+    return as_feature_frame(prices_df).compute("macd")
 
 
 def calculate_rsi(prices_df: pd.DataFrame, period: int = 14) -> pd.Series:
-    delta = prices_df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).fillna(0)
-    loss = (-delta.where(delta < 0, 0)).fillna(0)
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    return as_feature_frame(prices_df).rsi(period)
 
 
 def calculate_bollinger_bands(
     prices_df: pd.DataFrame,
     window: int = 20
 ) -> tuple[pd.Series, pd.Series]:
-    sma = prices_df['close'].rolling(window).mean()
-    std_dev = prices_df['close'].rolling(window).std()
-    upper_band = sma + (std_dev * 2)
-    lower_band = sma - (std_dev * 2)
-    return upper_band, lower_band
+    return as_feature_frame(prices_df).bollinger_bands(window)
 
 
 def calculate_ema(df: pd.DataFrame, window: int) -> pd.Series:
@@ -516,13 +412,13 @@ def calculate_ema(df: pd.DataFrame, window: int) -> pd.Series:
     Calculate Exponential Moving Average
 
     Args:
-        df: DataFrame with price data
+        df: DataFrame (or FeatureFrame) with price data
         window: EMA period
 
     Returns:
         pd.Series: EMA values
     """
-    return df['close'].ewm(span=window, adjust=False).mean()
+    return as_feature_frame(df).ema(window)
 
 
 def calculate_adx(df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
@@ -530,42 +426,13 @@ def calculate_adx(df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
     Calculate Average Directional Index (ADX)
 
     Args:
-        df: DataFrame with OHLC data
+        df: DataFrame (or FeatureFrame) with OHLC data
         period: Period for calculations
 
     Returns:
         DataFrame with ADX values
     """
-    # Calculate True Range
-    df['high_low'] = df['high'] - df['low']
-    df['high_close'] = abs(df['high'] - df['close'].shift())
-    df['low_close'] = abs(df['low'] - df['close'].shift())
-    df['tr'] = df[['high_low', 'high_close', 'low_close']].max(axis=1)
-
-    # Calculate Directional Movement
-    df['up_move'] = df['high'] - df['high'].shift()
-    df['down_move'] = df['low'].shift() - df['low']
-
-    df['plus_dm'] = np.where(
-        (df['up_move'] > df['down_move']) & (df['up_move'] > 0),
-        df['up_move'],
-        0
-    )
-    df['minus_dm'] = np.where(
-        (df['down_move'] > df['up_move']) & (df['down_move'] > 0),
-        df['down_move'],
-        0
-    )
-
-    # Calculate ADX
-    df['+di'] = 100 * (df['plus_dm'].ewm(span=period).mean() /
-                       df['tr'].ewm(span=period).mean())
-    df['-di'] = 100 * (df['minus_dm'].ewm(span=period).mean() /
-                       df['tr'].ewm(span=period).mean())
-    df['dx'] = 100 * abs(df['+di'] - df['-di']) / (df['+di'] + df['-di'])
-    df['adx'] = df['dx'].ewm(span=period).mean()
-
-    return df[['adx', '+di', '-di']]
+    return as_feature_frame(df).adx(period)
 
 
 def calculate_ichimoku(df: pd.DataFrame) -> Dict[str, pd.Series]:
@@ -573,39 +440,12 @@ def calculate_ichimoku(df: pd.DataFrame) -> Dict[str, pd.Series]:
     Calculate Ichimoku Cloud indicators
 
     Args:
-        df: DataFrame with OHLC data
+        df: DataFrame (or FeatureFrame) with OHLC data
 
     Returns:
         Dictionary containing Ichimoku components
     """
-    # Tenkan-sen (Conversion Line): (9-period high + 9-period low)/2
-    period9_high = df['high'].rolling(window=9).max()
-    period9_low = df['low'].rolling(window=9).min()
-    tenkan_sen = (period9_high + period9_low) / 2
-
-    # Kijun-sen (Base Line): (26-period high + 26-period low)/2
-    period26_high = df['high'].rolling(window=26).max()
-    period26_low = df['low'].rolling(window=26).min()
-    kijun_sen = (period26_high + period26_low) / 2
-
-    # Senkou Span A (Leading Span A): (Conversion Line + Base Line)/2
-    senkou_span_a = ((tenkan_sen + kijun_sen) / 2).shift(26)
-
-    # Senkou Span B (Leading Span B): (52-period high + 52-period low)/2
-    period52_high = df['high'].rolling(window=52).max()
-    period52_low = df['low'].rolling(window=52).min()
-    senkou_span_b = ((period52_high + period52_low) / 2).shift(26)
-
-    # Chikou Span (Lagging Span): Close shifted back 26 periods
-    chikou_span = df['close'].shift(-26)
-
-    return {
-        'tenkan_sen': tenkan_sen,
-        'kijun_sen': kijun_sen,
-        'senkou_span_a': senkou_span_a,
-        'senkou_span_b': senkou_span_b,
-        'chikou_span': chikou_span
-    }
+    return as_feature_frame(df).compute("ichimoku")
 
 
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
@@ -613,20 +453,13 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     Calculate Average True Range
 
     Args:
-        df: DataFrame with OHLC data
+        df: DataFrame (or FeatureFrame) with OHLC data
         period: Period for ATR calculation
 
     Returns:
         pd.Series: ATR values
     """
-    high_low = df['high'] - df['low']
-    high_close = abs(df['high'] - df['close'].shift())
-    low_close = abs(df['low'] - df['close'].shift())
-
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = ranges.max(axis=1)
-
-    return true_range.rolling(period).mean()
+    return as_feature_frame(df).atr(period)
 
 
 def calculate_hurst_exponent(price_series: pd.Series, max_lag: int = 20) -> float:
@@ -643,10 +476,12 @@ def calculate_hurst_exponent(price_series: pd.Series, max_lag: int = 20) -> floa
     Returns:
         float: Hurst exponent
     """
+    # 按位置而不是索引相减，否则 Series 会按日期对齐导致差值全为 0
+    prices = np.asarray(price_series, dtype=float)
     lags = range(2, max_lag)
     # Add small epsilon to avoid log(0)
-    tau = [max(1e-8, np.sqrt(np.std(np.subtract(price_series[lag:],
-               price_series[:-lag])))) for lag in lags]
+    tau = [max(1e-8, np.sqrt(np.std(np.subtract(prices[lag:],
+               prices[:-lag])))) for lag in lags]
 
     # Return the Hurst exponent from linear fit
     try:
@@ -658,13 +493,4 @@ def calculate_hurst_exponent(price_series: pd.Series, max_lag: int = 20) -> floa
 
 
 def calculate_obv(prices_df: pd.DataFrame) -> pd.Series:
-    obv = [0]
-    for i in range(1, len(prices_df)):
-        if prices_df['close'].iloc[i] > prices_df['close'].iloc[i - 1]:
-            obv.append(obv[-1] + prices_df['volume'].iloc[i])
-        elif prices_df['close'].iloc[i] < prices_df['close'].iloc[i - 1]:
-            obv.append(obv[-1] - prices_df['volume'].iloc[i])
-        else:
-            obv.append(obv[-1])
-    prices_df['OBV'] = obv
-    return prices_df['OBV']
+    return as_feature_frame(prices_df).obv()
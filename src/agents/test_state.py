@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents.state import AgentState, Handle, invoke_graph, payload, run_store, store_payload
+
+
+def _app():
+    from langgraph.graph import END, StateGraph
+
+    def first(state):
+        return {"data": {"first": store_payload("first", [len(state["data"])])},
+                "messages": [AIMessage(content="first")], "signals": {"first": 1}}
+
+    def left(state):
+        return {"data": {"left": payload(state["data"], "first")},
+                "messages": [AIMessage(content="left")], "signals": {"left": 2}}
+
+    def right(state):
+        return {"data": {"right": True}, "signals": {"right": 3}}
+
+    workflow = StateGraph(AgentState)
+    for name, node in (("first", first), ("left", left), ("right", right)):
+        workflow.add_node(name, node)
+    workflow.set_entry_point("first")
+    workflow.add_edge("first", "left")
+    workflow.add_edge("first", "right")
+    workflow.add_edge(["left", "right"], END)
+    return workflow.compile()
+
+
+def _inputs(ticker: str):
+    return {"messages": [HumanMessage(content=ticker)], "data": {"ticker": ticker},
+            "metadata": {}, "signals": {}}
+
+
+def test_in_place_reducers_start_fresh_on_every_run():
+    # merge_dicts / append_messages 原地合并，依赖 LangGraph 每次运行新建通道值
+    app = _app()
+    inputs = _inputs("AAA")
+    first = invoke_graph(app, inputs)
+    second = invoke_graph(app, _inputs("BBB"))
+
+    assert inputs == _inputs("AAA")
+    assert first["data"] is not second["data"]
+    assert second["data"] == {"ticker": "BBB", "first": [1], "left": [1], "right": True}
+    assert [m.content for m in second["messages"]] == ["BBB", "first", "left"]
+    assert second["signals"] == {"first": 1, "left": 2, "right": 3}
+
+
+def test_concurrent_runs_do_not_share_state():
+    app = _app()
+    results = {}
+
+    def run(i):
+        results[i] = invoke_graph(app, _inputs(f"T{i:03d}"))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, state in results.items():
+        assert state["data"]["ticker"] == f"T{i:03d}"
+        assert len(state["messages"]) == 3
+
+
+def test_payload_follows_handles_only_inside_a_run():
+    with run_store():
+        data = {"prices": store_payload("prices", [1, 2, 3])}
+        assert isinstance(data["prices"], Handle)
+        assert payload(data, "prices") == [1, 2, 3]
+
+    with pytest.raises(RuntimeError, match="invoke_graph"):
+        payload(data, "prices")
+    assert payload({"prices": [4]}, "prices") == [4]
+    assert store_payload("prices", [5]) == [5]
@@ -1,14 +1,38 @@
-from langchain_core.messages import HumanMessage
-from agents.state import AgentState, show_agent_reasoning
-import json
-
+import math
+from typing import Dict
+
+from agents.state import AgentState, payload, show_agent_reasoning
+from agents.node_cache import memoize_node
+from agents.signals import AgentSignal
+from tools.valuation_engine import (Distribution, dcf_values, monte_carlo_dcf, normal, owner_earnings,
+                                    owner_earnings_values, scenario_grid, triangular,
+                                    valuation_distribution)
+
+# 基准假设
+DCF_DISCOUNT_RATE = 0.10
+TERMINAL_GROWTH_RATE = 0.03
+REQUIRED_RETURN = 0.15
+MARGIN_OF_SAFETY = 0.25
+
+# 情景分析：在基准增长率上下浮动，并遍历折现率与永续增长率
+SCENARIO_GROWTH_SHIFTS = (-0.05, -0.025, 0.0, 0.025, 0.05)
+SCENARIO_DISCOUNT_RATES = (0.08, 0.09, 0.10, 0.11, 0.12)
+SCENARIO_TERMINAL_RATES = (0.02, 0.025, 0.03)
+
+# 蒙特卡洛模式：以低估概率作为信号置信度
+VALUATION_MODES = ("point", "monte_carlo")
+MONTE_CARLO_PATHS = 100_000
+
+@memoize_node("valuation_agent", ("financial_metrics", "financial_line_items", "market_cap",
+                                  "valuation_mode", "valuation_assumptions"), "Valuation Analysis Agent")
 def valuation_agent(state: AgentState):
     """Performs detailed valuation analysis using multiple methodologies."""
     show_reasoning = state["metadata"]["show_reasoning"]
     data = state["data"]
-    metrics = data["financial_metrics"][0]
-    current_financial_line_item = data["financial_line_items"][0]
-    previous_financial_line_item = data["financial_line_items"][1]
+    metrics = payload(data, "financial_metrics")[0]
+    line_items = payload(data, "financial_line_items")
+    current_financial_line_item = line_items[0]
+    previous_financial_line_item = line_items[1]
     market_cap = data["market_cap"]
 
     reasoning = {}
@@ -23,16 +47,16 @@ def valuation_agent(state: AgentState):
         capex=current_financial_line_item.get('capital_expenditure'),
         working_capital_change=working_capital_change,
         growth_rate=metrics["earnings_growth"],
-        required_return=0.15,
-        margin_of_safety=0.25
+        required_return=REQUIRED_RETURN,
+        margin_of_safety=MARGIN_OF_SAFETY
     )
     
     # DCF Valuation
     dcf_value = calculate_intrinsic_value(
         free_cash_flow=current_financial_line_item.get('free_cash_flow'),
         growth_rate=metrics["earnings_growth"],
-        discount_rate=0.10,
-        terminal_growth_rate=0.03,
+        discount_rate=DCF_DISCOUNT_RATE,
+        terminal_growth_rate=TERMINAL_GROWTH_RATE,
         num_years=5,
     )
     
@@ -58,25 +82,94 @@ def valuation_agent(state: AgentState):
         "details": f"Owner Earnings Value: ${owner_earnings_value:,.2f}, Market Cap: ${market_cap:,.2f}, Gap: {owner_earnings_gap:.1%}"
     }
 
-    message_content = {
-        "signal": signal,
-        "confidence": f"{abs(valuation_gap):.0%}",
-        "reasoning": reasoning
-    }
+    scenarios = dcf_scenarios(
+        current_financial_line_item.get('free_cash_flow'), metrics["earnings_growth"], market_cap)
+    if scenarios:
+        reasoning["scenario_analysis"] = {
+            "signal": "bullish" if scenarios["median_gap"] > 0.15 else "bearish" if scenarios["median_gap"] < -0.15 else "neutral",
+            "details": f"DCF over {scenarios['count']} growth/discount/terminal scenarios: "
+                       f"P5 ${scenarios['p5']:,.2f}, Median ${scenarios['p50']:,.2f}, P95 ${scenarios['p95']:,.2f}, "
+                       f"Above Market Cap in {scenarios['prob_undervalued']:.0%}"
+        }
+
+    confidence = abs(valuation_gap)
+    if data.get("valuation_mode", "point") == "monte_carlo":
+        simulation = monte_carlo_valuation(
+            metrics, current_financial_line_item, market_cap, data.get("valuation_assumptions"))
+        if simulation:
+            probability = simulation["prob_undervalued"]
+            signal = 'bullish' if probability > 0.6 else 'bearish' if probability < 0.4 else 'neutral'
+            confidence = max(probability, 1 - probability)
+            reasoning["monte_carlo_analysis"] = {
+                "signal": signal,
+                "details": f"DCF over {simulation['count']:,} sampled paths: P5 ${simulation['p5']:,.2f}, "
+                           f"P25 ${simulation['p25']:,.2f}, Median ${simulation['p50']:,.2f}, "
+                           f"P75 ${simulation['p75']:,.2f}, P95 ${simulation['p95']:,.2f}, "
+                           f"Probability Undervalued: {probability:.0%}"
+            }
+
+    valuation_signal = AgentSignal(
+        "valuation_agent", signal, confidence, reasoning)
+
+    if show_reasoning:
+        show_agent_reasoning(valuation_signal.to_dict(),
+                             "Valuation Analysis Agent")
+
+    return {"signals": {"valuation_agent": valuation_signal}}
+
+def finite(*values) -> bool:
+    """Whether every value is a finite number (yfinance often reports NaN)"""
+    return all(isinstance(v, (int, float)) and math.isfinite(v) for v in values)
+
 
-    message = HumanMessage(
-        content=json.dumps(message_content),
-        name="valuation_agent",
+def dcf_scenarios(free_cash_flow: float, growth_rate: float, market_cap: float) -> dict:
+    """Distribution of the DCF value over the scenario grid around the base growth rate"""
+    if not finite(free_cash_flow, growth_rate) or not market_cap:
+        return {}
+    grid = scenario_grid(
+        growth_rate=[growth_rate + shift for shift in SCENARIO_GROWTH_SHIFTS],
+        discount_rate=SCENARIO_DISCOUNT_RATES,
+        terminal_growth_rate=SCENARIO_TERMINAL_RATES,
     )
+    values = dcf_values(free_cash_flow, **grid)
+    summary = valuation_distribution(values, market_cap)
+    return {**summary, "count": values.size} if summary else {}
 
-    if show_reasoning:
-        show_agent_reasoning(message_content, "Valuation Analysis Agent")
 
+def default_assumptions(growth_rate: float, fcf_margin: float) -> Dict[str, Distribution]:
+    """Monte Carlo distributions centred on the point-estimate assumptions"""
     return {
-        "messages": [message],
-        "data": data,
+        "growth_rate": normal(growth_rate, 0.05, low=-0.5, high=1.0),
+        "discount_rate": normal(DCF_DISCOUNT_RATE, 0.015, low=0.05, high=0.25),
+        "terminal_growth_rate": triangular(0.01, TERMINAL_GROWTH_RATE, 0.04),
+        "fcf_margin": normal(fcf_margin, 0.2 * abs(fcf_margin)),
     }
 
+
+def monte_carlo_valuation(metrics: dict, line_item: dict, market_cap: float,
+                          overrides: Dict[str, Distribution] = None, n_paths: int = MONTE_CARLO_PATHS) -> dict:
+    """
+    Percentiles of the sampled DCF values and the probability that the
+    intrinsic value exceeds market_cap.
+
+    The free cash flow margin is sampled on revenue when it is known;
+    otherwise fcf_margin is a multiplier on the current free cash flow.
+    """
+    free_cash_flow = line_item.get('free_cash_flow')
+    growth_rate = metrics.get("earnings_growth")
+    revenue = metrics.get("revenue")
+    # 缺失的收入退回到自由现金流；NaN 等非有限值直接放弃模拟
+    if not finite(free_cash_flow, growth_rate) or not market_cap or (
+            isinstance(revenue, (int, float)) and not math.isfinite(revenue)):
+        return {}
+    if not isinstance(revenue, (int, float)) or revenue <= 0:
+        revenue = free_cash_flow
+    assumptions = {**default_assumptions(growth_rate, free_cash_flow / revenue), **(overrides or {})}
+    values = monte_carlo_dcf(revenue, assumptions, n_paths)
+    summary = valuation_distribution(values, market_cap)
+    return {**summary, "count": n_paths} if summary else {}
+
+
 def calculate_owner_earnings_value(
     net_income: float,
     depreciation: float,
@@ -111,34 +204,9 @@ def calculate_owner_earnings_value(
     if not all([isinstance(x, (int, float)) for x in [net_income, depreciation, capex, working_capital_change]]):
         return 0
     
-    # Calculate initial owner earnings
-    owner_earnings = (
-        net_income +
-        depreciation -
-        capex -
-        working_capital_change
-    )
-    
-    if owner_earnings <= 0:
-        return 0
-
-    # Project future owner earnings
-    future_values = []
-    for year in range(1, num_years + 1):
-        future_value = owner_earnings * (1 + growth_rate) ** year
-        discounted_value = future_value / (1 + required_return) ** year
-        future_values.append(discounted_value)
-    
-    # Calculate terminal value (using perpetuity growth formula)
-    terminal_growth = min(growth_rate, 0.03)  # Cap terminal growth at 3%
-    terminal_value = (future_values[-1] * (1 + terminal_growth)) / (required_return - terminal_growth)
-    terminal_value_discounted = terminal_value / (1 + required_return) ** num_years
-    
-    # Sum all values and apply margin of safety
-    intrinsic_value = (sum(future_values) + terminal_value_discounted)
-    value_with_safety_margin = intrinsic_value * (1 - margin_of_safety)
-    
-    return value_with_safety_margin
+    earnings = owner_earnings(net_income, depreciation, capex, working_capital_change)
+    return float(owner_earnings_values(
+        earnings, growth_rate, required_return, margin_of_safety, num_years))
 
 
 def calculate_intrinsic_value(
@@ -151,24 +219,10 @@ def calculate_intrinsic_value(
     """
     Computes the discounted cash flow (DCF) for a given company based on the current free cash flow.
     Use this function to calculate the intrinsic value of a stock.
+    For many scenarios or tickers at once, use tools.valuation_engine.dcf_values.
     """
-    # Estimate the future cash flows based on the growth rate
-    cash_flows = [free_cash_flow * (1 + growth_rate) ** i for i in range(num_years)]
-
-    # Calculate the present value of projected cash flows
-    present_values = []
-    for i in range(num_years):
-        present_value = cash_flows[i] / (1 + discount_rate) ** (i + 1)
-        present_values.append(present_value)
-
-    # Calculate the terminal value
-    terminal_value = cash_flows[-1] * (1 + terminal_growth_rate) / (discount_rate - terminal_growth_rate)
-    terminal_present_value = terminal_value / (1 + discount_rate) ** num_years
-
-    # Sum up the present values and terminal value
-    dcf_value = sum(present_values) + terminal_present_value
-
-    return dcf_value
+    return float(dcf_values(free_cash_flow, growth_rate, discount_rate,
+                            terminal_growth_rate, num_years))
 
 def calculate_working_capital_change(
     current_working_capital: float,
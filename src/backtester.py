@@ -2,27 +2,23 @@ from datetime import datetime, timedelta
 import json
 import time
 import logging
-import matplotlib.pyplot as plt
 import pandas as pd
 import os
 import sys
-import matplotlib
-import pandas_market_calendars as mcal
 import warnings
 
 from main import run_hedge_fund
-from tools.api import get_price_data
-
-# Configure Chinese font based on OS
-if sys.platform.startswith('win'):
-    matplotlib.rc('font', family='Microsoft YaHei')
-elif sys.platform.startswith('linux'):
-    matplotlib.rc('font', family='WenQuanYi Micro Hei')
-else:
-    matplotlib.rc('font', family='PingFang SC')
-
-# Enable minus sign display
-matplotlib.rcParams['axes.unicode_minus'] = False
+from agents.features import indicator_profiler
+from agents.node_cache import node_cache
+from tools.api import get_insider_trades, get_market_data, get_price_data, get_price_history
+from tools.fundamentals_store import fundamentals_store
+from tools.instrumentation import tracer
+from tools.transport import add_transport_arguments, configure_from_args, transport
+from execution_model import ExecutionModel, add_execution_arguments, execution_model_from_args
+from tools.event_log import VERBOSITY_LEVELS, log_event, setup_event_log, stop_listener
+from tools.ring_buffer import PriceWindow
+from tools.risk_kernels import (drawdown, historical_cvar, historical_var, rolling_historical_cvar,
+                                rolling_historical_var)
 
 # Disable matplotlib warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='matplotlib')
@@ -32,9 +28,38 @@ warnings.filterwarnings('ignore', category=UserWarning,
 logging.getLogger('matplotlib').setLevel(logging.ERROR)
 logging.getLogger('PIL').setLevel(logging.ERROR)
 
+def _pyplot():
+    """matplotlib.pyplot with the chart fonts set; imported only when a chart is drawn"""
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+    # Configure Chinese font based on OS
+    if sys.platform.startswith('win'):
+        matplotlib.rc('font', family='Microsoft YaHei')
+    elif sys.platform.startswith('linux'):
+        matplotlib.rc('font', family='WenQuanYi Micro Hei')
+    else:
+        matplotlib.rc('font', family='PingFang SC')
+
+    # Enable minus sign display
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return plt
+
+
+# 回看窗口：日历天数用于预取历史，K 线根数为环形缓冲区容量（约一年的交易日）
+LOOKBACK_DAYS = 365
+LOOKBACK_BARS = 252
+
+# 回测期内风险随时间变化的滚动窗口（交易日）
+RISK_WINDOW = 20
+
+# LLM 调用限速：每分钟最多调用次数、两次调用的最小间隔（秒）
+API_CALLS_PER_MINUTE = 8
+API_MIN_INTERVAL = 6
+
 
 class Backtester:
-    def __init__(self, agent, ticker, start_date, end_date, initial_capital, num_of_news=5):
+    def __init__(self, agent, ticker, start_date, end_date, initial_capital, num_of_news=5, execution_model=None, verbosity="normal"):
         self.agent = agent
         self.ticker = ticker
         self.start_date = start_date
@@ -43,17 +68,30 @@ class Backtester:
         self.portfolio = {"cash": initial_capital, "stock": 0}
         self.portfolio_values = []
         self.num_of_news = num_of_news
+        self.execution_model = execution_model or ExecutionModel()
+        self.transaction_costs = 0.0
+        self.verbosity = verbosity
 
         # Setup logging
         self.setup_backtest_logging()
         self.logger = self.setup_logging()
 
-        # Initialize API call management
+        # Initialize API call management (离线回放时可把限速关掉，回放归档时默认关闭)
+        replaying = transport.mode == "replay"
+        self.calls_per_minute = float("inf") if replaying else API_CALLS_PER_MINUTE
+        self.min_call_interval = 0 if replaying else API_MIN_INTERVAL
         self._api_call_count = 0
         self._api_window_start = time.time()
         self._last_api_call = 0
 
-        # Initialize market calendar
+        # Lookback history, fetched once and rolled forward day by day
+        self._price_history = {}
+        self.price_windows = {}
+        # 公司信息和内部交易不随交易日变化，每只股票只取一次
+        self._shared_inputs = {}
+
+        # Initialize market calendar (导入较慢，只在创建回测时导入)
+        import pandas_market_calendars as mcal
         self.nyse = mcal.get_calendar('NYSE')
 
         # Validate inputs
@@ -93,36 +131,47 @@ class Backtester:
             raise
 
     def setup_backtest_logging(self):
-        """Setup backtest logging"""
+        """Setup the structured (JSON lines) backtest event log"""
         log_dir = os.path.join(os.path.dirname(
             os.path.abspath(__file__)), '..', 'logs')
         os.makedirs(log_dir, exist_ok=True)
 
-        self.backtest_logger = logging.getLogger('backtest')
-        self.backtest_logger.setLevel(logging.INFO)
-
-        if self.backtest_logger.handlers:
-            self.backtest_logger.handlers.clear()
-
         current_date = datetime.now().strftime('%Y%m%d')
         backtest_period = f"{self.start_date.replace('-', '')}_{self.end_date.replace('-', '')}"
         log_file = os.path.join(
-            log_dir, f"backtest_{self.ticker}_{current_date}_{backtest_period}.log")
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-
-        formatter = logging.Formatter('%(message)s')
-        file_handler.setFormatter(formatter)
-        self.backtest_logger.addHandler(file_handler)
-
-        self.backtest_logger.info(
-            f"Backtest Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.backtest_logger.info(f"Stock Code: {self.ticker}")
-        self.backtest_logger.info(
-            f"Backtest Period: {self.start_date} to {self.end_date}")
-        self.backtest_logger.info(
-            f"Initial Capital: {self.initial_capital:,.2f}\n")
-        self.backtest_logger.info("-" * 100)
+            log_dir, f"backtest_{self.ticker}_{current_date}_{backtest_period}.jsonl")
+
+        # 通过队列异步写入，避免日志 I/O 阻塞回测主循环
+        self.backtest_logger, self._log_listener = setup_event_log(
+            'backtest', log_file, self.verbosity)
+        self._log_handlers = list(self._log_listener.handlers)
+
+        log_event(self.backtest_logger, "backtest_start",
+                  start_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  ticker=self.ticker,
+                  start_date=self.start_date,
+                  end_date=self.end_date,
+                  initial_capital=self.initial_capital)
+
+    def close_logging(self):
+        """Flush the event log"""
+        stop_listener(self._log_listener, self._log_handlers)
+
+    def log_agent_signals(self, date, ticker, output):
+        """Write one record per agent with its signal (and details at debug verbosity)"""
+        if self.verbosity == "quiet":
+            return
+        for agent_name, signal in output.get("analyst_signals", {}).items():
+            fields = {
+                "signal": signal.get("signal", "unknown"),
+                "confidence": signal.get("confidence"),
+            }
+            if self.verbosity == "debug":
+                for key in ("analysis", "reason"):
+                    if key in signal:
+                        fields[key] = signal[key]
+            log_event(self.backtest_logger, "agent_signal", date=date,
+                      ticker=ticker, agent=agent_name, **fields)
 
     def is_market_open(self, date_str):
         """Check if the market is open on a given date"""
@@ -140,7 +189,41 @@ class Backtester:
             return None
         return schedule.index[-2].strftime('%Y-%m-%d')
 
-    def get_agent_decision(self, current_date, lookback_start, portfolio, num_of_news):
+    def load_lookback_history(self, tickers):
+        """Fetch each ticker's daily bars for the whole backtest plus the lookback once"""
+        start = (pd.Timestamp(self.start_date) -
+                 pd.Timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+        for ticker in tickers:
+            history = get_price_history(ticker, start, self.end_date)
+            if not len(history):
+                # 预取失败时由 market_data_agent 按天获取
+                self.backtest_logger.warning(
+                    f"No lookback history for {ticker}, prices will be fetched per day")
+                continue
+            self._price_history[ticker] = history
+            self.price_windows[ticker] = PriceWindow(LOOKBACK_BARS)
+
+    def load_shared_inputs(self, tickers):
+        """Fetch each ticker's company info and insider trades once for all backtest days"""
+        for ticker in tickers:
+            try:
+                self._shared_inputs[ticker] = {
+                    "market_data": get_market_data(ticker),
+                    "insider_trades": get_insider_trades(ticker),
+                }
+            except Exception as e:
+                # 预取失败时由 market_data_agent 按天获取
+                self.backtest_logger.warning(
+                    f"Could not prefetch company data for {ticker}, it will be fetched per day: {e}")
+
+    def lookback_prices(self, ticker, decision_date):
+        """The lookback window of ticker rolled forward to decision_date (exclusive)"""
+        window = self.price_windows.get(ticker)
+        if window is None:
+            return None
+        return window.roll(self._price_history[ticker], decision_date)
+
+    def get_agent_decision(self, current_date, lookback_start, portfolio, num_of_news, ticker=None, prices=None):
         """Get agent decision with API rate limiting"""
         max_retries = 3
         current_time = time.time()
@@ -149,11 +232,12 @@ class Backtester:
             self._api_call_count = 0
             self._api_window_start = current_time
 
-        if self._api_call_count >= 8:
+        if self._api_call_count >= self.calls_per_minute:
             wait_time = 60 - (current_time - self._api_window_start)
             if wait_time > 0:
                 self.backtest_logger.info(
                     f"API limit reached, waiting {wait_time:.1f} seconds...")
+                tracer.count("backtester", "rate_limit", sleep_seconds=wait_time)
                 time.sleep(wait_time)
                 self._api_call_count = 0
                 self._api_window_start = time.time()
@@ -162,52 +246,32 @@ class Backtester:
             try:
                 if self._last_api_call:
                     time_since_last_call = time.time() - self._last_api_call
-                    if time_since_last_call < 6:
-                        time.sleep(6 - time_since_last_call)
+                    if time_since_last_call < self.min_call_interval:
+                        wait_time = self.min_call_interval - time_since_last_call
+                        tracer.count("backtester", "rate_limit", sleep_seconds=wait_time)
+                        time.sleep(wait_time)
 
                 self._last_api_call = time.time()
                 self._api_call_count += 1
 
                 result = self.agent(
-                    ticker=self.ticker,
+                    ticker=ticker or self.ticker,
                     start_date=lookback_start,
                     end_date=current_date,
                     portfolio=portfolio,
-                    num_of_news=num_of_news
+                    num_of_news=num_of_news,
+                    **({"prices": prices} if prices is not None else {}),
+                    **self._shared_inputs.get(ticker or self.ticker, {})
                 )
 
-                try:
-                    if isinstance(result, str):
-                        result = result.replace(
-                            '```json\n', '').replace('\n```', '').strip()
-                        parsed_result = json.loads(result)
-
-                        formatted_result = {
-                            "decision": parsed_result,
-                            "analyst_signals": {}
-                        }
-
-                        if "agent_signals" in parsed_result:
-                            formatted_result["analyst_signals"] = {
-                                signal["agent"]: {
-                                    "signal": signal.get("signal", "unknown"),
-                                    "confidence": signal.get("confidence", 0)
-                                }
-                                for signal in parsed_result["agent_signals"]
-                            }
-
-                        return formatted_result
-                    return result
-                except json.JSONDecodeError as e:
-                    self.backtest_logger.warning(
-                        f"JSON parsing error: {str(e)}")
-                    self.backtest_logger.warning(f"Raw result: {result}")
-                    return {"decision": {"action": "hold", "quantity": 0}, "analyst_signals": {}}
+                return self.parse_agent_output(result)
 
             except Exception as e:
                 if "AFC is enabled" in str(e):
                     self.backtest_logger.warning(
                         f"AFC limit triggered, waiting 60 seconds...")
+                    tracer.count("backtester", "get_agent_decision",
+                                 retries=1, sleep_seconds=60)
                     time.sleep(60)
                     self._api_call_count = 0
                     self._api_window_start = time.time()
@@ -217,31 +281,67 @@ class Backtester:
                     f"Failed to get agent decision (attempt {attempt + 1}/{max_retries}): {str(e)}")
                 if attempt == max_retries - 1:
                     return {"decision": {"action": "hold", "quantity": 0}, "analyst_signals": {}}
+                tracer.count("backtester", "get_agent_decision",
+                             retries=1, sleep_seconds=2 ** attempt)
                 time.sleep(2 ** attempt)
 
-    def execute_trade(self, action, quantity, current_price):
-        """Execute trade with portfolio constraints"""
-        if action == "buy" and quantity > 0:
-            cost = quantity * current_price
-            if cost <= self.portfolio["cash"]:
-                self.portfolio["stock"] += quantity
-                self.portfolio["cash"] -= cost
-                return quantity
-            else:
-                max_quantity = int(self.portfolio["cash"] // current_price)
-                if max_quantity > 0:
-                    self.portfolio["stock"] += max_quantity
-                    self.portfolio["cash"] -= max_quantity * current_price
-                    return max_quantity
-                return 0
-        elif action == "sell" and quantity > 0:
-            quantity = min(quantity, self.portfolio["stock"])
-            if quantity > 0:
-                self.portfolio["cash"] += quantity * current_price
-                self.portfolio["stock"] -= quantity
-                return quantity
+    def parse_agent_output(self, result):
+        """Parse the agent's raw output into a decision and analyst signals"""
+        try:
+            if isinstance(result, str):
+                result = result.replace(
+                    '```json\n', '').replace('\n```', '').strip()
+                parsed_result = json.loads(result)
+
+                formatted_result = {
+                    "decision": parsed_result,
+                    "analyst_signals": {}
+                }
+
+                if "agent_signals" in parsed_result:
+                    formatted_result["analyst_signals"] = {
+                        signal["agent"]: {
+                            "signal": signal.get("signal", "unknown"),
+                            "confidence": signal.get("confidence", 0)
+                        }
+                        for signal in parsed_result["agent_signals"]
+                    }
+
+                return formatted_result
+            return result
+        except json.JSONDecodeError as e:
+            self.backtest_logger.warning(
+                f"JSON parsing error: {str(e)}")
+            self.backtest_logger.warning(f"Raw result: {result}")
+            return {"decision": {"action": "hold", "quantity": 0}, "analyst_signals": {}}
+
+    def execute_trade(self, action, quantity, current_price, bar=None):
+        """Execute trade with portfolio constraints and the execution model"""
+        if action not in ("buy", "sell") or quantity <= 0:
+            return 0
+
+        bar = bar or {}
+        side = 1 if action == "buy" else -1
+        filled, fill_price, commission = self.execution_model.fill(
+            side,
+            quantity,
+            current_price,
+            bar.get("high", current_price),
+            bar.get("low", current_price),
+            bar.get("volume"),
+            cash=self.portfolio["cash"],
+            position=self.portfolio["stock"]
+        )
+        filled = int(filled)
+        if filled <= 0:
             return 0
-        return 0
+
+        self.portfolio["stock"] += side * filled
+        self.portfolio["cash"] -= side * filled * \
+            float(fill_price) + float(commission)
+        self.transaction_costs += float(commission) + \
+            filled * abs(float(fill_price) - current_price)
+        return filled
 
     def run_backtest(self):
         """Run backtest simulation"""
@@ -250,10 +350,12 @@ class Backtester:
             start_date=self.start_date, end_date=self.end_date)
         dates = pd.DatetimeIndex([dt.strftime('%Y-%m-%d')
                                  for dt in schedule.index])
+        self.load_lookback_history([self.ticker])
+        self.load_shared_inputs([self.ticker])
 
-        self.backtest_logger.info("\nStarting backtest...")
-        print(f"{'Date':<12} {'Code':<6} {'Action':<6} {'Quantity':>8} {'Price':>8} {'Cash':>12} {'Stock':>8} {'Total':>12} {'Bull':>8} {'Bear':>8} {'Neutral':>8}")
-        print("-" * 110)
+        if self.verbosity != "quiet":
+            print(f"{'Date':<12} {'Code':<6} {'Action':<6} {'Quantity':>8} {'Price':>8} {'Cash':>12} {'Stock':>8} {'Total':>12} {'Bull':>8} {'Bear':>8} {'Neutral':>8}")
+            print("-" * 110)
 
         for current_date in dates:
             current_date_str = current_date.strftime("%Y-%m-%d")
@@ -273,14 +375,7 @@ class Backtester:
 
             # Use 365-day lookback window
             lookback_start = (pd.Timestamp(current_date_str) -
-                              pd.Timedelta(days=365)).strftime("%Y-%m-%d")
-
-            self.backtest_logger.info(
-                f"\nProcessing trading day: {current_date_str}")
-            self.backtest_logger.info(
-                f"Using data up to: {decision_date} (previous trading day)")
-            self.backtest_logger.info(
-                f"Historical data range: {lookback_start} to {decision_date}")
+                              pd.Timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
 
             # Get current day's price data for trade execution
             try:
@@ -292,7 +387,8 @@ class Backtester:
                     continue
 
                 # Use opening price for trade execution
-                current_price = df.iloc[0]['open']
+                bar = df.iloc[0].to_dict()
+                current_price = bar['open']
             except Exception as e:
                 self.backtest_logger.error(
                     f"Error getting price data for {current_date_str}: {str(e)}")
@@ -303,59 +399,20 @@ class Backtester:
                 decision_date,
                 lookback_start,
                 self.portfolio,
-                self.num_of_news
+                self.num_of_news,
+                prices=self.lookback_prices(self.ticker, decision_date)
             )
 
-            self.backtest_logger.info(f"\nTrade Date: {current_date_str}")
-            self.backtest_logger.info(
-                f"Decision based on data up to: {decision_date}")
-
-            if "analyst_signals" in output:
-                self.backtest_logger.info("\nAgent Analysis Results:")
-                for agent_name, signal in output["analyst_signals"].items():
-                    self.backtest_logger.info(f"\n{agent_name}:")
-
-                    signal_str = f"- Signal: {signal.get('signal', 'unknown')}"
-                    if 'confidence' in signal:
-                        signal_str += f", Confidence: {signal.get('confidence', 0)*100:.0f}%"
-                    self.backtest_logger.info(signal_str)
-
-                    if 'analysis' in signal:
-                        self.backtest_logger.info("- Analysis:")
-                        analysis = signal['analysis']
-                        if isinstance(analysis, dict):
-                            for key, value in analysis.items():
-                                self.backtest_logger.info(f"  {key}: {value}")
-                        elif isinstance(analysis, list):
-                            for item in analysis:
-                                self.backtest_logger.info(f"  • {item}")
-                        else:
-                            self.backtest_logger.info(f"  {analysis}")
-
-                    if 'reason' in signal:
-                        self.backtest_logger.info("- Decision Rationale:")
-                        reason = signal['reason']
-                        if isinstance(reason, list):
-                            for item in reason:
-                                self.backtest_logger.info(f"  • {item}")
-                        else:
-                            self.backtest_logger.info(f"  • {reason}")
+            self.log_agent_signals(current_date_str, self.ticker, output)
 
             agent_decision = output.get(
                 "decision", {"action": "hold", "quantity": 0})
             action, quantity = agent_decision.get(
                 "action", "hold"), agent_decision.get("quantity", 0)
 
-            self.backtest_logger.info("\nFinal Decision:")
-            self.backtest_logger.info(f"Action: {action.upper()}")
-            self.backtest_logger.info(f"Quantity: {quantity}")
-            if "reason" in agent_decision:
-                self.backtest_logger.info(
-                    f"Reason: {agent_decision['reason']}")
-
             # Execute trade
             executed_quantity = self.execute_trade(
-                action, quantity, current_price)
+                action, quantity, current_price, bar)
 
             # Update portfolio value
             total_value = self.portfolio["cash"] + \
@@ -377,15 +434,44 @@ class Backtester:
             neutral_count = sum(1 for signal in output.get(
                 "analyst_signals", {}).values() if signal.get("signal") == "hold")
 
+            log_event(self.backtest_logger, "day",
+                      date=current_date_str,
+                      decision_date=decision_date,
+                      ticker=self.ticker,
+                      action=action,
+                      quantity=quantity,
+                      executed_quantity=executed_quantity,
+                      price=float(current_price),
+                      cash=self.portfolio["cash"],
+                      stock=self.portfolio["stock"],
+                      total_value=total_value,
+                      bull=bull_count,
+                      bear=bear_count,
+                      neutral=neutral_count,
+                      reason=agent_decision.get("reason"))
+
             # Print trade record
-            print(
-                f"{current_date_str:<12} {self.ticker:<6} {action:<6} {executed_quantity:>8} "
-                f"{current_price:>8.2f} {self.portfolio['cash']:>12.2f} {self.portfolio['stock']:>8} "
-                f"{total_value:>12.2f} {bull_count:>8} {bear_count:>8} {neutral_count:>8}"
-            )
+            if self.verbosity != "quiet":
+                print(
+                    f"{current_date_str:<12} {self.ticker:<6} {action:<6} {executed_quantity:>8} "
+                    f"{current_price:>8.2f} {self.portfolio['cash']:>12.2f} {self.portfolio['stock']:>8} "
+                    f"{total_value:>12.2f} {bull_count:>8} {bear_count:>8} {neutral_count:>8}"
+                )
 
         # Analyze backtest results
         self.analyze_performance()
+        log_event(self.backtest_logger, "node_cache", stats=node_cache.stats())
+        log_event(self.backtest_logger, "fundamentals_store",
+                  stats=fundamentals_store.stats())
+        log_event(self.backtest_logger, "indicator_profile",
+                  stats=indicator_profiler.stats())
+        log_event(self.backtest_logger, "trace_summary", stats=tracer.summary())
+        if self.verbosity == "debug":
+            print("\nIndicator profile:")
+            print(indicator_profiler.report())
+            print("\nCall profile:")
+            print(tracer.report())
+        self.close_logging()
 
     def analyze_performance(self):
         """Analyze backtest performance"""
@@ -404,9 +490,19 @@ class Backtester:
                 performance_df["Portfolio Value"] / self.initial_capital - 1) * 100
             performance_df["Portfolio Value (K)"] = performance_df["Portfolio Value"] / 1000
 
+            # 风险随时间变化：滚动 VaR/CVaR 与回撤
+            daily_returns = performance_df["Daily Return"] / 100
+            performance_df["VaR 95 (%)"] = rolling_historical_var(
+                daily_returns, RISK_WINDOW) * 100
+            performance_df["CVaR 95 (%)"] = rolling_historical_cvar(
+                daily_returns, RISK_WINDOW) * 100
+            performance_df["Drawdown (%)"] = drawdown(
+                performance_df["Portfolio Value"]) * 100
+
             # 创建子图
-            fig, (ax1, ax2) = plt.subplots(
-                2, 1, figsize=(12, 10), height_ratios=[1, 1])
+            plt = _pyplot()
+            fig, (ax1, ax2, ax3) = plt.subplots(
+                3, 1, figsize=(12, 14), height_ratios=[1, 1, 1])
             fig.suptitle("Backtest Analysis", fontsize=12)
 
             # 绘制投资组合价值
@@ -437,6 +533,17 @@ class Backtester:
                              xytext=(0, 10),
                              ha='center')
 
+            # 绘制风险指标
+            ax3.plot(performance_df.index, performance_df["Drawdown (%)"],
+                     label="Drawdown", color='gray')
+            ax3.plot(performance_df.index, performance_df["VaR 95 (%)"],
+                     label=f"VaR 95% ({RISK_WINDOW}d)", color='orange')
+            ax3.plot(performance_df.index, performance_df["CVaR 95 (%)"],
+                     label=f"CVaR 95% ({RISK_WINDOW}d)", color='red')
+            ax3.set_ylabel("Percent (%)")
+            ax3.set_title("Risk Over Time")
+            ax3.legend()
+
             plt.xlabel("Date")
             plt.tight_layout()
 
@@ -451,31 +558,25 @@ class Backtester:
             total_return = (
                 self.portfolio["portfolio_value"] - self.initial_capital) / self.initial_capital
 
-            # 输出回测总结
-            self.backtest_logger.info("\n" + "=" * 50)
-            self.backtest_logger.info("Backtest Summary")
-            self.backtest_logger.info("=" * 50)
-            self.backtest_logger.info(
-                f"Initial Capital: {self.initial_capital:,.2f}")
-            self.backtest_logger.info(
-                f"Final Value: {self.portfolio['portfolio_value']:,.2f}")
-            self.backtest_logger.info(
-                f"Total Return: {total_return * 100:.2f}%")
-
             # 计算夏普比率
-            daily_returns = performance_df["Daily Return"] / 100
             mean_daily_return = daily_returns.mean()
             std_daily_return = daily_returns.std()
             sharpe_ratio = (mean_daily_return / std_daily_return) * \
                 (252 ** 0.5) if std_daily_return != 0 else 0
-            self.backtest_logger.info(f"Sharpe Ratio: {sharpe_ratio:.2f}")
 
             # 计算最大回撤
-            rolling_max = performance_df["Portfolio Value"].cummax()
-            drawdown = (
-                performance_df["Portfolio Value"] / rolling_max - 1) * 100
-            max_drawdown = drawdown.min()
-            self.backtest_logger.info(f"Maximum Drawdown: {max_drawdown:.2f}%")
+            max_drawdown = performance_df["Drawdown (%)"].min()
+
+            # 输出回测总结
+            log_event(self.backtest_logger, "summary",
+                      initial_capital=self.initial_capital,
+                      final_value=self.portfolio['portfolio_value'],
+                      total_return_pct=total_return * 100,
+                      transaction_costs=self.transaction_costs,
+                      sharpe_ratio=sharpe_ratio,
+                      max_drawdown_pct=max_drawdown,
+                      var_95_pct=historical_var(daily_returns) * 100,
+                      cvar_95_pct=historical_cvar(daily_returns) * 100)
 
             return performance_df
         except Exception as e:
@@ -503,8 +604,16 @@ if __name__ == "__main__":
     parser.add_argument('--num-of-news', type=int,
                         default=5,
                         help='Number of news articles to analyze (default: 5)')
+    parser.add_argument('--log-verbosity', type=str, choices=VERBOSITY_LEVELS,
+                        default='normal',
+                        help='Event log detail: quiet (daily records only), normal (+ agent signals), debug (+ agent analysis)')
+    add_execution_arguments(parser)
+    parser.add_argument('--trace-file', type=str,
+                        help='Write a JSON trace of the backtest (node and outbound call timings) to this file')
+    add_transport_arguments(parser)
 
     args = parser.parse_args()
+    configure_from_args(args)
 
     backtester = Backtester(
         agent=run_hedge_fund,
@@ -512,8 +621,14 @@ if __name__ == "__main__":
         start_date=args.start_date,
         end_date=args.end_date,
         initial_capital=args.initial_capital,
-        num_of_news=args.num_of_news
+        num_of_news=args.num_of_news,
+        execution_model=execution_model_from_args(args),
+        verbosity=args.log_verbosity
     )
 
     backtester.run_backtest()
+
+    if args.trace_file:
+        tracer.export(args.trace_file, indicators=indicator_profiler.stats(),
+                      node_cache=node_cache.stats(), transport=transport.stats())
     
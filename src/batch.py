@@ -0,0 +1,332 @@
+"""
+Pre-market batch job for a watchlist.
+
+For one session of a market calendar (pandas_market_calendars), before the
+open, runs four stages and writes a single decision file:
+
+1. prices: one bulk download of the whole watchlist's daily history, plus
+   the benchmark and sector ETF closes
+2. fundamentals: statements, company info and insider trades per name
+3. news: the Alpha Vantage feed per name
+4. decisions: the decision graph per name, on the prefetched prices
+
+Stages 2-4 run on a worker pool. By default the outbound requests go
+through the transport in record mode, into one archive per session. The
+decision stage then reads what the prefetch stages fetched instead of
+calling the services again, and the session can be replayed later with
+--transport replay --archive <that archive>.
+
+    python src/batch.py --tickers AAPL,MSFT,NVDA
+    python src/batch.py --watchlist watchlist.txt --wait --lead-minutes 45
+    python src/batch.py --watchlist watchlist.txt --daemon
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from main import parse_decision, run_hedge_fund_state, validate_num_of_news
+from tools.api import (get_financial_metrics, get_financial_statements, get_insider_trades,
+                       get_market_data, get_price_panel)
+from tools.fundamentals_store import fundamentals_store, is_historical
+from tools.instrumentation import tracer
+from tools.market_panel import benchmark_panel
+from tools.news_crawler import get_stock_news
+from tools.price_arrays import PriceArrays
+from tools.transport import add_transport_arguments, configure_from_args, transport
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_DIR = os.path.join(SRC_DIR, "data", "batch")
+
+DEFAULT_CALENDAR = "NYSE"
+DEFAULT_WORKERS = 4
+LEAD_MINUTES = 30
+
+# 与 market_data_agent 一致：至少一年的日线用于技术分析
+LOOKBACK_DAYS = 365
+
+
+##### Watchlist and Calendar #####
+def load_watchlist(path: str) -> List[str]:
+    """One ticker per line; # starts a comment"""
+    with open(path, "r", encoding="utf-8") as f:
+        tickers = [line.split("#")[0].strip().upper() for line in f]
+    return list(dict.fromkeys(t for t in tickers if t))
+
+
+def market_calendar(name: str = DEFAULT_CALENDAR):
+    # pandas_market_calendars 导入较慢，只在调度时导入
+    import pandas_market_calendars as mcal
+    return mcal.get_calendar(name)
+
+
+def session_on(calendar, date: str) -> Optional[pd.Series]:
+    """The session on date (market_open / market_close in UTC), None if the market is closed"""
+    schedule = calendar.schedule(start_date=date, end_date=date)
+    return schedule.iloc[0] if len(schedule) else None
+
+
+def next_session(calendar, after_date: str = None) -> pd.Series:
+    """
+    The first session that has not closed yet, after after_date when given
+
+    A job started after the open still targets that day's session; its
+    decisions then use data up to the previous close, as before the open.
+    """
+    now = pd.Timestamp.now(tz="UTC")
+    schedule = calendar.schedule(start_date=now.strftime("%Y-%m-%d"),
+                                 end_date=(now + pd.Timedelta(days=14)).strftime("%Y-%m-%d"))
+    schedule = schedule[schedule["market_close"] > now]
+    if after_date:
+        schedule = schedule[schedule.index > pd.Timestamp(after_date)]
+    if schedule.empty:
+        raise RuntimeError("No trading session in the next two weeks")
+    return schedule.iloc[0]
+
+
+def wait_until(when: pd.Timestamp):
+    """Sleep until when (tz-aware); wakes up every few minutes so a clock change is noticed"""
+    while True:
+        remaining = (when - pd.Timestamp.now(tz="UTC")).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 300))
+
+
+##### Stages #####
+@contextlib.contextmanager
+def stage(name: str, timings: Dict[str, Dict[str, Any]]):
+    """Time one stage into timings[name] (also recorded as a batch:name span)"""
+    timings[name] = {}
+    start = time.perf_counter()
+    with tracer.span("batch", name):
+        yield timings[name]
+    timings[name]["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def prefetch_prices(tickers: List[str], start_date: str, session_date: str) -> Dict[str, PriceArrays]:
+    """Daily bars of every ticker up to the session (exclusive) in one request"""
+    panel = get_price_panel(tickers, start_date, session_date)
+    # 技术面和风险节点用到的基准与行业 ETF 收盘价，一次下载后整场共用
+    benchmark_panel.closes(start_date, session_date)
+    prices = {ticker: PriceArrays.from_panel(panel, ticker) for ticker in tickers}
+    return {ticker: bars for ticker, bars in prices.items() if len(bars)}
+
+
+def prefetch_fundamentals(ticker: str, session_date: str):
+    """Request what market_data_agent will need for ticker, so the transport archive has it"""
+    if is_historical(session_date):
+        # 历史日期走时点基本面：报表加载一次后留在 fundamentals_store
+        fundamentals_store.load(ticker)
+    else:
+        get_financial_metrics(ticker)
+        get_financial_statements(ticker)
+    get_insider_trades(ticker)
+    get_market_data(ticker)
+
+
+def run_pool(pool: ThreadPoolExecutor, func: Callable[[str], Any], tickers: List[str]) -> Dict[str, str]:
+    """Run func for every ticker on pool; returns the errors by ticker"""
+    def guarded(ticker):
+        try:
+            func(ticker)
+            return None
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+    errors = dict(zip(tickers, pool.map(guarded, tickers)))
+    return {ticker: error for ticker, error in errors.items() if error}
+
+
+def decide(ticker: str, session_date: str, start_date: str, portfolio: dict, num_of_news: int,
+           prices: Optional[PriceArrays]) -> Dict[str, Any]:
+    """Run the decision graph for ticker; a failure is recorded as its error instead of raised"""
+    if prices is None:
+        # 批量下载里没有这只股票：不再单独请求，记为错误
+        return {"error": f"No price data before {session_date}", "elapsed_ms": 0.0}
+    start = time.perf_counter()
+    try:
+        state = run_hedge_fund_state(ticker, start_date, session_date, portfolio,
+                                     num_of_news=num_of_news, prices=prices)
+        result = {
+            "decision": parse_decision(state["messages"][-1].content),
+            "signals": {name: signal.to_dict() for name, signal in state["signals"].items()},
+        }
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_batch(tickers: List[str], session_date: str, positions: Dict[str, int] = None,
+              initial_capital: float = 100000.0, num_of_news: int = 5,
+              workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """
+    Prefetch and decide for every ticker on session_date
+
+    Returns:
+        dict: decisions by ticker, per-stage timings and the call statistics
+    """
+    positions = positions or {}
+    start_date = (datetime.strptime(session_date, "%Y-%m-%d") -
+                  timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    timings: Dict[str, Dict[str, Any]] = {}
+    started = time.perf_counter()
+
+    with stage("prices", timings) as timing:
+        prices = prefetch_prices(tickers, start_date, session_date)
+        timing["tickers"] = len(prices)
+        timing["missing"] = [t for t in tickers if t not in prices]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        with stage("fundamentals", timings) as timing:
+            timing["errors"] = run_pool(pool, lambda t: prefetch_fundamentals(t, session_date), tickers)
+        with stage("news", timings) as timing:
+            timing["errors"] = run_pool(
+                pool, lambda t: get_stock_news(t, date=session_date, max_news=num_of_news), tickers)
+        with stage("decisions", timings) as timing:
+            results = list(pool.map(
+                lambda t: decide(t, session_date, start_date,
+                                 {"cash": initial_capital, "stock": positions.get(t, 0)},
+                                 num_of_news, prices.get(t)),
+                tickers))
+            decisions = dict(zip(tickers, results))
+            elapsed = sorted(r["elapsed_ms"] for r in results)
+            timing["errors"] = {t: r["error"] for t, r in decisions.items() if "error" in r}
+            timing["mean_ms"] = round(sum(elapsed) / len(elapsed), 2) if elapsed else 0.0
+            timing["max_ms"] = elapsed[-1] if elapsed else 0.0
+    timings["total"] = {"seconds": round(time.perf_counter() - started, 3)}
+
+    return {
+        "session": session_date,
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "tickers": tickers,
+        "workers": workers,
+        "timings": timings,
+        "decisions": decisions,
+        "transport": transport.stats(),
+        "calls": {key: stats for key, stats in tracer.summary().items()
+                  if not key.startswith(("node:", "batch:"))},
+    }
+
+
+def report(result: Dict[str, Any]) -> str:
+    """Text table of the decisions and the stage timings"""
+    lines = [f"Session {result['session']}: {len(result['tickers'])} tickers, {result['workers']} workers", "",
+             f"{'Ticker':<8} {'Action':<6} {'Quantity':>8} {'Confidence':>10} {'ms':>9}", "-" * 45]
+    for ticker, outcome in result["decisions"].items():
+        decision = outcome.get("decision")
+        if isinstance(decision, dict):
+            lines.append(f"{ticker:<8} {decision.get('action', '?'):<6} {decision.get('quantity', 0):>8} "
+                         f"{decision.get('confidence', 0):>10.2f} {outcome['elapsed_ms']:>9.1f}")
+        else:
+            lines.append(f"{ticker:<8} {'error' if 'error' in outcome else '?':<6} {'':>8} {'':>10} "
+                         f"{outcome['elapsed_ms']:>9.1f}  {outcome.get('error', '')}")
+    lines += ["", f"{'Stage':<14} {'Seconds':>9} {'Errors':>7}", "-" * 32]
+    for name, timing in result["timings"].items():
+        lines.append(f"{name:<14} {timing['seconds']:>9.2f} {len(timing.get('errors', {})):>7}")
+    return "\n".join(lines)
+
+
+def write_result(result: Dict[str, Any], path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # 先写临时文件再替换，下游读取时不会看到写了一半的文件
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(f"{path}.tmp", path)
+
+
+def session_transport(args, session_date: str):
+    """Record into the session's archive unless a transport mode was chosen explicitly"""
+    if args.transport != "live":
+        return contextlib.nullcontext()
+    return transport.session("record", os.path.join(BATCH_DIR, f"transport_{session_date}.bin"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Pre-market batch: prefetch data and decide for a whole watchlist')
+    watchlist = parser.add_mutually_exclusive_group(required=True)
+    watchlist.add_argument('--tickers', type=str,
+                           help='Comma-separated stock codes (e.g., AAPL,MSFT,NVDA)')
+    watchlist.add_argument('--watchlist', type=str,
+                           help='File with one stock code per line')
+    parser.add_argument('--date', type=str,
+                        help='Session date (YYYY-MM-DD). Defaults to the next session that has not closed')
+    parser.add_argument('--calendar', type=str, default=DEFAULT_CALENDAR,
+                        help=f'pandas_market_calendars calendar name (default: {DEFAULT_CALENDAR})')
+    parser.add_argument('--wait', action='store_true',
+                        help='Sleep until --lead-minutes before the open, then run')
+    parser.add_argument('--lead-minutes', type=int, default=LEAD_MINUTES,
+                        help=f'With --wait/--daemon, start this many minutes before the open (default: {LEAD_MINUTES})')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running: wait for and process every following session')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Worker threads for the fetch and decision stages (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--initial-capital', type=float, default=100000.0,
+                        help='Cash available per ticker (default: 100,000)')
+    parser.add_argument('--positions', type=str,
+                        help='JSON file of shares held per ticker, e.g. {"AAPL": 10}')
+    parser.add_argument('--num-of-news', type=int, default=5,
+                        help='Number of news articles to analyze for sentiment (default: 5)')
+    parser.add_argument('--output', type=str,
+                        help='Decision file (default: src/data/batch/decisions_<session>.json)')
+    add_transport_arguments(parser)
+
+    args = parser.parse_args()
+    configure_from_args(args)
+    validate_num_of_news(args.num_of_news)
+    if args.workers < 1:
+        raise ValueError("Workers must be at least 1")
+    if args.date and args.daemon:
+        parser.error("--date and --daemon cannot be combined")
+
+    if args.tickers:
+        tickers = list(dict.fromkeys(t.strip().upper() for t in args.tickers.split(",") if t.strip()))
+    else:
+        tickers = load_watchlist(args.watchlist)
+    positions = {}
+    if args.positions:
+        with open(args.positions, "r", encoding="utf-8") as f:
+            positions = {ticker.upper(): int(shares) for ticker, shares in json.load(f).items()}
+
+    calendar = market_calendar(args.calendar)
+    last_session = None
+    while True:
+        if args.date:
+            datetime.strptime(args.date, "%Y-%m-%d")
+            session = session_on(calendar, args.date)
+            if session is None:
+                print(f"{args.calendar} is closed on {args.date}, nothing to do")
+                break
+        else:
+            session = next_session(calendar, last_session)
+        session_date = session.name.strftime("%Y-%m-%d")
+
+        if args.wait or args.daemon:
+            start_at = session["market_open"] - pd.Timedelta(minutes=args.lead_minutes)
+            print(f"Waiting until {start_at.isoformat()} for the {session_date} session")
+            wait_until(start_at)
+
+        # 每个交易日重新开始：会话级缓存（基准收盘价、基本面）不能跨日沿用
+        for cache in (benchmark_panel, fundamentals_store, tracer):
+            cache.clear()
+        with session_transport(args, session_date):
+            result = run_batch(tickers, session_date, positions, args.initial_capital,
+                               args.num_of_news, args.workers)
+        result["calendar"] = args.calendar
+        result["market_open"] = session["market_open"].isoformat()
+
+        output = args.output or os.path.join(BATCH_DIR, f"decisions_{session_date}.json")
+        write_result(result, output)
+        print(report(result))
+        print(f"\nDecisions written to {output}")
+
+        last_session = session_date
+        if not args.daemon:
+            break
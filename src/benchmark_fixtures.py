@@ -0,0 +1,441 @@
+"""
+Recorded service responses for the offline benchmarks.
+
+A fixture set is a directory holding everything the pipeline reads from its
+three external services:
+
+    manifest.json                        source (recorded / synthetic), tickers, dates
+    yfinance/<TICKER>/history.csv        daily OHLCV (Ticker.history and yf.download)
+    yfinance/<TICKER>/info.json          Ticker.info
+    yfinance/<TICKER>/<statement>.csv    financials, cashflow, balance_sheet, insider_trades
+    alpha_vantage/<TICKER>.json          NEWS_SENTIMENT feed items
+    articles.json                        scraped article pages by URL (optional)
+    gemini.json                          LLM responses by prompt kind (sentiment, decision)
+
+record_fixtures() captures a set from the live services, synthesize_fixtures()
+writes a deterministic synthetic one, and replay() points the service clients
+at a set so the unmodified pipeline runs with no network access.
+"""
+import itertools
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from tools.transport import ArchivedResponse, transport
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+
+STATEMENTS = ("financials", "cashflow", "balance_sheet", "insider_trades")
+
+# 历史价格从开始日期前多取一段，覆盖 market_data_agent 的一年回看
+HISTORY_PADDING_DAYS = 400
+
+EXCHANGE_TZ = "America/New_York"
+
+PROMPT_KINDS = ("sentiment", "decision")
+
+
+def prompt_kind(contents: str) -> str:
+    """Which agent a Gemini prompt comes from (news sentiment or portfolio decision)"""
+    return "sentiment" if "sentiment of the following" in contents else "decision"
+
+
+def _seed(ticker: str) -> int:
+    return zlib.crc32(ticker.encode("utf-8"))
+
+
+def _write_json(path: str, obj: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=1, default=str)
+
+
+def _read_json(path: str, default: Any = None) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+##### Fixture Set #####
+class Fixtures:
+    """Read-only view of a fixture set; files are loaded on first use"""
+
+    def __init__(self, path: str):
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            raise FileNotFoundError(f"No fixture set at {path}")
+        self.path = path
+        self.manifest = _read_json(os.path.join(path, "manifest.json"))
+        self.articles = _read_json(os.path.join(path, "articles.json"), {})
+        self.responses = _read_json(os.path.join(path, "gemini.json"), {})
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def _file(self, *parts: str) -> str:
+        return os.path.join(self.path, *parts)
+
+    def history(self, ticker: str) -> pd.DataFrame:
+        key = f"{ticker}/history"
+        with self._lock:
+            if key not in self._frames:
+                path = self._file("yfinance", ticker, "history.csv")
+                frame = pd.read_csv(path, index_col="Date", parse_dates=["Date"]) \
+                    if os.path.exists(path) else pd.DataFrame()
+                self._frames[key] = frame
+            return self._frames[key]
+
+    def statement(self, ticker: str, name: str) -> pd.DataFrame:
+        key = f"{ticker}/{name}"
+        with self._lock:
+            if key not in self._frames:
+                path = self._file("yfinance", ticker, f"{name}.csv")
+                frame = pd.read_csv(path, index_col=0) if os.path.exists(path) else pd.DataFrame()
+                if name != "insider_trades" and not frame.empty:
+                    frame.columns = pd.to_datetime(frame.columns)
+                self._frames[key] = frame
+            return self._frames[key]
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        return _read_json(self._file("yfinance", ticker, "info.json"), {})
+
+    def news(self, ticker: str) -> List[Dict[str, Any]]:
+        return _read_json(self._file("alpha_vantage", f"{ticker}.json"), [])
+
+
+##### Replay Clients #####
+class FixtureTicker:
+    """Stands in for yf.Ticker"""
+
+    def __init__(self, fixtures: Fixtures, ticker: str):
+        self._fixtures = fixtures
+        self.ticker = ticker
+
+    def history(self, start=None, end=None, interval: str = "1d", **kwargs) -> pd.DataFrame:
+        frame = self._fixtures.history(self.ticker)
+        if frame.empty:
+            return frame
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame.index < pd.Timestamp(end)]
+        frame = frame.copy()
+        frame.index = frame.index.tz_localize(EXCHANGE_TZ)
+        return frame
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        return self._fixtures.info(self.ticker)
+
+    @property
+    def financials(self) -> pd.DataFrame:
+        return self._fixtures.statement(self.ticker, "financials")
+
+    @property
+    def cashflow(self) -> pd.DataFrame:
+        return self._fixtures.statement(self.ticker, "cashflow")
+
+    @property
+    def balance_sheet(self) -> pd.DataFrame:
+        return self._fixtures.statement(self.ticker, "balance_sheet")
+
+    @property
+    def insider_trades(self) -> pd.DataFrame:
+        return self._fixtures.statement(self.ticker, "insider_trades")
+
+
+class FixtureYFinance:
+    """Stands in for the yfinance module (Ticker and download)"""
+
+    def __init__(self, fixtures: Fixtures):
+        self._fixtures = fixtures
+
+    def Ticker(self, ticker: str) -> FixtureTicker:
+        return FixtureTicker(self._fixtures, ticker)
+
+    def download(self, tickers, start=None, end=None, **kwargs) -> pd.DataFrame:
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+        frames = {ticker: self.Ticker(ticker).history(start, end) for ticker in tickers}
+        frames = {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+        if not frames:
+            return pd.DataFrame()
+        # yf.download 的列为 (字段, 股票) 两级
+        return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+class FixtureRequests:
+    """Stands in for requests: Alpha Vantage news queries and article pages"""
+
+    def __init__(self, fixtures: Fixtures):
+        self._fixtures = fixtures
+
+    def get(self, url: str, timeout=None, **kwargs) -> ArchivedResponse:
+        parsed = urlparse(url)
+        if "alphavantage" in parsed.netloc:
+            query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+            feed = [item for ticker in query.get("tickers", "").split(",")
+                    for item in self._fixtures.news(ticker)
+                    if query.get("time_from", "") <= item["time_published"] < query.get("time_to", "~")]
+            feed.sort(key=lambda item: item["time_published"], reverse=True)
+            return ArchivedResponse.from_text(json.dumps({"feed": feed[:int(query.get("limit", 50))]}))
+        page = self._fixtures.articles.get(url)
+        return ArchivedResponse.from_text(page) if page is not None else ArchivedResponse(status_code=404)
+
+
+class FixtureModel:
+    """Stands in for the Gemini model: replays the recorded responses of each prompt kind in turn"""
+
+    def __init__(self, fixtures: Fixtures):
+        self._cycles = {kind: itertools.cycle(fixtures.responses.get(kind) or [""])
+                        for kind in PROMPT_KINDS}
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs) -> ArchivedResponse:
+        with self._lock:
+            return ArchivedResponse.from_text(next(self._cycles[prompt_kind(str(contents))]))
+
+
+@contextmanager
+def replay(path: str):
+    """
+    Serve yfinance, Alpha Vantage and Gemini from the fixture set at path.
+
+    The fixture clients take the place of the live clients behind the
+    transport, so in record mode (TRANSPORT_MODE=record) a replayed fixture set is also
+    written to the transport archive. No GEMINI_API_KEY is needed during a
+    replay.
+    """
+    import tools.openrouter_config as openrouter_config
+
+    fixtures = Fixtures(path)
+    targets = [(transport, "yfinance", FixtureYFinance(fixtures)),
+               (transport, "requests", FixtureRequests(fixtures)),
+               (openrouter_config, "model", FixtureModel(fixtures))]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in targets]
+    for module, name, replacement in targets:
+        setattr(module, name, replacement)
+    try:
+        yield fixtures
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+##### Synthetic Set #####
+def _synthetic_history(ticker: str, start: str, end: str) -> pd.DataFrame:
+    rng = np.random.default_rng(_seed(ticker))
+    dates = pd.bdate_range(pd.Timestamp(start) - timedelta(days=HISTORY_PADDING_DAYS), end, name="Date")
+    close = rng.uniform(20, 400) * np.exp(np.cumsum(rng.normal(0.0004, 0.018, len(dates))))
+    spread = np.abs(rng.normal(0, 0.01, len(dates)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.005, len(dates))),
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 20_000_000, len(dates)),
+    }, index=dates).round(4)
+
+
+def _synthetic_statements(ticker: str, end: str) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(_seed(ticker) + 1)
+    periods = pd.DatetimeIndex([f"{year}-12-31" for year in range(pd.Timestamp(end).year - 4,
+                                                                   pd.Timestamp(end).year)])
+    growth = np.cumprod(1 + rng.normal(0.08, 0.05, len(periods)))
+    revenue = rng.uniform(5e9, 5e10) * growth
+    net_income = revenue * rng.uniform(0.08, 0.25)
+    shares = rng.uniform(5e8, 5e9)
+
+    def frame(rows: Dict[str, np.ndarray]) -> pd.DataFrame:
+        # yfinance 的报表列按报告期从新到旧排列
+        return pd.DataFrame(rows, index=periods).T.iloc[:, ::-1]
+
+    return {
+        "financials": frame({
+            "Total Revenue": revenue,
+            "Net Income": net_income,
+            "Operating Income": net_income * 1.3,
+            "Diluted EPS": net_income / shares,
+        }),
+        "cashflow": frame({
+            "Free Cash Flow": net_income * 0.9,
+            "Depreciation": revenue * 0.04,
+            "Capital Expenditure": -revenue * 0.05,
+        }),
+        "balance_sheet": frame({
+            "Total Current Assets": revenue * 0.6,
+            "Total Current Liabilities": revenue * 0.4,
+            "Stockholders Equity": revenue * 0.9,
+            "Total Debt": revenue * 0.3,
+            "Ordinary Shares Number": np.full(len(periods), shares),
+        }),
+        "insider_trades": pd.DataFrame(columns=["Shares", "Value"]),
+    }
+
+
+def _synthetic_news(ticker: str, start: str, end: str) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(_seed(ticker) + 2)
+    feed = []
+    for day in pd.bdate_range(start, end):
+        for i in range(3):
+            tone = ("beats estimates", "faces headwinds", "holds steady")[rng.integers(3)]
+            feed.append({
+                "title": f"{ticker} {tone} as investors weigh the outlook ({day:%b %d}, #{i + 1})",
+                "summary": f"Shares of {ticker} moved as analysts reviewed guidance, margins and demand "
+                           f"trends. The company {tone} according to market commentary on {day:%Y-%m-%d}.",
+                "source": "Synthetic Wire",
+                "url": f"https://example.com/{ticker.lower()}/{day:%Y%m%d}/{i}",
+                "time_published": f"{day:%Y%m%d}T{9 + 3 * i:02d}3000",
+            })
+    return feed
+
+
+def _synthetic_responses() -> Dict[str, List[str]]:
+    signals = [{"agent": agent, "signal": signal, "confidence": confidence}
+               for agent, signal, confidence in (("technical_analyst", "bullish", 0.6),
+                                                 ("fundamentals", "neutral", 0.5),
+                                                 ("sentiment", "bullish", 0.4),
+                                                 ("valuation", "bearish", 0.3),
+                                                 ("risk_management", "hold", 1.0))]
+    decisions = [("buy", 10, 0.65), ("hold", 0, 0.5), ("sell", 5, 0.55), ("buy", 20, 0.7)]
+    return {
+        "sentiment": ["0.3", "-0.2", "0.1", "0.5"],
+        "decision": [json.dumps({"action": action, "quantity": quantity, "confidence": confidence,
+                                 "agent_signals": signals,
+                                 "reasoning": "Synthetic replayed decision."})
+                     for action, quantity, confidence in decisions],
+    }
+
+
+def _write_ticker(path: str, ticker: str, history: pd.DataFrame,
+                  info: Optional[Dict[str, Any]] = None,
+                  statements: Optional[Dict[str, pd.DataFrame]] = None):
+    directory = os.path.join(path, "yfinance", ticker)
+    os.makedirs(directory, exist_ok=True)
+    history.to_csv(os.path.join(directory, "history.csv"), index_label="Date")
+    if info is not None:
+        _write_json(os.path.join(directory, "info.json"), info)
+    for name, frame in (statements or {}).items():
+        frame.to_csv(os.path.join(directory, f"{name}.csv"))
+
+
+def _write_manifest(path: str, source: str, tickers: List[str], start: str, end: str):
+    _write_json(os.path.join(path, "manifest.json"), {
+        "source": source,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "tickers": tickers,
+        "start_date": start,
+        "end_date": end,
+    })
+
+
+def synthesize_fixtures(path: str, tickers: List[str], start: str, end: str) -> str:
+    """Write a deterministic synthetic fixture set (same files for the same arguments)"""
+    from tools.market_panel import MARKET_BENCHMARK, SECTOR_ETFS
+
+    for ticker in tickers:
+        history = _synthetic_history(ticker, start, end)
+        statements = _synthetic_statements(ticker, end)
+        shares = float(statements["balance_sheet"].loc["Ordinary Shares Number"].iloc[0])
+        close = history["Close"]
+        info = {
+            "marketCap": float(close.iloc[-1] * shares),
+            "forwardPE": 22.0,
+            "priceToBook": 3.5,
+            "dividendYield": 0.01,
+            "volume": int(history["Volume"].iloc[-1]),
+            "averageVolume": int(history["Volume"].tail(60).mean()),
+            "fiftyTwoWeekHigh": float(close.tail(252).max()),
+            "fiftyTwoWeekLow": float(close.tail(252).min()),
+            "sector": "Technology",
+        }
+        _write_ticker(path, ticker, history, info, statements)
+        _write_json(os.path.join(path, "alpha_vantage", f"{ticker}.json"),
+                    _synthetic_news(ticker, start, end))
+    for symbol in [MARKET_BENCHMARK] + sorted(set(SECTOR_ETFS.values())):
+        if symbol not in tickers:
+            _write_ticker(path, symbol, _synthetic_history(symbol, start, end))
+    _write_json(os.path.join(path, "gemini.json"), _synthetic_responses())
+    _write_manifest(path, "synthetic", tickers, start, end)
+    return path
+
+
+##### Recording #####
+class RecordingModel:
+    """Wraps the live Gemini model and keeps every response by prompt kind"""
+
+    def __init__(self, model):
+        self._model = model
+        self.responses: Dict[str, List[str]] = {kind: [] for kind in PROMPT_KINDS}
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs):
+        response = self._model.generate_content(contents, **kwargs)
+        with self._lock:
+            self.responses[prompt_kind(str(contents))].append(response.text)
+        return response
+
+
+def _json_safe(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in info.items()
+            if isinstance(value, (str, int, float, bool)) or value is None}
+
+
+def record_fixtures(path: str, tickers: List[str], start: str, end: str) -> str:
+    """
+    Capture a fixture set from the live services (needs network access and
+    the Gemini and Alpha Vantage keys).
+
+    Prices, statements and the news feed for the period are downloaded
+    directly; the LLM responses are captured while the pipeline runs once
+    per ticker on the end date.
+    """
+    import requests
+    import yfinance as yf
+
+    import tools.openrouter_config as openrouter_config
+    from main import run_hedge_fund_state
+    from tools.market_panel import MARKET_BENCHMARK, SECTOR_ETFS
+
+    history_start = (pd.Timestamp(start) - timedelta(days=HISTORY_PADDING_DAYS)).strftime("%Y-%m-%d")
+    history_end = (pd.Timestamp(end) + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def history(symbol: str) -> pd.DataFrame:
+        frame = yf.Ticker(symbol).history(start=history_start, end=history_end)
+        frame = frame[["Open", "High", "Low", "Close", "Volume"]]
+        frame.index = frame.index.tz_localize(None).rename("Date")
+        return frame
+
+    for ticker in tickers:
+        stock = yf.Ticker(ticker)
+        statements = {name: getattr(stock, name, None) for name in STATEMENTS}
+        statements = {name: frame for name, frame in statements.items()
+                      if isinstance(frame, pd.DataFrame)}
+        _write_ticker(path, ticker, history(ticker), _json_safe(stock.info), statements)
+
+        url = (f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={ticker}"
+               f"&time_from={pd.Timestamp(start):%Y%m%dT0000}&time_to={pd.Timestamp(end) + timedelta(days=1):%Y%m%dT0000}"
+               f"&limit=1000&apikey={os.getenv('ALPHA_VANTAGE_API_KEY')}")
+        _write_json(os.path.join(path, "alpha_vantage", f"{ticker}.json"),
+                    requests.get(url, timeout=30).json().get("feed", []))
+    for symbol in [MARKET_BENCHMARK] + sorted(set(SECTOR_ETFS.values())):
+        if symbol not in tickers:
+            _write_ticker(path, symbol, history(symbol))
+
+    recorder = RecordingModel(openrouter_config.gemini_model())
+    openrouter_config.model = recorder
+    try:
+        for ticker in tickers:
+            run_hedge_fund_state(ticker, start, end, {"cash": 100000.0, "stock": 0})
+    finally:
+        openrouter_config.model = recorder._model
+    _write_json(os.path.join(path, "gemini.json"), recorder.responses)
+    _write_manifest(path, "recorded", tickers, start, end)
+    return path
@@ -0,0 +1,138 @@
+"""
+Import time of the entry points, checked against a budget.
+
+Imports each entry module in a fresh interpreter with -X importtime (best
+of at least MIN_RUNS runs) and reports its cumulative import time and the
+heaviest packages it pulls in. Exits with status 1 when a module goes over its
+budget, imports a module that should only be loaded where it is used
+(LAZY_MODULES), or prints anything at import, so it can run as a
+regression check before a commit or in CI.
+
+    python src/benchmark_imports.py
+    python src/benchmark_imports.py --modules main,backtester --top 10
+    python src/benchmark_imports.py --scale 1.5      # slower machine
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 各入口模块的导入时间预算（毫秒，-X importtime 的累计值）
+# 预算比实测最好值高约 40%，机器负载波动不会误报；急切导入重型依赖由 LAZY_MODULES 检查
+IMPORT_BUDGET_MS = {
+    "main": 900,
+    "backtester": 900,
+    "portfolio_backtester": 1000,
+    "streaming": 1100,
+    "service": 1100,
+    "batch": 1100,
+    "client": 150,
+}
+
+# 只在用到时才导入的重型模块
+LAZY_MODULES = (
+    "matplotlib",              # backtester 画图
+    "pandas_market_calendars",  # Backtester 创建时
+    "yfinance",                # transport.yfinance_client()
+    "google.generativeai",     # openrouter_config.gemini_model()
+    "langgraph",               # main.get_app()
+    "bs4",                     # news_crawler.fetch_article_content()
+    "IPython",
+)
+
+RUNS = 5
+# 单次导入时间波动很大，少于这个次数的最好值不可靠
+MIN_RUNS = 3
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """(module, depth, cumulative us) for each line of -X importtime output, in output order"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative)))
+    return rows
+
+
+def package_totals(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Cumulative us per top-level package, counting only its outermost imports"""
+    totals: Dict[str, int] = {}
+    # 输出是后序的：父模块在其子模块之后
+    parents: List[str] = []
+    for name, depth, cumulative in reversed(rows):
+        del parents[depth:]
+        package = name.split(".")[0]
+        if not parents or parents[-1].split(".")[0] != package:
+            totals[package] = totals.get(package, 0) + cumulative
+        parents.append(name)
+    return totals
+
+
+def measure_import(module: str, runs: int = RUNS):
+    """Best cumulative import time (ms) of module, its import rows and anything it printed"""
+    best = None
+    for _ in range(max(runs, MIN_RUNS)):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=SRC_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        rows = parse_importtime(result.stderr)
+        total_ms = next(c for name, depth, c in reversed(rows) if name == module and depth == 0) / 1000
+        if best is None or total_ms < best[0]:
+            best = (total_ms, rows, result.stdout)
+    return best
+
+
+def check_module(module: str, budget_ms: float, runs: int = RUNS, top: int = 5):
+    """Import time of module and the list of budget / lazy-import / output violations"""
+    total_ms, rows, stdout = measure_import(module, runs)
+    imported = {name for name, _, _ in rows}
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(f"{total_ms:.0f} ms is over the {budget_ms:.0f} ms budget")
+    for lazy in LAZY_MODULES:
+        if lazy in imported:
+            problems.append(f"imports {lazy} at import time")
+    if stdout.strip():
+        problems.append(f"prints at import: {stdout.strip().splitlines()[0]!r}")
+    packages = sorted(package_totals(rows).items(), key=lambda item: -item[1])
+    heaviest = [(name, us / 1000) for name, us in packages if name != module][:top]
+    return total_ms, heaviest, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the entry points, checked against a budget")
+    parser.add_argument("--modules", type=str, default=",".join(IMPORT_BUDGET_MS),
+                        help="Comma-separated entry modules (default: all budgeted modules)")
+    parser.add_argument("--runs", type=int, default=RUNS,
+                        help=f"Imports per module, the best one counts (default: {RUNS}, at least {MIN_RUNS})")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget, for slower or faster machines (default: 1.0)")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Heaviest packages shown per module (default: 5)")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'Module':<22} {'Import ms':>10} {'Budget ms':>10}  Heaviest packages (ms)")
+    print("-" * 100)
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        budget = IMPORT_BUDGET_MS.get(module, max(IMPORT_BUDGET_MS.values())) * args.scale
+        total_ms, heaviest, problems = check_module(module, budget, args.runs, args.top)
+        packages = ", ".join(f"{name} {ms:.0f}" for name, ms in heaviest)
+        print(f"{module:<22} {total_ms:>10.1f} {budget:>10.0f}  {packages}")
+        for problem in problems:
+            print(f"{'':<22} <-- {problem}")
+        failed = failed or bool(problems)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Peak memory of the decision pipeline for a small and a large universe.
+
+Runs run_hedge_fund_state offline (synthetic fixture set, see
+benchmark_fixtures.py) for 1 and for 500 tickers, one after the other as a
+portfolio backtest day does, each case in a fresh process so that its max
+RSS is its own. Reports the max RSS, the RSS left after the runs, the peak
+traced allocation of a single run, the largest state the graph carries
+between two steps (what a checkpointer or a "values" stream would hold) and
+the number of messages in the final state.
+
+    python src/benchmark_memory.py
+    python src/benchmark_memory.py --universes 1,100,500
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmark_fixtures import FIXTURES_DIR, replay, synthesize_fixtures
+
+UNIVERSES = (1, 500)
+MEMORY_FIXTURES = os.path.join(FIXTURES_DIR, "synthetic_universe")
+START_DATE = "2024-01-02"
+END_DATE = "2024-06-28"
+
+
+def universe(n: int):
+    return [f"T{i:03d}" for i in range(n)]
+
+
+def current_rss_mb() -> float:
+    """Resident set size now (Linux /proc, falls back to the max RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        from benchmark_pipeline import max_rss_mb
+        return max_rss_mb()
+
+
+def ensure_fixtures(n: int) -> str:
+    manifest = os.path.join(MEMORY_FIXTURES, "manifest.json")
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            if len(json.load(f)["tickers"]) >= n:
+                return MEMORY_FIXTURES
+    print(f"Generating synthetic fixtures for {n} tickers in {MEMORY_FIXTURES}")
+    return synthesize_fixtures(MEMORY_FIXTURES, universe(n), START_DATE, END_DATE)
+
+
+def state_bytes(state) -> int:
+    """Approximate size of a state snapshot (a feature frame counts its table)"""
+    from tools.instrumentation import payload_bytes
+    data = sum(payload_bytes(getattr(value, "df", value)) for value in state["data"].values())
+    return data + sum(payload_bytes(message.content) for message in state["messages"])
+
+
+def largest_step_state(ticker: str) -> int:
+    from agents.state import run_store
+    from main import app, initial_state
+
+    largest = 0
+    with run_store():
+        for state in app.stream(initial_state(ticker, START_DATE, END_DATE, {"cash": 100000.0, "stock": 0}),
+                                stream_mode="values"):
+            largest = max(largest, state_bytes(state))
+    return largest
+
+
+def measure(n: int):
+    """Worker: run n tickers in this process and return its memory figures"""
+    from benchmark_pipeline import clear_caches, max_rss_mb, quiet, scratch_directory
+    from main import run_hedge_fund_state
+
+    def run(ticker):
+        return run_hedge_fund_state(ticker, START_DATE, END_DATE, {"cash": 100000.0, "stock": 0})
+
+    with replay(MEMORY_FIXTURES), scratch_directory(), quiet():
+        run("T000")  # 导入和初始化的开销不计入
+        clear_caches()
+        gc.collect()
+        baseline = current_rss_mb()
+
+        tracemalloc.start()
+        state = run("T000")
+        run_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+        messages = len(state["messages"])
+        del state
+        step_state = largest_step_state("T000")
+
+        start = time.perf_counter()
+        for ticker in universe(n):
+            run(ticker)
+        seconds = time.perf_counter() - start
+        gc.collect()
+    return {
+        "tickers": n,
+        "max_rss_mb": max_rss_mb(),
+        "rss_before_mb": baseline,
+        "rss_after_mb": current_rss_mb(),
+        "run_peak_mb": run_peak,
+        "step_state_kb": step_state / 1024,
+        "state_messages": messages,
+        "runs_per_second": n / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of the decision pipeline")
+    parser.add_argument("--universes", type=str, default=",".join(map(str, UNIVERSES)),
+                        help="Comma-separated universe sizes (default: 1,500)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker)))
+        return
+
+    sizes = [int(n) for n in args.universes.split(",")]
+    ensure_fixtures(max(sizes))
+    print(f"{'Tickers':>8} {'Max RSS MB':>11} {'RSS before':>11} {'RSS after':>10} "
+          f"{'Run peak MB':>12} {'Step state KB':>14} {'Messages':>9} {'Runs/s':>7}")
+    print("-" * 91)
+    for n in sizes:
+        # 每种规模单独一个进程，max RSS 才不受前一次影响
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(n)],
+                                capture_output=True, text=True, check=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{r['tickers']:>8} {r['max_rss_mb']:>11.1f} {r['rss_before_mb']:>11.1f} "
+              f"{r['rss_after_mb']:>10.1f} {r['run_peak_mb']:>12.2f} {r['step_state_kb']:>14.1f} "
+              f"{r['state_messages']:>9} {r['runs_per_second']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
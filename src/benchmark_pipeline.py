@@ -0,0 +1,285 @@
+"""
+Offline benchmark of the whole decision pipeline.
+
+Replays a fixture set (yfinance, Alpha Vantage and Gemini responses, see
+benchmark_fixtures.py) and measures:
+
+- end-to-end run_hedge_fund latency, cold (empty caches) and warm
+- mean latency of every graph node (from the tracer)
+- backtest speed in trading days per second (LLM rate limiting off)
+- peak traced memory of a cold run and of the backtest, and the process max RSS
+
+Each run is appended to a results file together with the git commit, so
+changes can be compared across commits. A synthetic fixture set is
+generated on first use; --record captures a real one instead.
+
+    python src/benchmark_pipeline.py
+    python src/benchmark_pipeline.py --compare
+    python src/benchmark_pipeline.py --record --fixtures src/data/fixtures/recorded
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmark_fixtures import FIXTURES_DIR, Fixtures, record_fixtures, replay, synthesize_fixtures
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(SRC_DIR, "data", "benchmarks", "pipeline.jsonl")
+SYNTHETIC_DIR = os.path.join(FIXTURES_DIR, "synthetic")
+
+TICKERS = ("AAPL", "MSFT")
+START_DATE = "2024-01-02"
+END_DATE = "2024-06-28"
+BACKTEST_START = "2024-06-03"
+REPEATS = 5
+
+# 对比时超过该比例的变化会被标出
+REGRESSION_THRESHOLD = 0.10
+
+
+##### Helpers #####
+def clear_caches():
+    """Empty every process-wide cache so the next run is cold"""
+    from agents.features import indicator_profiler
+    from agents.node_cache import node_cache
+    from tools.fundamentals_store import fundamentals_store
+    from tools.instrumentation import tracer
+    from tools.market_panel import benchmark_panel
+
+    for cache in (node_cache, fundamentals_store, benchmark_panel, indicator_profiler, tracer):
+        cache.clear()
+
+
+@contextlib.contextmanager
+def scratch_directory():
+    """Run inside an empty working directory so the news and sentiment file caches start empty"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(previous)
+
+
+def quiet():
+    """Swallow the agents' console output"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    cwd=SRC_DIR, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def max_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+##### Measurements #####
+def run_once(ticker: str):
+    from main import run_hedge_fund_state
+    return run_hedge_fund_state(ticker, START_DATE, END_DATE, {"cash": 100000.0, "stock": 0})
+
+
+def measure_runs(tickers, repeats: int):
+    """Cold and warm end-to-end latency (ms) plus mean node latency"""
+    from tools.instrumentation import tracer
+
+    # 先跑一次不计时，排除首次导入和初始化的开销
+    with scratch_directory(), quiet():
+        run_once(tickers[0])
+
+    cold, warm = [], []
+    node_ms = {}
+    for _ in range(repeats):
+        for ticker in tickers:
+            clear_caches()
+            with scratch_directory(), quiet():
+                start = time.perf_counter()
+                run_once(ticker)
+                cold.append((time.perf_counter() - start) * 1000)
+                for name, stats in tracer.summary().items():
+                    if name.startswith("node:"):
+                        node_ms.setdefault(name[5:], []).append(stats["mean_ms"])
+                start = time.perf_counter()
+                run_once(ticker)
+                warm.append((time.perf_counter() - start) * 1000)
+    return {
+        "run_cold_ms": statistics.median(cold),
+        "run_warm_ms": statistics.median(warm),
+        "nodes_ms": {name: statistics.median(values) for name, values in sorted(node_ms.items())},
+    }
+
+
+def measure_peak_memory(ticker: str) -> float:
+    """Peak traced allocation (MB) of one cold run"""
+    clear_caches()
+    with scratch_directory(), quiet():
+        tracemalloc.start()
+        try:
+            run_once(ticker)
+            return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+
+
+def measure_backtest(ticker: str, trace_memory: bool):
+    """Backtest speed (trading days per second) and, optionally, its peak traced memory"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from backtester import Backtester
+    from main import run_hedge_fund
+
+    clear_caches()
+    with scratch_directory(), quiet():
+        backtester = Backtester(run_hedge_fund, ticker, BACKTEST_START, END_DATE,
+                                100000.0, verbosity="quiet")
+        # 回放时没有真实的 API 配额
+        backtester.calls_per_minute = float("inf")
+        backtester.min_call_interval = 0
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            backtester.run_backtest()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+    days = len(backtester.portfolio_values)
+    return {"days": days, "days_per_second": days / seconds, "peak_mb": peak}
+
+
+def run_benchmark(fixtures_path: str, repeats: int):
+    fixtures = Fixtures(fixtures_path)
+    tickers = [t for t in TICKERS if t in fixtures.manifest["tickers"]] or fixtures.manifest["tickers"][:2]
+    with replay(fixtures_path):
+        runs = measure_runs(tickers, repeats)
+        backtest = measure_backtest(tickers[0], trace_memory=False)
+        run_peak = measure_peak_memory(tickers[0])
+        backtest_peak = measure_backtest(tickers[0], trace_memory=True)["peak_mb"]
+    return {
+        **runs,
+        "backtest_days": backtest["days"],
+        "backtest_days_per_second": backtest["days_per_second"],
+        "run_peak_mb": run_peak,
+        "backtest_peak_mb": backtest_peak,
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+##### Results #####
+def load_results(path: str = RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(result, path: str = RESULTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def flatten(metrics, prefix: str = ""):
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif value is not None:
+            flat[prefix + key] = value
+    return flat
+
+
+def report(result, baseline=None) -> str:
+    """Metrics table, with the change against baseline when given"""
+    current = flatten(result["metrics"])
+    previous = flatten(baseline["metrics"]) if baseline else {}
+    header = f"{'Metric':<42} {'Value':>12}"
+    if baseline:
+        header += f" {'Baseline':>12} {'Change':>8}  (baseline {baseline.get('commit')}, {baseline['timestamp']})"
+    lines = [header, "-" * 80]
+    for key, value in current.items():
+        line = f"{key:<42} {value:>12.2f}"
+        if key in previous and previous[key]:
+            change = value / previous[key] - 1
+            # 吞吐量越大越好，其余指标越小越好
+            worse = change < -REGRESSION_THRESHOLD if key.endswith("per_second") else change > REGRESSION_THRESHOLD
+            line += f" {previous[key]:>12.2f} {change:>+8.1%}{'  <-- regression' if worse else ''}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the decision pipeline")
+    parser.add_argument("--fixtures", type=str, default=SYNTHETIC_DIR,
+                        help="Fixture set directory (default: synthetic set, generated if missing)")
+    parser.add_argument("--record", action="store_true",
+                        help="Record the fixture set from the live services first (network and API keys needed)")
+    parser.add_argument("--tickers", type=str, default=",".join(TICKERS),
+                        help="Tickers of a new fixture set (default: AAPL,MSFT)")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help=f"Runs per ticker for the latency medians (default: {REPEATS})")
+    parser.add_argument("--compare", nargs="?", const="previous", default=None,
+                        help="Show the change against the previous result, or against a given commit")
+    parser.add_argument("--no-save", action="store_true",
+                        help="Do not append the result to the results file")
+    args = parser.parse_args()
+
+    tickers = [t.strip().upper() for t in args.tickers.split(",") if t.strip()]
+    if args.record:
+        record_fixtures(args.fixtures, tickers, START_DATE, END_DATE)
+    elif not os.path.exists(os.path.join(args.fixtures, "manifest.json")):
+        print(f"Generating synthetic fixtures in {args.fixtures}")
+        synthesize_fixtures(args.fixtures, tickers, START_DATE, END_DATE)
+
+    commit, dirty = git_commit()
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "fixtures": Fixtures(args.fixtures).manifest["source"],
+        "repeats": args.repeats,
+        "metrics": run_benchmark(args.fixtures, args.repeats),
+    }
+
+    baseline = None
+    if args.compare:
+        history = [r for r in load_results() if r.get("fixtures") == result["fixtures"]]
+        if args.compare != "previous":
+            history = [r for r in history if r.get("commit") == args.compare]
+        baseline = history[-1] if history else None
+        if baseline is None:
+            print(f"No stored result to compare with ({args.compare})")
+    print(report(result, baseline))
+
+    if not args.no_save:
+        save_result(result)
+        print(f"\nResult saved to {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of the price history representation carried in the agent state.
+
+Compares the legacy path (iterrows into a list of dicts, then prices_to_df
+parsing it back) with the columnar PriceArrays path, on synthetic yfinance
+frames of 1 and 10 years. No network access is needed.
+
+    python src/benchmark_prices.py
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from tools.price_arrays import PriceArrays
+
+HISTORIES = {"1y": 252, "10y": 2520}
+
+
+def synthetic_history(n_bars: int, seed: int = 0) -> pd.DataFrame:
+    """A frame shaped like yfinance's Ticker.history() output"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end="2024-12-31", periods=n_bars,
+                           tz="America/New_York", name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars)))
+    return pd.DataFrame({
+        "Open": close * 0.995,
+        "High": close * 1.01,
+        "Low": close * 0.985,
+        "Close": close,
+        "Volume": rng.integers(1e6, 1e7, n_bars),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
+
+
+##### Legacy Path #####
+def legacy_records(df: pd.DataFrame):
+    prices = []
+    for date, row in df.iterrows():
+        prices.append({
+            "time": date.strftime("%Y-%m-%d"),
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+            "volume": int(row["Volume"])
+        })
+    return prices
+
+
+def legacy_to_df(prices) -> pd.DataFrame:
+    df = pd.DataFrame(prices)
+    df["Date"] = pd.to_datetime(df["time"])
+    df.set_index("Date", inplace=True)
+    for col in ["open", "close", "high", "low", "volume"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df.sort_index(inplace=True)
+    return df
+
+
+def deep_size(prices) -> int:
+    """Approximate bytes held by a list of dicts"""
+    size = sys.getsizeof(prices)
+    for record in prices:
+        size += sys.getsizeof(record)
+        size += sum(sys.getsizeof(v) for v in record.values())
+    return size
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def allocated(func) -> int:
+    """Bytes still allocated by func's result"""
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def run():
+    print(f"{'History':<8} {'Path':<10} {'Fetch ms':>9} {'To DF ms':>9} "
+          f"{'State KB':>9} {'Alloc KB':>9}")
+    print("-" * 60)
+    for label, n_bars in HISTORIES.items():
+        df = synthetic_history(n_bars)
+
+        records = legacy_records(df)
+        arrays = PriceArrays.from_yfinance(df)
+        rows = {
+            "legacy": (best_of(lambda: legacy_records(df)),
+                       best_of(lambda: legacy_to_df(records)),
+                       deep_size(records),
+                       allocated(lambda: legacy_records(df))),
+            "columnar": (best_of(lambda: PriceArrays.from_yfinance(df)),
+                         best_of(arrays.to_df),
+                         arrays.nbytes,
+                         allocated(lambda: PriceArrays.from_yfinance(df))),
+        }
+        for path, (fetch, to_df, state, alloc) in rows.items():
+            print(f"{label:<8} {path:<10} {fetch * 1000:>9.3f} {to_df * 1000:>9.3f} "
+                  f"{state / 1024:>9.1f} {alloc / 1024:>9.1f}")
+
+        legacy, columnar = rows["legacy"], rows["columnar"]
+        print(f"{label:<8} {'speedup':<10} {legacy[0] / columnar[0]:>8.1f}x "
+              f"{legacy[1] / columnar[1]:>8.1f}x {legacy[2] / columnar[2]:>8.1f}x "
+              f"{legacy[3] / columnar[3]:>8.1f}x")
+
+        # 两种路径得到的 DataFrame 数值必须一致
+        pd.testing.assert_frame_equal(
+            legacy_to_df(records)[["open", "high", "low", "close", "volume"]],
+            arrays.to_df(), check_freq=False, check_index_type=False)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,58 @@
+"""
+Benchmark of the position sizers.
+
+Sizes a synthetic book (factor-model returns, random signal scores) with
+each method and checks the few-milliseconds-per-rebalance target for 500
+names. No network access is needed.
+
+    python src/benchmark_sizing.py
+"""
+import time
+
+import numpy as np
+
+from tools.covariance import shrinkage_covariance
+from tools.position_sizing import PositionSizer
+
+UNIVERSE_SIZES = (50, 500, 2000)
+N_PERIODS = 252
+N_FACTORS = 5
+EQUITY = 1e7
+TARGET_MS = 10
+
+
+def synthetic_book(n, seed=0):
+    """Daily returns of n names driven by a few factors, plus scores and prices"""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (N_PERIODS, N_FACTORS))
+    loadings = rng.normal(0, 1, (N_FACTORS, n))
+    returns = factors @ loadings + rng.normal(0, 0.015, (N_PERIODS, n))
+    covariance, _ = shrinkage_covariance(returns)
+    return covariance, rng.uniform(-1, 1, n), rng.uniform(10, 500, n)
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run():
+    print(f"{'Method':<15} {'Names':>6} {'ms':>9} {'Held':>6} {'Gross':>7}")
+    print("-" * 47)
+    for n in UNIVERSE_SIZES:
+        covariance, scores, prices = synthetic_book(n)
+        for method in ("volatility", "kelly", "mean_variance"):
+            sizer = PositionSizer(method=method, max_weight=0.05)
+            elapsed = best_of(lambda: sizer.target_quantities(scores, covariance, EQUITY, prices))
+            weights = sizer.weights(scores, covariance)
+            flag = "" if n != 500 or elapsed * 1000 < TARGET_MS else "  over target"
+            print(f"{method:<15} {n:>6} {elapsed * 1000:>9.2f} {np.count_nonzero(weights):>6} "
+                  f"{np.abs(weights).sum():>7.2f}{flag}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,121 @@
+"""
+Thin command line client of the decision service (service.py).
+
+Takes the same arguments as main.py but sends the request to a running
+service, so it only imports the standard library and starts in a few
+milliseconds.
+
+    python src/client.py --ticker AAPL --end-date 2024-06-28
+    python src/client.py --ticker AAPL --socket /tmp/hedge_fund.sock
+    python src/client.py --stats
+"""
+import argparse
+import http.client
+import json
+import socket
+import sys
+from urllib.parse import urlsplit
+
+# 与 service.py 的默认监听地址一致
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket"""
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method: str, path: str, body=None, url: str = DEFAULT_URL, socket_path: str = None,
+            timeout: float = None):
+    """
+    Send one request to the service
+
+    Returns:
+        tuple: (HTTP status, decoded JSON body)
+    """
+    if socket_path:
+        connection = UnixHTTPConnection(socket_path, timeout)
+    else:
+        parts = urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Request a trading decision from the decision service')
+    parser.add_argument('--ticker', type=str,
+                        help='Stock ticker symbol')
+    parser.add_argument('--start-date', type=str,
+                        help='Start date (YYYY-MM-DD). Defaults to 3 months before end date')
+    parser.add_argument('--end-date', type=str,
+                        help='End date (YYYY-MM-DD). Defaults to today')
+    parser.add_argument('--show-reasoning', action='store_true',
+                        help='Show the signal of each agent')
+    parser.add_argument('--initial-capital', type=float, default=100000.0,
+                        help='Initial cash amount (default: 100,000)')
+    parser.add_argument('--num-of-news', type=int, default=5,
+                        help='Number of news articles to analyze for sentiment (default: 5)')
+    parser.add_argument('--interval', type=str, default='1d', choices=['1d', '1h', '5m', '1m'],
+                        help='Bar size of the price history (default: 1d)')
+    parser.add_argument('--valuation-mode', type=str, default='point', choices=['point', 'monte_carlo'],
+                        help='Valuation signal from a point estimate or a Monte Carlo DCF (default: point)')
+    parser.add_argument('--url', type=str, default=DEFAULT_URL,
+                        help=f'Service address (default: {DEFAULT_URL})')
+    parser.add_argument('--socket', type=str,
+                        help='Connect to the service on this Unix socket instead of --url')
+    parser.add_argument('--timeout', type=float, default=600.0,
+                        help='Seconds to wait for the decision (default: 600)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the service statistics instead of requesting a decision')
+
+    args = parser.parse_args()
+    connection = {"url": args.url, "socket_path": args.socket, "timeout": args.timeout}
+
+    try:
+        if args.stats:
+            status, body = request("GET", "/stats", **connection)
+        elif args.ticker:
+            status, body = request("POST", "/decide", {
+                "ticker": args.ticker,
+                "start_date": args.start_date,
+                "end_date": args.end_date,
+                "portfolio": {"cash": args.initial_capital, "stock": 0},
+                "num_of_news": args.num_of_news,
+                "interval": args.interval,
+                "valuation_mode": args.valuation_mode,
+            }, **connection)
+        else:
+            parser.error("--ticker is required unless --stats is given")
+    except OSError as e:
+        sys.exit(f"Cannot reach the decision service ({args.socket or args.url}): {e}")
+
+    if status != 200:
+        sys.exit(f"Service error {status}: {body.get('error')}")
+    if args.stats:
+        print(json.dumps(body, indent=2))
+    else:
+        if args.show_reasoning:
+            for name, signal in body["signals"].items():
+                print(f"\n{name}:")
+                print(json.dumps(signal, indent=2))
+        print("\nFinal Result:")
+        decision = body["decision"]
+        print(json.dumps(decision, indent=2) if isinstance(decision, dict) else decision)
+        print(f"\n({body['elapsed_ms']:.0f} ms in the service)")
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+##### Execution Kernels #####
+# 所有函数均支持标量或 NumPy 数组输入（按广播规则计算），
+# 因此同一套代码既可用于单笔交易，也可用于多股票或参数扫描。
+
+def fill_price(side, open_price, high, low, spread_fraction=0.0):
+    """
+    Price paid (side=+1) or received (side=-1) after crossing half the spread.
+
+    The spread is estimated as a fraction of the day's high-low range.
+    """
+    spread = spread_fraction * (np.asarray(high, dtype=float) -
+                                np.asarray(low, dtype=float))
+    return np.asarray(open_price, dtype=float) + np.sign(side) * spread / 2
+
+
+def commission(quantity, price, fixed=0.0, bps=0.0):
+    """Commission charged per order: a fixed fee plus basis points of notional"""
+    quantity = np.asarray(quantity, dtype=float)
+    notional = quantity * np.asarray(price, dtype=float)
+    return np.where(quantity > 0, fixed + notional * bps / 10000.0, 0.0)
+
+
+def participation_limit(volume, participation_rate=None):
+    """Maximum fillable quantity given the day's volume and participation cap"""
+    if participation_rate is None or volume is None:
+        return np.inf
+    volume = np.nan_to_num(np.asarray(volume, dtype=float), nan=0.0)
+    return np.floor(volume * participation_rate)
+
+
+def affordable_quantity(cash, price, fixed=0.0, bps=0.0):
+    """Largest whole quantity whose cost plus commission fits in the cash"""
+    unit_cost = np.asarray(price, dtype=float) * (1 + bps / 10000.0)
+    budget = np.asarray(cash, dtype=float) - fixed
+    return np.floor(np.maximum(budget, 0.0) / unit_cost)
+
+
+@dataclass
+class ExecutionModel:
+    """
+    Pluggable fill model used by the backtesters.
+
+    Attributes:
+        commission_fixed: Fixed fee per order
+        commission_bps: Commission in basis points of traded notional
+        spread_fraction: Share of the high-low range used as the full spread
+        participation_rate: Max fraction of daily volume that can be filled,
+            None for no volume constraint
+
+    The default model fills everything at the open with no costs.
+    """
+    commission_fixed: float = 0.0
+    commission_bps: float = 0.0
+    spread_fraction: float = 0.0
+    participation_rate: Optional[float] = None
+
+    def fill(self, side, quantity, open_price, high, low, volume=None, cash=None, position=None):
+        """
+        Simulate fills for one or many orders.
+
+        Args:
+            side: +1 for buys, -1 for sells
+            quantity: Requested quantity
+            open_price, high, low, volume: The execution day's bar
+            cash: Available cash, limits buys (optional)
+            position: Current holdings, limits sells (optional)
+
+        Returns:
+            tuple: (filled quantity, fill price, commission), partial fills included
+        """
+        price = fill_price(side, open_price, high, low, self.spread_fraction)
+        filled = np.minimum(np.asarray(quantity, dtype=float),
+                            participation_limit(volume, self.participation_rate))
+        if cash is not None and np.all(np.asarray(side) > 0):
+            filled = np.minimum(filled, affordable_quantity(
+                cash, price, self.commission_fixed, self.commission_bps))
+        if position is not None and np.all(np.asarray(side) < 0):
+            filled = np.minimum(filled, np.asarray(position, dtype=float))
+        filled = np.maximum(np.floor(filled), 0.0)
+        fees = commission(filled, price, self.commission_fixed,
+                          self.commission_bps)
+        return filled, price, fees
+
+
+def add_execution_arguments(parser):
+    """Register the execution model options on an argparse parser"""
+    parser.add_argument('--commission-fixed', type=float, default=0.0,
+                        help='Fixed commission per order (default: 0)')
+    parser.add_argument('--commission-bps', type=float, default=0.0,
+                        help='Commission in basis points of notional (default: 0)')
+    parser.add_argument('--spread-fraction', type=float, default=0.0,
+                        help='Spread as a fraction of the high-low range (default: 0)')
+    parser.add_argument('--participation-rate', type=float, default=None,
+                        help='Max fraction of daily volume filled per order (default: unlimited)')
+
+
+def execution_model_from_args(args) -> ExecutionModel:
+    return ExecutionModel(
+        commission_fixed=args.commission_fixed,
+        commission_bps=args.commission_bps,
+        spread_fraction=args.spread_fraction,
+        participation_rate=args.participation_rate,
+    )
@@ -1,69 +1,188 @@
 from datetime import datetime, timedelta
 import argparse
-from agents.valuation import valuation_agent
-from agents.state import AgentState
+import json
+import threading
+from agents.valuation import VALUATION_MODES, valuation_agent
+from agents.state import AgentState, invoke_graph
 from agents.sentiment import sentiment_agent
 from agents.risk_manager import risk_management_agent
 from agents.technicals import technical_analyst_agent
 from agents.portfolio_manager import portfolio_management_agent
 from agents.market_data import market_data_agent
 from agents.fundamentals import fundamentals_agent
-from langgraph.graph import END, StateGraph
+from agents.features import feature_frame_agent, indicator_profiler
+from agents.node_cache import node_cache
+from tools.api import validate_interval
+from tools.instrumentation import traced_node, tracer
+from tools.transport import add_transport_arguments, configure_from_args, transport
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
 load_dotenv()  # 加载 .env 文件中的环境变量
 
 
 ##### Run the Hedge Fund #####
-def run_hedge_fund(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5):
-    final_state = app.invoke(
-        {
-            "messages": [
-                HumanMessage(
-                    content="Make a trading decision based on the provided data.",
-                )
-            ],
-            "data": {
-                "ticker": ticker,
-                "portfolio": portfolio,
-                "start_date": start_date,
-                "end_date": end_date,
-                "num_of_news": num_of_news,
-            },
-            "metadata": {
-                "show_reasoning": show_reasoning,
-            }
-        },
-    )
+def run_hedge_fund(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5,
+                   prices=None, market_data=None, insider_trades=None):
+    final_state = run_hedge_fund_state(
+        ticker, start_date, end_date, portfolio, show_reasoning, num_of_news, prices=prices,
+        market_data=market_data, insider_trades=insider_trades)
     return final_state["messages"][-1].content
 
 
-# Define the new workflow
-workflow = StateGraph(AgentState)
-
-# Add nodes
-workflow.add_node("market_data_agent", market_data_agent)
-workflow.add_node("technical_analyst_agent", technical_analyst_agent)
-workflow.add_node("fundamentals_agent", fundamentals_agent)
-workflow.add_node("sentiment_agent", sentiment_agent)
-workflow.add_node("risk_management_agent", risk_management_agent)
-workflow.add_node("portfolio_management_agent", portfolio_management_agent)
-workflow.add_node("valuation_agent", valuation_agent)
-
-# Define the workflow
-workflow.set_entry_point("market_data_agent")
-workflow.add_edge("market_data_agent", "technical_analyst_agent")
-workflow.add_edge("market_data_agent", "fundamentals_agent")
-workflow.add_edge("market_data_agent", "sentiment_agent")
-workflow.add_edge("market_data_agent", "valuation_agent")
-workflow.add_edge("technical_analyst_agent", "risk_management_agent")
-workflow.add_edge("fundamentals_agent", "risk_management_agent")
-workflow.add_edge("sentiment_agent", "risk_management_agent")
-workflow.add_edge("valuation_agent", "risk_management_agent")
-workflow.add_edge("risk_management_agent", "portfolio_management_agent")
-workflow.add_edge("portfolio_management_agent", END)
-
-app = workflow.compile()
+def run_hedge_fund_state(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5,
+                         interval: str = "1d", prices=None, valuation_mode: str = "point",
+                         market_data=None, insider_trades=None, financial_metrics=None,
+                         financial_line_items=None) -> dict:
+    """
+    Run the workflow and return the full final state (all agent outputs)
+
+    Args:
+        interval: Bar size of the price history (1d, 1h, 5m, 1m)
+        prices: Optional prebuilt price history (PriceArrays); when given,
+            market_data_agent uses it instead of downloading prices
+        valuation_mode: "point" (single DCF / owner earnings estimate) or
+            "monte_carlo" (signal from the probability of undervaluation)
+        market_data, insider_trades: Optional prefetched get_market_data() /
+            get_insider_trades() results, shared by the days of a backtest
+        financial_metrics, financial_line_items: Optional prefetched
+            get_financial_metrics() / get_financial_statements() results
+            for end_date
+    """
+    inputs = initial_state(ticker, start_date, end_date, portfolio, show_reasoning, num_of_news,
+                           interval, prices, valuation_mode, market_data, insider_trades,
+                           financial_metrics, financial_line_items)
+    with tracer.span("run", "run_hedge_fund", ticker=ticker, end_date=end_date):
+        return invoke_graph(get_app(), inputs)
+
+
+def parse_decision(content: str):
+    """The portfolio manager's decision as a dict (its raw text if that is not valid JSON)"""
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return content
+
+
+def initial_state(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5,
+                  interval: str = "1d", prices=None, valuation_mode: str = "point",
+                  market_data=None, insider_trades=None, financial_metrics=None,
+                  financial_line_items=None) -> dict:
+    """Graph input of a run (see run_hedge_fund_state for the arguments)"""
+    if valuation_mode not in VALUATION_MODES:
+        raise ValueError(f"Unsupported valuation mode: {valuation_mode}")
+    data = {
+        "ticker": ticker,
+        "portfolio": portfolio,
+        "start_date": start_date,
+        "end_date": end_date,
+        "num_of_news": num_of_news,
+        "interval": validate_interval(interval),
+        "valuation_mode": valuation_mode,
+    }
+    prefetched = {"prices": prices, "market_data": market_data, "insider_trades": insider_trades,
+                  "financial_metrics": financial_metrics, "financial_line_items": financial_line_items}
+    data.update({key: value for key, value in prefetched.items() if value is not None})
+
+    return {
+        "messages": [
+            HumanMessage(
+                content="Make a trading decision based on the provided data.",
+            )
+        ],
+        "data": data,
+        "metadata": {
+            "show_reasoning": show_reasoning,
+        },
+        "signals": {},
+    }
+
+
+def resolve_dates(start_date: str = None, end_date: str = None):
+    """
+    Fill in the default dates and check their format
+
+    Returns:
+        tuple: (start_date, end_date); end_date defaults to today and
+            start_date to 3 months before end_date
+    """
+    # Set default dates if not provided
+    if not end_date:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+
+    if not start_date:
+        # Default to 3 months before end date using timedelta
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
+        start_date_obj = end_date_obj - \
+            timedelta(days=90)  # Approximately 3 months
+        start_date = start_date_obj.strftime('%Y-%m-%d')
+
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("Start date must be in YYYY-MM-DD format")
+
+    try:
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("End date must be in YYYY-MM-DD format")
+    return start_date, end_date
+
+
+def validate_num_of_news(num_of_news: int):
+    if num_of_news < 1:
+        raise ValueError("Number of news articles must be at least 1")
+    if num_of_news > 100:
+        raise ValueError("Number of news articles cannot exceed 100")
+
+
+##### Workflow #####
+# 图在第一次运行时才编译：导入 langgraph 约需 0.7 秒，--help 和只导入本模块的脚本不必承担
+_app = None
+_app_lock = threading.Lock()
+
+
+def build_workflow():
+    from langgraph.graph import END, StateGraph
+
+    # Define the new workflow
+    workflow = StateGraph(AgentState)
+
+    # Add nodes (每个节点都计时，节点内的外部调用记在该节点名下)
+    for node in (market_data_agent, feature_frame_agent, technical_analyst_agent,
+                 fundamentals_agent, sentiment_agent, risk_management_agent,
+                 portfolio_management_agent, valuation_agent):
+        workflow.add_node(node.__name__, traced_node(node.__name__)(node))
+
+    # Define the workflow
+    workflow.set_entry_point("market_data_agent")
+    workflow.add_edge("market_data_agent", "feature_frame_agent")
+    workflow.add_edge("feature_frame_agent", "technical_analyst_agent")
+    workflow.add_edge("market_data_agent", "fundamentals_agent")
+    workflow.add_edge("market_data_agent", "sentiment_agent")
+    workflow.add_edge("market_data_agent", "valuation_agent")
+    # 各分析节点深度不同，risk 需等待全部完成
+    workflow.add_edge(["technical_analyst_agent", "fundamentals_agent",
+                       "sentiment_agent", "valuation_agent"], "risk_management_agent")
+    workflow.add_edge("risk_management_agent", "portfolio_management_agent")
+    workflow.add_edge("portfolio_management_agent", END)
+    return workflow
+
+
+def get_app():
+    """The compiled workflow, built on first use"""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = build_workflow().compile()
+        return _app
+
+
+def __getattr__(name):
+    # main.app 仍可直接使用
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Add this at the bottom of the file
 if __name__ == "__main__":
@@ -81,38 +200,21 @@ if __name__ == "__main__":
                         help='Initial cash amount (default: 100,000)')
     parser.add_argument('--num-of-news', type=int, default=5,
                         help='Number of news articles to analyze for sentiment (default: 5)')
+    parser.add_argument('--interval', type=str, default='1d', choices=['1d', '1h', '5m', '1m'],
+                        help='Bar size of the price history (default: 1d)')
+    parser.add_argument('--profile-indicators', action='store_true',
+                        help='Print the time spent in each technical indicator')
+    parser.add_argument('--valuation-mode', type=str, default='point', choices=list(VALUATION_MODES),
+                        help='Valuation signal from a point estimate or a Monte Carlo DCF (default: point)')
+    parser.add_argument('--trace-file', type=str,
+                        help='Write a JSON trace of the run (node and outbound call timings) to this file')
+    add_transport_arguments(parser)
 
     args = parser.parse_args()
+    configure_from_args(args)
 
-    # Set default dates if not provided
-    if not args.end_date:
-        args.end_date = datetime.now().strftime('%Y-%m-%d')
-
-    if not args.start_date:
-        # Default to 3 months before end date using timedelta
-        end_date_obj = datetime.strptime(args.end_date, '%Y-%m-%d')
-        start_date_obj = end_date_obj - \
-            timedelta(days=90)  # Approximately 3 months
-        args.start_date = start_date_obj.strftime('%Y-%m-%d')
-
-    # Validate dates if provided
-    if args.start_date:
-        try:
-            datetime.strptime(args.start_date, '%Y-%m-%d')
-        except ValueError:
-            raise ValueError("Start date must be in YYYY-MM-DD format")
-
-    if args.end_date:
-        try:
-            datetime.strptime(args.end_date, '%Y-%m-%d')
-        except ValueError:
-            raise ValueError("End date must be in YYYY-MM-DD format")
-
-    # Validate num_of_news
-    if args.num_of_news < 1:
-        raise ValueError("Number of news articles must be at least 1")
-    if args.num_of_news > 100:
-        raise ValueError("Number of news articles cannot exceed 100")
+    args.start_date, args.end_date = resolve_dates(args.start_date, args.end_date)
+    validate_num_of_news(args.num_of_news)
 
     # Configure portfolio with initial capital
     portfolio = {
@@ -120,13 +222,26 @@ if __name__ == "__main__":
         "stock": 0  # No initial stock position
     }
 
-    result = run_hedge_fund(
+    tracer.clear()
+    final_state = run_hedge_fund_state(
         ticker=args.ticker,
         start_date=args.start_date,
         end_date=args.end_date,
         portfolio=portfolio,
         show_reasoning=args.show_reasoning,
-        num_of_news=args.num_of_news
+        num_of_news=args.num_of_news,
+        interval=args.interval,
+        valuation_mode=args.valuation_mode
     )
     print("\nFinal Result:")
-    print(result)
+    print(final_state["messages"][-1].content)
+
+    if args.profile_indicators:
+        print("\nIndicator Profile:")
+        print(indicator_profiler.report())
+
+    if args.trace_file:
+        tracer.export(args.trace_file, indicators=indicator_profiler.stats(),
+                      node_cache=node_cache.stats(), transport=transport.stats())
+        print(f"\nTrace written to {args.trace_file}:")
+        print(tracer.report())
@@ -0,0 +1,425 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from agents.features import indicator_profiler
+from agents.node_cache import node_cache
+from agents.signals import AgentSignal
+from backtester import LOOKBACK_BARS, LOOKBACK_DAYS, Backtester
+from execution_model import add_execution_arguments, execution_model_from_args
+from main import run_hedge_fund_state
+from tools.api import get_price_data
+from tools.covariance import CovarianceModel, returns_panel
+from tools.event_log import VERBOSITY_LEVELS, log_event
+from tools.fundamentals_store import fundamentals_store
+from tools.instrumentation import tracer
+from tools.position_sizing import (add_sizing_arguments, consensus_score,
+                                   signal_score, sizer_from_args)
+from tools.transport import add_transport_arguments, configure_from_args, transport
+
+
+class PortfolioBacktester(Backtester):
+    """Backtester holding positions across several tickers with shared capital.
+
+    Each session the per-ticker analysis pipeline runs for the whole universe,
+    then sells are executed first and the freed cash is allocated across the
+    requested buys, each capped by risk_management_agent's max_position_size.
+    With a position sizer the portfolio manager's quantities are replaced by
+    the rebalance to the sizer's targets (same caps).
+
+    The calendar, price histories, company info and insider trades are
+    fetched once for the whole run. The LLM calls, and so the rate limit,
+    remain per ticker and day.
+    """
+
+    def __init__(self, agent, tickers, start_date, end_date, initial_capital, num_of_news=5, execution_model=None, verbosity="normal", sizer=None):
+        # 去重但保持顺序
+        self.tickers = list(dict.fromkeys(t.strip().upper()
+                            for t in tickers if t.strip()))
+        super().__init__(agent, "_".join(self.tickers), start_date,
+                         end_date, initial_capital, num_of_news, execution_model, verbosity)
+        self.portfolio = {
+            "cash": initial_capital,
+            "positions": {ticker: 0 for ticker in self.tickers}
+        }
+        self._last_prices = {}
+        self.risk_model = CovarianceModel(LOOKBACK_BARS)
+        self._returns_panel = None
+        self._risk_cursor = 0
+        self.sizer = sizer
+
+    def validate_inputs(self):
+        """Validate input parameters"""
+        try:
+            start = datetime.strptime(self.start_date, "%Y-%m-%d")
+            end = datetime.strptime(self.end_date, "%Y-%m-%d")
+            if start >= end:
+                raise ValueError("Start date must be earlier than end date")
+            if self.initial_capital <= 0:
+                raise ValueError("Initial capital must be greater than 0")
+            if not self.tickers:
+                raise ValueError("At least one ticker is required")
+            for ticker in self.tickers:
+                if not (ticker.isalpha() or (len(ticker) == 6 and ticker.isdigit())):
+                    self.backtest_logger.warning(
+                        f"Stock code {ticker} might be in an unusual format")
+            self.backtest_logger.info(
+                f"Input parameters validated for {len(self.tickers)} tickers")
+        except Exception as e:
+            self.backtest_logger.error(
+                f"Input parameter validation failed: {str(e)}")
+            raise
+
+    def parse_agent_output(self, result):
+        """Parse the final graph state into a decision plus the risk limits"""
+        if isinstance(result, dict) and "messages" in result:
+            output = super().parse_agent_output(result["messages"][-1].content)
+            output["risk"] = self._extract_risk(result)
+            output["signals"] = self._extract_signals(result)
+            return output
+        return super().parse_agent_output(result)
+
+    def _extract_risk(self, final_state):
+        """Get risk_management_agent's output from the final state"""
+        risk = final_state.get("signals", {}).get("risk_management_agent")
+        return risk.to_dict() if risk is not None else {}
+
+    def _extract_signals(self, final_state):
+        """The analysts' signals from the final state (the risk assessment only sets limits)"""
+        return {
+            # 估值信号的置信度可能超过 1
+            name: {"signal": signal.signal, "confidence": min(max(signal.confidence, 0.0), 1.0)}
+            for name, signal in final_state.get("signals", {}).items()
+            if isinstance(signal, AgentSignal)
+        }
+
+    def load_execution_prices(self):
+        """Fetch the OHLCV bars for the whole backtest period once per ticker"""
+        # yfinance 的 end 参数不包含当天
+        end = (datetime.strptime(self.end_date, "%Y-%m-%d") +
+               timedelta(days=1)).strftime("%Y-%m-%d")
+        bars = {}
+        for ticker in self.tickers:
+            df = get_price_data(ticker, self.start_date, end)
+            if df is None or df.empty:
+                self.backtest_logger.warning(
+                    f"No price data available for {ticker}, it will not be traded")
+                continue
+            bars[ticker] = df
+        return bars
+
+    def load_returns_panel(self):
+        """Daily returns of the universe from the preloaded lookback histories"""
+        closes = {ticker: pd.Series(history.close, index=history.dates)
+                  for ticker, history in self._price_history.items()}
+        self._returns_panel = returns_panel(closes) if closes else None
+
+    def roll_risk_model(self, decision_date):
+        """Advance the covariance window to the returns before decision_date"""
+        panel = self._returns_panel
+        if panel is None:
+            return False
+        stop = int(panel.index.searchsorted(pd.Timestamp(decision_date)))
+        if not len(self.risk_model):
+            if stop < 2:
+                return False
+            self.risk_model.fit(panel.iloc[:stop])
+        else:
+            # 协方差窗口逐日增量推进
+            for i in range(self._risk_cursor, stop):
+                self.risk_model.update(panel.iloc[i])
+        self._risk_cursor = stop
+        return True
+
+    def portfolio_risk(self, decision_date, prices):
+        """Covariance-based risk of the current holdings, using returns before decision_date"""
+        if not self.roll_risk_model(decision_date):
+            return None
+        self._last_prices.update(prices)
+        exposures = {ticker: quantity * self._last_prices.get(ticker, 0.0)
+                     for ticker, quantity in self.portfolio["positions"].items()}
+        return self.risk_model.portfolio_risk(exposures)
+
+    def portfolio_value(self, prices):
+        """Mark the portfolio to market using the latest known prices"""
+        self._last_prices.update(prices)
+        stock_value = sum(
+            quantity * self._last_prices.get(ticker, 0.0)
+            for ticker, quantity in self.portfolio["positions"].items()
+        )
+        return self.portfolio["cash"] + stock_value
+
+    def size_orders(self, decisions, bars, decision_date):
+        """Replace the requested orders by the rebalance to the sizer's target quantities.
+
+        Scores are the consensus of the analyst signals the graph returned
+        (or the portfolio manager's own action and confidence without
+        them, e.g. after a failed run); all tickers are
+        sized in one solve on the covariance of the returns before
+        decision_date. Returns the target quantity per ticker.
+        """
+        if self.sizer is None or not self.roll_risk_model(decision_date):
+            return {}
+        tickers = list(decisions)
+        covariance = self.risk_model.covariance_frame().reindex(
+            index=tickers, columns=tickers).fillna(0.0).to_numpy()
+        scores = []
+        for ticker in tickers:
+            # 用图返回的结构化信号，而不是 LLM 在决策文本里复述的 agent_signals
+            signals = decisions[ticker].get("signals") or {}
+            decision = decisions[ticker].get("decision", {})
+            scores.append(consensus_score(signals, exclude=()) if signals else
+                          signal_score(decision.get("action"), decision.get("confidence", 0)))
+        opens = np.array([bars[t]["open"] for t in tickers], dtype=float)
+        equity = self.portfolio_value(dict(zip(tickers, opens.tolist())))
+        targets = self.sizer.target_quantities(scores, covariance, equity, opens)
+
+        for ticker, target in zip(tickers, targets.tolist()):
+            change = int(target) - self.portfolio["positions"][ticker]
+            decision = dict(decisions[ticker].get("decision", {}))
+            decision["action"] = "buy" if change > 0 else "sell" if change < 0 else "hold"
+            decision["quantity"] = abs(change)
+            decisions[ticker]["decision"] = decision
+        return dict(zip(tickers, (int(t) for t in targets)))
+
+    def allocate_orders(self, decisions, bars, views):
+        """Turn per-ticker decisions into executed quantities.
+
+        Sells are filled first. Buys are then limited to the headroom left under
+        each ticker's max_position_size (scaled from the single-ticker view the
+        risk agent saw to the whole portfolio) and, if the remaining cash is not
+        enough, scaled down pro rata. All tickers go through the execution model
+        in a single vectorized call per side.
+        """
+        tickers = list(decisions)
+        model = self.execution_model
+        positions = self.portfolio["positions"]
+
+        opens = np.array([bars[t]["open"] for t in tickers], dtype=float)
+        highs = np.array([bars[t].get("high", bars[t]["open"])
+                         for t in tickers], dtype=float)
+        lows = np.array([bars[t].get("low", bars[t]["open"])
+                        for t in tickers], dtype=float)
+        volumes = np.array([bars[t].get("volume", np.nan)
+                           for t in tickers], dtype=float)
+        actions = np.array([decisions[t].get("decision", {}).get("action", "hold")
+                            for t in tickers])
+        requested = np.array([int(decisions[t].get("decision", {}).get("quantity", 0) or 0)
+                              for t in tickers], dtype=float)
+        held = np.array([positions[t] for t in tickers], dtype=float)
+
+        # 1. Sells
+        sell_orders = np.where((actions == "sell") &
+                               (requested > 0), requested, 0.0)
+        sold, sell_prices, sell_fees = model.fill(
+            -1, sell_orders, opens, highs, lows, volumes, position=held)
+        self.portfolio["cash"] += float(np.sum(sold * sell_prices - sell_fees))
+        held -= sold
+
+        # 2. Buys, capped by risk limits
+        equity = self.portfolio["cash"] + float(held @ opens)
+        view_totals = np.array([views[t]["cash"] + views[t]["stock"] * opens[i]
+                                for i, t in enumerate(tickers)], dtype=float)
+        max_sizes = np.array([decisions[t].get("risk", {}).get("max_position_size", np.nan)
+                              for t in tickers], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cap_values = np.where(np.isfinite(max_sizes) & (view_totals > 0),
+                                  max_sizes / view_totals * equity, np.inf)
+        headroom = np.floor(np.maximum(cap_values - held * opens, 0.0) / opens)
+        buy_orders = np.where((actions == "buy") & (requested > 0),
+                              np.minimum(requested, headroom), 0.0)
+        bought, buy_prices, buy_fees = model.fill(
+            1, buy_orders, opens, highs, lows, volumes)
+
+        # 3. Scale buys to the available cash
+        total_cost = float(np.sum(bought * buy_prices + buy_fees))
+        if total_cost > self.portfolio["cash"]:
+            unit_costs = buy_prices * (1 + model.commission_bps / 10000.0)
+            available = self.portfolio["cash"] - \
+                model.commission_fixed * np.count_nonzero(bought)
+            scale = max(available, 0.0) / float(np.sum(bought * unit_costs))
+            bought, buy_prices, buy_fees = model.fill(
+                1, np.floor(bought * scale), opens, highs, lows)
+        self.portfolio["cash"] -= float(np.sum(bought * buy_prices + buy_fees))
+        held += bought
+
+        self.transaction_costs += float(
+            np.sum(sell_fees + buy_fees +
+                   sold * np.abs(sell_prices - opens) +
+                   bought * np.abs(buy_prices - opens)))
+
+        executed = {}
+        for i, ticker in enumerate(tickers):
+            positions[ticker] = int(held[i])
+            if sold[i] > 0:
+                executed[ticker] = ("sell", int(sold[i]))
+            elif bought[i] > 0:
+                executed[ticker] = ("buy", int(bought[i]))
+            else:
+                executed[ticker] = ("hold", 0)
+        return executed
+
+    def run_backtest(self):
+        """Run backtest simulation across the whole ticker universe"""
+        # 交易日历只计算一次，所有股票共用
+        schedule = self.nyse.schedule(
+            start_date=(pd.Timestamp(self.start_date) -
+                        pd.Timedelta(days=10)).strftime("%Y-%m-%d"),
+            end_date=self.end_date)
+        trading_days = [dt.strftime('%Y-%m-%d') for dt in schedule.index]
+        bars = self.load_execution_prices()
+        self.load_lookback_history(self.tickers)
+        self.load_shared_inputs(self.tickers)
+        self.load_returns_panel()
+
+        if self.verbosity != "quiet":
+            print(f"{'Date':<12} {'Code':<6} {'Action':<6} {'Quantity':>8} {'Price':>8} {'Position':>8} {'Cash':>12} {'Total':>12}")
+            print("-" * 80)
+
+        for i, current_date_str in enumerate(trading_days):
+            if current_date_str < self.start_date or i == 0:
+                continue
+            decision_date = trading_days[i - 1]
+
+            # Use 365-day lookback window
+            lookback_start = (pd.Timestamp(current_date_str) -
+                              pd.Timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+
+            today = {
+                ticker: df.loc[current_date_str].to_dict()
+                for ticker, df in bars.items() if current_date_str in df.index
+            }
+            prices = {ticker: float(bar["open"])
+                      for ticker, bar in today.items()}
+            if not prices:
+                self.backtest_logger.warning(
+                    f"No price data available for {current_date_str}, skipping...")
+                continue
+
+            # 所有股票使用同一时刻的组合视图，避免决策顺序影响结果
+            views = {}
+            decisions = {}
+            for ticker in prices:
+                views[ticker] = {
+                    "cash": self.portfolio["cash"],
+                    "stock": self.portfolio["positions"][ticker]
+                }
+                decisions[ticker] = self.get_agent_decision(
+                    decision_date,
+                    lookback_start,
+                    views[ticker],
+                    self.num_of_news,
+                    ticker=ticker,
+                    prices=self.lookback_prices(ticker, decision_date)
+                )
+                self.log_agent_signals(
+                    current_date_str, ticker, decisions[ticker])
+
+            targets = self.size_orders(decisions, today, decision_date)
+            executed = self.allocate_orders(decisions, today, views)
+
+            total_value = self.portfolio_value(prices)
+            self.portfolio["portfolio_value"] = total_value
+            risk = self.portfolio_risk(decision_date, prices)
+            self.portfolio_values.append({
+                "Date": current_date_str,
+                "Portfolio Value": total_value,
+                "Daily Return": (total_value / self.portfolio_values[-1]["Portfolio Value"] - 1) * 100 if self.portfolio_values else 0
+            })
+
+            log_event(self.backtest_logger, "day",
+                      date=current_date_str,
+                      decision_date=decision_date,
+                      cash=self.portfolio["cash"],
+                      total_value=total_value,
+                      risk=risk and {
+                          "volatility": risk["volatility"],
+                          "value_at_risk_95": risk["value_at_risk"],
+                          "component_var": risk["component_var"],
+                      },
+                      orders={
+                          ticker: {
+                              "requested": decisions[ticker].get("decision", {}).get("action", "hold"),
+                              "requested_quantity": decisions[ticker].get("decision", {}).get("quantity", 0),
+                              "target_quantity": targets.get(ticker),
+                              "action": action,
+                              "executed_quantity": quantity,
+                              "price": prices[ticker],
+                              "position": self.portfolio["positions"][ticker],
+                          }
+                          for ticker, (action, quantity) in executed.items()
+                      })
+
+            if self.verbosity != "quiet":
+                for ticker, (action, quantity) in executed.items():
+                    print(
+                        f"{current_date_str:<12} {ticker:<6} {action:<6} {quantity:>8} "
+                        f"{prices[ticker]:>8.2f} {self.portfolio['positions'][ticker]:>8} "
+                        f"{self.portfolio['cash']:>12.2f} {total_value:>12.2f}"
+                    )
+
+        self.analyze_performance()
+        log_event(self.backtest_logger, "node_cache", stats=node_cache.stats())
+        log_event(self.backtest_logger, "fundamentals_store",
+                  stats=fundamentals_store.stats())
+        log_event(self.backtest_logger, "indicator_profile",
+                  stats=indicator_profiler.stats())
+        log_event(self.backtest_logger, "trace_summary", stats=tracer.summary())
+        if self.verbosity == "debug":
+            print("\nIndicator profile:")
+            print(indicator_profiler.report())
+            print("\nCall profile:")
+            print(tracer.report())
+        self.close_logging()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Run a multi-asset portfolio backtest simulation')
+    parser.add_argument('--tickers', type=str, required=True,
+                        help='Comma-separated stock codes (e.g., AAPL,MSFT,NVDA)')
+    parser.add_argument('--end-date', type=str,
+                        default=datetime.now().strftime('%Y-%m-%d'),
+                        help='End date (YYYY-MM-DD)')
+    parser.add_argument('--start-date', type=str,
+                        default=(datetime.now() - timedelta(days=90)
+                                 ).strftime('%Y-%m-%d'),
+                        help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--initial-capital', type=float,
+                        default=100000,
+                        help='Initial capital (default: 100000)')
+    parser.add_argument('--num-of-news', type=int,
+                        default=5,
+                        help='Number of news articles to analyze (default: 5)')
+    parser.add_argument('--log-verbosity', type=str, choices=VERBOSITY_LEVELS,
+                        default='normal',
+                        help='Event log detail: quiet (daily records only), normal (+ agent signals), debug (+ agent analysis)')
+    add_execution_arguments(parser)
+    add_sizing_arguments(parser)
+    parser.add_argument('--trace-file', type=str,
+                        help='Write a JSON trace of the backtest (node and outbound call timings) to this file')
+    add_transport_arguments(parser)
+
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    backtester = PortfolioBacktester(
+        agent=run_hedge_fund_state,
+        tickers=args.tickers.split(","),
+        start_date=args.start_date,
+        end_date=args.end_date,
+        initial_capital=args.initial_capital,
+        num_of_news=args.num_of_news,
+        execution_model=execution_model_from_args(args),
+        verbosity=args.log_verbosity,
+        sizer=sizer_from_args(args)
+    )
+
+    backtester.run_backtest()
+
+    if args.trace_file:
+        tracer.export(args.trace_file, indicators=indicator_profiler.stats(),
+                      node_cache=node_cache.stats(), transport=transport.stats())
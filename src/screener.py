@@ -0,0 +1,263 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from agents.technicals import STRATEGY_WEIGHTS
+from tools.api import PANEL_FIELDS, get_price_panel
+from tools.market_panel import (MARKET_BENCHMARK, benchmark_panel, relative_strength,
+                                rolling_beta, rolling_correlation)
+
+# 截面筛选：把整个股票池的 OHLCV 排成 (日期 x 股票) 的二维表，
+# 每个策略对所有股票一次性计算，逻辑与 agents/technicals.py 中的单股票版本一致。
+
+SIGNAL_NAMES = np.array(['bearish', 'neutral', 'bullish'])
+
+# 最少需要的历史长度（最长的窗口为 6 个月动量）
+MIN_HISTORY = 127
+
+
+def _signal(bullish, bearish):
+    """Encode boolean masks as +1 / -1 / 0"""
+    return np.where(bullish, 1, np.where(bearish, -1, 0))
+
+
+def _last(frame: pd.DataFrame) -> np.ndarray:
+    return frame.to_numpy()[-1]
+
+
+def panel_from_frames(frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """Align per-ticker OHLCV DataFrames into a (dates x tickers) panel"""
+    return {
+        field: pd.DataFrame({ticker: df[field] for ticker, df in frames.items()}).sort_index().astype(float)
+        for field in PANEL_FIELDS
+    }
+
+
+##### Strategy Kernels #####
+def trend_kernel(panel, adx_period: int = 14) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    close, high, low = panel["close"], panel["high"], panel["low"]
+    ema_8 = close.ewm(span=8, adjust=False).mean()
+    ema_21 = close.ewm(span=21, adjust=False).mean()
+    ema_55 = close.ewm(span=55, adjust=False).mean()
+
+    # ADX
+    prev_close = close.shift()
+    true_range = np.fmax(np.fmax(high - low, (high - prev_close).abs()),
+                         (low - prev_close).abs())
+    tr_ema = true_range.ewm(span=adx_period).mean()
+    up_move = high - high.shift()
+    down_move = low.shift() - low
+    plus_dm = up_move.where((up_move > down_move) & (up_move > 0), 0.0)
+    minus_dm = down_move.where((down_move > up_move) & (down_move > 0), 0.0)
+    plus_di = 100 * (plus_dm.ewm(span=adx_period).mean() / tr_ema)
+    minus_di = 100 * (minus_dm.ewm(span=adx_period).mean() / tr_ema)
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+    adx = _last(dx.ewm(span=adx_period).mean())
+
+    short_trend = _last(ema_8) > _last(ema_21)
+    medium_trend = _last(ema_21) > _last(ema_55)
+    trend_strength = adx / 100.0
+
+    signal = _signal(short_trend & medium_trend, ~short_trend & ~medium_trend)
+    confidence = np.where(signal != 0, trend_strength, 0.5)
+    return signal, confidence, {"adx": adx}
+
+
+def mean_reversion_kernel(panel):
+    close = panel["close"]
+    z_score = _last((close - close.rolling(50).mean()) / close.rolling(50).std())
+
+    sma_20 = close.rolling(20).mean()
+    std_20 = close.rolling(20).std()
+    bb_upper = _last(sma_20 + std_20 * 2)
+    bb_lower = _last(sma_20 - std_20 * 2)
+    price_vs_bb = (_last(close) - bb_lower) / (bb_upper - bb_lower)
+
+    signal = _signal((z_score < -2) & (price_vs_bb < 0.2),
+                     (z_score > 2) & (price_vs_bb > 0.8))
+    confidence = np.where(signal != 0, np.minimum(np.abs(z_score) / 4, 1.0), 0.5)
+    return signal, confidence, {"z_score": z_score, "price_vs_bb": price_vs_bb}
+
+
+def momentum_kernel(panel):
+    returns = panel["close"].pct_change()
+    momentum_score = (0.4 * _last(returns.rolling(21).sum()) +
+                      0.3 * _last(returns.rolling(63).sum()) +
+                      0.3 * _last(returns.rolling(126).sum()))
+    volume = panel["volume"]
+    volume_momentum = _last(volume) / _last(volume.rolling(21).mean())
+    volume_confirmation = volume_momentum > 1.0
+
+    signal = _signal((momentum_score > 0.05) & volume_confirmation,
+                     (momentum_score < -0.05) & volume_confirmation)
+    confidence = np.where(signal != 0, np.minimum(np.abs(momentum_score) * 5, 1.0), 0.5)
+    return signal, confidence, {"momentum_score": momentum_score, "volume_momentum": volume_momentum}
+
+
+def volatility_kernel(panel):
+    hist_vol = panel["close"].pct_change().rolling(21).std() * np.sqrt(252)
+    vol_ma = hist_vol.rolling(63).mean()
+    vol_regime = _last(hist_vol / vol_ma)
+    vol_z = _last((hist_vol - vol_ma) / hist_vol.rolling(63).std())
+
+    signal = _signal((vol_regime < 0.8) & (vol_z < -1),
+                     (vol_regime > 1.2) & (vol_z > 1))
+    confidence = np.where(signal != 0, np.minimum(np.abs(vol_z) / 3, 1.0), 0.5)
+    return signal, confidence, {"historical_volatility": _last(hist_vol), "volatility_regime": vol_regime}
+
+
+def hurst_exponents(prices: np.ndarray, max_lag: int = 20) -> np.ndarray:
+    """Hurst exponent of every column of a (dates x tickers) array"""
+    lags = np.arange(2, max_lag)
+    tau = np.empty((len(lags), prices.shape[1]))
+    for i, lag in enumerate(lags):
+        diffs = prices[lag:] - prices[:-lag]
+        tau[i] = np.maximum(1e-8, np.sqrt(np.nanstd(diffs, axis=0)))
+    # 一次拟合所有股票（polyfit 支持二维 y）
+    return np.polyfit(np.log(lags), np.log(tau), 1)[0]
+
+
+def stat_arb_kernel(panel):
+    close = panel["close"]
+    skew = _last(close.pct_change().rolling(63).skew())
+    hurst = hurst_exponents(close.to_numpy())
+
+    signal = _signal((hurst < 0.4) & (skew > 1), (hurst < 0.4) & (skew < -1))
+    confidence = np.where(signal != 0, (0.5 - hurst) * 2, 0.5)
+    return signal, confidence, {"hurst_exponent": hurst, "skewness": skew}
+
+
+STRATEGY_KERNELS = {
+    'trend': trend_kernel,
+    'mean_reversion': mean_reversion_kernel,
+    'momentum': momentum_kernel,
+    'volatility': volatility_kernel,
+    'stat_arb': stat_arb_kernel,
+}
+
+
+def market_relative_kernel(panel, benchmark_closes: pd.Series, window: int = 63):
+    """Beta, correlation and relative strength of every ticker against the benchmark"""
+    close = panel["close"]
+    benchmark_closes = benchmark_closes.reindex(close.index)
+    returns = close.pct_change()
+    benchmark_returns = benchmark_closes.pct_change()
+    return {
+        "market_beta": _last(rolling_beta(returns, benchmark_returns, window)),
+        "market_correlation": _last(rolling_correlation(returns, benchmark_returns, window)),
+        "relative_strength_3m": _last(relative_strength(close, benchmark_closes, window)),
+    }
+
+
+def screen_panel(panel: Dict[str, pd.DataFrame], weights: Dict[str, float] = None,
+                 min_history: int = MIN_HISTORY, benchmark_closes: pd.Series = None) -> pd.DataFrame:
+    """
+    Evaluate every technical strategy for every ticker of the panel.
+
+    Args:
+        panel: OHLCV fields as (dates x tickers) DataFrames
+        weights: Strategy weights (defaults to the technical analyst's)
+        min_history: Tickers with fewer closes are left out
+        benchmark_closes: Optional market benchmark closes; adds beta,
+            correlation and relative strength columns
+
+    Returns:
+        DataFrame indexed by ticker, ranked from most bullish to most bearish,
+        with the combined signal, its score and confidence, and each
+        strategy's signal and key metrics.
+    """
+    weights = weights or STRATEGY_WEIGHTS
+    counts = panel["close"].notna().sum()
+    tickers = counts.index[counts >= min_history]
+    panel = {field: frame[tickers] for field, frame in panel.items()}
+
+    weighted_sum = np.zeros(len(tickers))
+    total_confidence = np.zeros(len(tickers))
+    columns = {}
+    for name, kernel in STRATEGY_KERNELS.items():
+        signal, confidence, metrics = kernel(panel)
+        weighted_sum += signal * weights[name] * confidence
+        total_confidence += weights[name] * confidence
+        columns[name] = SIGNAL_NAMES[signal + 1]
+        columns.update(metrics)
+
+    if benchmark_closes is not None and len(tickers):
+        columns.update(market_relative_kernel(panel, benchmark_closes))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(total_confidence > 0,
+                         weighted_sum / total_confidence, 0.0)
+
+    table = pd.DataFrame({
+        "signal": SIGNAL_NAMES[_signal(score > 0.2, score < -0.2) + 1],
+        "score": score,
+        "confidence": np.abs(score),
+        "close": _last(panel["close"]) if len(tickers) else [],
+        **columns,
+    }, index=pd.Index(tickers, name="ticker"))
+    return table.sort_values(["score", "confidence"], ascending=[False, False])
+
+
+def run_screener(tickers: List[str], end_date: str, lookback_days: int = 365) -> pd.DataFrame:
+    """Download the universe's prices in one request and screen it"""
+    start = (datetime.strptime(end_date, "%Y-%m-%d") -
+             timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+    # yfinance 的 end 参数不包含当天
+    end = (datetime.strptime(end_date, "%Y-%m-%d") +
+           timedelta(days=1)).strftime("%Y-%m-%d")
+    benchmark = benchmark_panel.closes(start, end_date).get(MARKET_BENCHMARK)
+    return screen_panel(get_price_panel(tickers, start, end), benchmark_closes=benchmark)
+
+
+def _load_universe(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.split("#")[0].strip().upper() for line in f
+                if line.split("#")[0].strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Rank a ticker universe by the technical strategy ensemble')
+    universe = parser.add_mutually_exclusive_group(required=True)
+    universe.add_argument('--tickers', type=str,
+                          help='Comma-separated stock codes (e.g., AAPL,MSFT,NVDA)')
+    universe.add_argument('--universe-file', type=str,
+                          help='File with one stock code per line')
+    parser.add_argument('--end-date', type=str,
+                        default=datetime.now().strftime('%Y-%m-%d'),
+                        help='Screening date (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--lookback-days', type=int, default=365,
+                        help='Calendar days of history to load (default: 365)')
+    parser.add_argument('--top', type=int, default=20,
+                        help='Number of rows to show from each end of the ranking (default: 20)')
+    parser.add_argument('--output', type=str,
+                        help='Optional CSV file for the full ranked table')
+
+    args = parser.parse_args()
+
+    if args.tickers:
+        universe_tickers = [t.strip().upper()
+                            for t in args.tickers.split(",") if t.strip()]
+    else:
+        universe_tickers = _load_universe(args.universe_file)
+    universe_tickers = list(dict.fromkeys(universe_tickers))
+
+    table = run_screener(universe_tickers, args.end_date, args.lookback_days)
+    if args.output:
+        table.to_csv(args.output)
+
+    display = table[["signal", "score", "close"] + list(STRATEGY_KERNELS)]
+    with pd.option_context("display.float_format", "{:.3f}".format,
+                           "display.width", 160):
+        if len(display) <= 2 * args.top:
+            print(display)
+        else:
+            print(f"Top {args.top}:")
+            print(display.head(args.top))
+            print(f"\nBottom {args.top}:")
+            print(display.tail(args.top))
+    print(f"\nScreened {len(table)} of {len(universe_tickers)} tickers")
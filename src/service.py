@@ -0,0 +1,407 @@
+"""
+Long-running decision service.
+
+Imports the agents and compiles the graph once, then serves decisions over
+HTTP, on a TCP port or a Unix socket, so a request pays only for its own
+run. The process-wide caches stay warm between requests: node cache,
+fundamentals store, benchmark panel, transport archive and Gemini client.
+Requests for the same ticker and day also share one download of its
+prices, company info, insider trades and (for today) statements.
+Requests are served concurrently up to --workers runs at a time; identical
+requests that arrive while one is running share its result.
+
+    python src/service.py --port 8765
+    python src/service.py --socket /tmp/hedge_fund.sock --warmup-tickers AAPL,MSFT
+    python src/client.py --ticker AAPL
+
+Endpoints:
+    POST /decide   {"ticker": "AAPL", "end_date": "2024-06-28", ...}
+    GET  /health   uptime and request counters
+    GET  /stats    request counters, cache statistics and the call summary
+"""
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from agents.features import indicator_profiler
+from agents.market_data import lookback_start
+from agents.node_cache import node_cache
+from agents.valuation import VALUATION_MODES
+from main import get_app, parse_decision, resolve_dates, run_hedge_fund_state, validate_num_of_news
+from tools.api import (INTERVALS, get_financial_metrics, get_financial_statements, get_insider_trades,
+                       get_market_data, get_price_history)
+from tools.fundamentals_store import fundamentals_store, is_historical
+from tools.instrumentation import tracer
+from tools.market_panel import benchmark_panel
+from tools.openrouter_config import gemini_model
+from tools.transport import add_transport_arguments, configure_from_args, transport
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+
+# 按股票和日期缓存的输入数据条数（价格约 20 KB/条）
+DAILY_INPUTS_SIZE = 256
+# 当日或分钟/小时线的输入数据仍在变化，只缓存这么多秒
+LIVE_INPUTS_TTL = 60.0
+
+# 请求体上限，决策请求只有几个字段
+MAX_REQUEST_BYTES = 64 * 1024
+
+
+##### Requests #####
+def _number(fields: Dict[str, Any], key: str, default, kind=float):
+    """fields[key] converted with kind, default when missing or null"""
+    value = fields.get(key)
+    if value is None:
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number, got {value!r}")
+
+
+def decision_params(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a /decide request body and fill in the defaults of main.py
+
+    Raises:
+        ValueError: On a missing ticker or an invalid field
+    """
+    if not isinstance(request, dict) or not request.get("ticker"):
+        raise ValueError("Request must be a JSON object with a ticker")
+    start_date, end_date = resolve_dates(request.get("start_date"), request.get("end_date"))
+    num_of_news = _number(request, "num_of_news", 5, int)
+    validate_num_of_news(num_of_news)
+    interval = request.get("interval", "1d")
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}")
+    valuation_mode = request.get("valuation_mode", "point")
+    if valuation_mode not in VALUATION_MODES:
+        raise ValueError(f"Unsupported valuation mode: {valuation_mode}")
+    portfolio = request.get("portfolio") or {}
+    if not isinstance(portfolio, dict):
+        raise ValueError("portfolio must be an object with cash and stock")
+    return {
+        "ticker": str(request["ticker"]).upper(),
+        "start_date": start_date,
+        "end_date": end_date,
+        "portfolio": {"cash": _number(portfolio, "cash", 100000.0),
+                      "stock": _number(portfolio, "stock", 0, int)},
+        "num_of_news": num_of_news,
+        "interval": interval,
+        "valuation_mode": valuation_mode,
+    }
+
+
+##### Daily Inputs #####
+class NoPriceData(LookupError):
+    """The ticker has no price history before the end date"""
+
+
+def fetch_inputs(ticker: str, start_date: str, end_date: str, interval: str) -> Dict[str, Any]:
+    """The data market_data_agent would download for this request"""
+    prices = get_price_history(ticker, lookback_start(start_date, end_date, interval), end_date,
+                               interval=interval)
+    if not len(prices):
+        raise NoPriceData(f"No price data for {ticker} before {end_date}")
+    inputs = {
+        "prices": prices,
+        "market_data": get_market_data(ticker),
+        "insider_trades": get_insider_trades(ticker),
+    }
+    # 历史日期的报表由 fundamentals_store 按时点提供，只有当日请求需要在这里取
+    if not is_historical(end_date):
+        inputs["financial_metrics"] = get_financial_metrics(ticker)
+        inputs["financial_line_items"] = get_financial_statements(ticker)
+    return inputs
+
+
+class DailyInputs:
+    """
+    LRU cache of the fetched inputs per ticker, dates and interval.
+
+    Requests for the same ticker and day share one download of the prices,
+    company info, insider trades and (for today) the statements; a request
+    arriving while that download runs waits for it. Inputs for today or for
+    intraday bars expire after live_ttl seconds, historical daily inputs
+    stay until evicted.
+    """
+
+    def __init__(self, maxsize: int = DAILY_INPUTS_SIZE, live_ttl: float = LIVE_INPUTS_TTL):
+        self.maxsize = maxsize
+        self.live_ttl = live_ttl
+        # key -> (inputs, 过期时刻；None 表示不过期)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._fetching: Dict[tuple, Future] = {}
+        self._counts = dict.fromkeys(("hits", "fetches", "waits", "expired"), 0)
+        self._lock = threading.Lock()
+
+    def _expires(self, end_date: str, interval: str):
+        if interval == "1d" and is_historical(end_date):
+            return None
+        return time.monotonic() + self.live_ttl
+
+    def get(self, ticker: str, start_date: str, end_date: str, interval: str) -> Dict[str, Any]:
+        key = (ticker, start_date, end_date, interval)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self._counts["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counts["hits"] += 1
+                return entry[0]
+            running = self._fetching.get(key)
+            if running is None:
+                future = self._fetching[key] = Future()
+                self._counts["fetches"] += 1
+            else:
+                self._counts["waits"] += 1
+        if running is not None:
+            return running.result()
+
+        try:
+            inputs = fetch_inputs(*key)
+        except BaseException as e:
+            with self._lock:
+                self._fetching.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._fetching.pop(key, None)
+            self._entries[key] = (inputs, self._expires(end_date, interval))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        future.set_result(inputs)
+        return inputs
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counts, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+##### Service #####
+class DecisionService:
+    """
+    Runs decisions for the HTTP handlers.
+
+    At most `workers` runs execute at once, the others wait for a slot.
+    A request identical to one already running waits for that run instead
+    of starting its own (counted as coalesced).
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers)
+        self.inputs = DailyInputs()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._counts = dict.fromkeys(("requests", "runs", "coalesced", "errors"), 0)
+        self._run_seconds = 0.0
+        self._started = time.time()
+
+    def decide(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Decision for params validated by decision_params"""
+        key = json.dumps(params, sort_keys=True)
+        with self._lock:
+            self._counts["requests"] += 1
+            running = self._in_flight.get(key)
+            if running is None:
+                future = self._in_flight[key] = Future()
+            else:
+                self._counts["coalesced"] += 1
+        if running is not None:
+            return running.result()
+
+        try:
+            result = self._run(params)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            with self._lock:
+                self._counts["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _run(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._slots:
+            start = time.perf_counter()
+            inputs = self.inputs.get(params["ticker"], params["start_date"], params["end_date"],
+                                     params["interval"])
+            state = run_hedge_fund_state(**params, **inputs)
+            seconds = time.perf_counter() - start
+        with self._lock:
+            self._counts["runs"] += 1
+            self._run_seconds += seconds
+        return {
+            "ticker": params["ticker"],
+            "start_date": params["start_date"],
+            "end_date": params["end_date"],
+            "decision": parse_decision(state["messages"][-1].content),
+            "signals": {name: signal.to_dict() for name, signal in state["signals"].items()},
+            "elapsed_ms": round(seconds * 1000, 2),
+        }
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            runs = self._counts["runs"]
+            return {
+                "status": "ok",
+                "uptime_seconds": round(time.time() - self._started, 1),
+                "workers": self.workers,
+                "in_flight": len(self._in_flight),
+                **self._counts,
+                "mean_run_ms": round(self._run_seconds / runs * 1000, 2) if runs else 0.0,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "service": self.health(),
+            "daily_inputs": self.inputs.stats(),
+            "node_cache": node_cache.stats(),
+            "fundamentals_store": fundamentals_store.stats(),
+            "benchmark_panel": benchmark_panel.stats(),
+            "indicators": indicator_profiler.stats(),
+            "transport": transport.stats(),
+            "calls": tracer.summary(),
+        }
+
+    def warm_up(self, tickers, end_date: str = None):
+        """Run one decision per ticker so its prices and statements are cached before serving"""
+        for ticker in tickers:
+            start = time.perf_counter()
+            self.decide(decision_params({"ticker": ticker, "end_date": end_date}))
+            print(f"Warmed up {ticker} in {time.perf_counter() - start:.1f}s")
+
+
+##### HTTP #####
+class DecisionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service: DecisionService = None
+
+    def address_string(self) -> str:
+        # Unix 套接字的 client_address 为空
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send_json(self, status: int, body: Any):
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, self.service.health())
+        elif self.path == "/stats":
+            self._send_json(HTTPStatus.OK, self.service.stats())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/decide":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"})
+            return
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request too large"})
+            return
+        # 只有请求本身的错误返回 400；运行中抛出的 ValueError 等仍是服务端错误
+        try:
+            params = decision_params(json.loads(self.rfile.read(length) or b"{}"))
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        try:
+            self._send_json(HTTPStatus.OK, self.service.decide(params))
+        except NoPriceData as e:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": str(e)})
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: DecisionService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                socket_path: str = None):
+    """HTTP server bound to host:port, or to socket_path when given"""
+    handler = type("Handler", (DecisionHandler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Serve trading decisions from a long-running process')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST,
+                        help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'TCP port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', type=str,
+                        help='Listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Decisions run at the same time (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--warmup-tickers', type=str,
+                        help='Comma-separated tickers to run once before serving, to fill the caches')
+    add_transport_arguments(parser)
+
+    args = parser.parse_args()
+    configure_from_args(args)
+    if args.workers < 1:
+        raise ValueError("Workers must be at least 1")
+
+    # 长期运行：只保留调用汇总，不保留逐次 span
+    tracer.max_spans = 0
+    # 图和 Gemini 客户端在启动时就建好，不留给第一个请求（回放不需要客户端）
+    get_app()
+    if transport.mode != "replay":
+        gemini_model()
+    service = DecisionService(args.workers)
+    if args.warmup_tickers:
+        service.warm_up([t.strip().upper() for t in args.warmup_tickers.split(",") if t.strip()])
+
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"Serving decisions on {args.socket or f'http://{args.host}:{args.port}'} "
+          f"with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
@@ -0,0 +1,290 @@
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.messages import HumanMessage
+
+from agents.features import feature_frame_agent
+from agents.portfolio_manager import portfolio_management_agent
+from agents.risk_manager import risk_management_agent
+from agents.state import AgentState, invoke_graph
+from agents.technicals import technical_analyst_agent
+from main import run_hedge_fund_state
+from tools.api import INTERVALS, get_price_history, validate_interval
+from tools.price_arrays import PriceArrays
+from tools.ring_buffer import PriceWindow
+from tools.risk_kernels import IncrementalRisk
+
+# 流式模式：先完整运行一次工作流（基本面、情绪、估值等慢速信号），
+# 之后每根新 K 线只重新计算依赖价格的节点：features -> technicals -> risk (-> portfolio)
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+##### Feeds #####
+class FileReplayFeed:
+    """
+    Replays recorded bars from a CSV or JSON-lines file in file order.
+
+    Each record needs ticker, time, open, high, low, close and volume. Used
+    as a stand-in for the live feed when testing or reproducing a session.
+    """
+
+    def __init__(self, path: str, delay: float = 0.0):
+        self.path = path
+        self.delay = delay
+
+    def _records(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            if self.path.endswith((".jsonl", ".json")):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(f)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for record in self._records():
+            yield {**record, "ticker": record["ticker"].upper()}
+            if self.delay:
+                time.sleep(self.delay)
+
+    def split_warmup(self, tickers: List[str], warmup: int):
+        """
+        Use the first warmup bars of each ticker as its bootstrap history.
+
+        Returns:
+            tuple: ({ticker: PriceArrays}, iterator over the remaining bars)
+        """
+        history: Dict[str, List[Dict[str, Any]]] = {t: [] for t in tickers}
+        records = iter(self)
+        pending = []
+        for bar in records:
+            if bar["ticker"] in history and len(history[bar["ticker"]]) < warmup:
+                history[bar["ticker"]].append(bar)
+            else:
+                pending.append(bar)
+            if all(len(bars) >= warmup for bars in history.values()):
+                break
+
+        def remaining():
+            yield from pending
+            yield from records
+        return ({t: PriceArrays.from_records(bars) for t, bars in history.items() if bars},
+                remaining())
+
+
+class YFinancePollingFeed:
+    """Live feed polling yfinance for new or revised intraday bars"""
+
+    def __init__(self, tickers: List[str], interval: str = "5m", poll_seconds: float = 60.0):
+        self.tickers = tickers
+        self.interval = validate_interval(interval)
+        self.poll_seconds = poll_seconds
+        self._last_seen: Dict[str, np.datetime64] = {}
+
+    def poll(self) -> List[Dict[str, Any]]:
+        today = datetime.now().strftime("%Y-%m-%d")
+        bars = []
+        for ticker in self.tickers:
+            prices = get_price_history(ticker, today, today, self.interval)
+            last_seen = self._last_seen.get(ticker)
+            for i in np.flatnonzero(prices.dates >= last_seen) if last_seen is not None else range(len(prices)):
+                bars.append({"ticker": ticker, "time": _format_time(prices.dates[i]),
+                             **{field: getattr(prices, field)[i] for field in BAR_FIELDS}})
+            if len(prices):
+                # 最后一根 K 线可能仍在形成，下次轮询再取一次
+                self._last_seen[ticker] = prices.dates[-1]
+        return bars
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            yield from self.poll()
+            time.sleep(self.poll_seconds)
+
+
+##### Streaming Session #####
+def _format_time(value: Optional[np.datetime64]) -> Optional[str]:
+    return None if value is None else str(np.datetime_as_string(value, unit="m"))
+
+
+def build_refresh_graph(include_decision: bool = False):
+    """Sub-graph of the price-dependent agents, re-run on every new bar"""
+    from langgraph.graph import END, StateGraph
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("feature_frame_agent", feature_frame_agent)
+    workflow.add_node("technical_analyst_agent", technical_analyst_agent)
+    workflow.add_node("risk_management_agent", risk_management_agent)
+    workflow.set_entry_point("feature_frame_agent")
+    workflow.add_edge("feature_frame_agent", "technical_analyst_agent")
+    workflow.add_edge("technical_analyst_agent", "risk_management_agent")
+    if include_decision:
+        workflow.add_node("portfolio_management_agent",
+                          portfolio_management_agent)
+        workflow.add_edge("risk_management_agent",
+                          "portfolio_management_agent")
+        workflow.add_edge("portfolio_management_agent", END)
+    else:
+        workflow.add_edge("risk_management_agent", END)
+    return workflow.compile()
+
+
+class StreamingSession:
+    """
+    Keeps one agent state per ticker and refreshes its price-driven signals
+    as bars arrive.
+
+    bootstrap() runs the full workflow once per ticker. After that each bar
+    only re-runs the feature frame, technical analyst and risk manager (plus
+    the portfolio manager when decide=True), reusing the fundamentals,
+    sentiment and valuation signals from the bootstrap.
+    """
+
+    def __init__(self, interval: str = "5m", capacity: int = 1000, num_of_news: int = 5,
+                 decide: bool = False, show_reasoning: bool = False):
+        self.interval = validate_interval(interval)
+        self.capacity = capacity
+        self.num_of_news = num_of_news
+        self.decide = decide
+        self.show_reasoning = show_reasoning
+        self.buffers: Dict[str, PriceWindow] = {}
+        self.risk: Dict[str, IncrementalRisk] = {}
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self._refresh_app = build_refresh_graph(decide)
+
+    def bootstrap(self, ticker: str, portfolio: dict, end_date: str = None, prices: PriceArrays = None):
+        """Run the full workflow for ticker and seed its bar buffer"""
+        ticker = ticker.upper()
+        end_date = end_date or datetime.now().strftime("%Y-%m-%d")
+        lookback_days = INTERVALS[self.interval]["max_lookback_days"] or 365
+        start_date = (datetime.strptime(end_date, "%Y-%m-%d") -
+                      timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+
+        state = run_hedge_fund_state(
+            ticker, start_date, end_date, portfolio, self.show_reasoning,
+            self.num_of_news, interval=self.interval, prices=prices)
+        self.states[ticker] = state
+        self.buffers[ticker] = PriceWindow.from_prices(
+            state["data"]["prices"], self.capacity)
+        # 逐根 K 线增量更新的风险指标（窗口与缓冲区一致）
+        self.risk[ticker] = IncrementalRisk.from_prices(
+            self.buffers[ticker].view().close, window=max(self.capacity - 1, 2),
+            periods_per_year=INTERVALS[self.interval]["periods_per_year"])
+        return self.snapshot(ticker)
+
+    def on_bar(self, bar: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply one bar; returns the refreshed snapshot, or None if ignored"""
+        ticker = bar["ticker"].upper()
+        buffer = self.buffers.get(ticker)
+        if buffer is None:
+            return None
+        last_time = buffer.last_time
+        if not buffer.append_bar(bar):
+            return None
+        self.risk[ticker].update(float(bar["close"]),
+                                 replace=buffer.last_time == last_time)
+        return self.refresh(ticker)
+
+    def refresh(self, ticker: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        state = self.states[ticker]
+        buffer = self.buffers[ticker]
+        data = {
+            **state["data"],
+            # 环形缓冲区的零拷贝视图，下一根 K 线写入前有效
+            "prices": buffer.view(),
+            "current_date": _format_time(buffer.last_time),
+        }
+        data.pop("features", None)
+        self.states[ticker] = invoke_graph(self._refresh_app, {
+            "messages": [HumanMessage(content="Make a trading decision based on the provided data.")] if self.decide else [],
+            "data": data,
+            "metadata": state["metadata"],
+            "signals": state["signals"],
+        })
+        # 未请求决策时沿用 bootstrap 的消息
+        if not self.decide:
+            self.states[ticker]["messages"] = state["messages"]
+        return self.snapshot(ticker, latency=time.perf_counter() - start,
+                             include_decision=self.decide)
+
+    def snapshot(self, ticker: str, latency: float = None, include_decision: bool = True) -> Dict[str, Any]:
+        state = self.states[ticker]
+        technical = state["signals"]["technical_analyst_agent"]
+        risk = state["signals"]["risk_management_agent"]
+        snapshot = {
+            "ticker": ticker,
+            "time": _format_time(self.buffers[ticker].last_time) if ticker in self.buffers else None,
+            "close": float(state["data"]["prices"].close[-1]) if len(state["data"]["prices"]) else None,
+            "technical_signal": technical.signal,
+            "technical_confidence": round(float(technical.confidence), 4),
+            "max_position_size": risk.max_position_size,
+            "trading_action": risk.trading_action,
+        }
+        if ticker in self.risk:
+            snapshot["risk"] = {name: round(value, 6)
+                                for name, value in self.risk[ticker].metrics().items()}
+        if include_decision and state["messages"]:
+            snapshot["decision"] = state["messages"][-1].content
+        if latency is not None:
+            snapshot["latency_ms"] = round(latency * 1000, 2)
+        return snapshot
+
+    def run(self, feed: Iterable[Dict[str, Any]], on_update: Callable[[Dict[str, Any]], None] = print):
+        for bar in feed:
+            update = self.on_bar(bar)
+            if update is not None:
+                on_update(update)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Refresh technical and risk signals as new bars arrive')
+    parser.add_argument('--tickers', type=str, required=True,
+                        help='Comma-separated stock codes (e.g., AAPL,MSFT)')
+    parser.add_argument('--interval', type=str, default='5m', choices=list(INTERVALS),
+                        help='Bar size (default: 5m)')
+    parser.add_argument('--replay', type=str,
+                        help='Replay bars from a CSV/JSON-lines file instead of polling yfinance')
+    parser.add_argument('--warmup', type=int, default=0,
+                        help='With --replay, use the first N bars of each ticker as the bootstrap history')
+    parser.add_argument('--replay-delay', type=float, default=0.0,
+                        help='Seconds to wait between replayed bars')
+    parser.add_argument('--poll-seconds', type=float, default=60.0,
+                        help='Polling period of the live yfinance feed (default: 60)')
+    parser.add_argument('--capacity', type=int, default=1000,
+                        help='Bars kept per ticker (default: 1000)')
+    parser.add_argument('--initial-capital', type=float, default=100000.0,
+                        help='Initial cash amount per ticker (default: 100,000)')
+    parser.add_argument('--num-of-news', type=int, default=5,
+                        help='Number of news articles used by the bootstrap run (default: 5)')
+    parser.add_argument('--decide', action='store_true',
+                        help='Also re-run the portfolio manager (LLM call) on every bar')
+    parser.add_argument('--show-reasoning', action='store_true',
+                        help='Show reasoning from each agent')
+
+    args = parser.parse_args()
+    tickers = [t.strip().upper() for t in args.tickers.split(",") if t.strip()]
+
+    session = StreamingSession(args.interval, args.capacity, args.num_of_news,
+                               args.decide, args.show_reasoning)
+
+    if args.replay:
+        warmup, feed = FileReplayFeed(args.replay, args.replay_delay).split_warmup(
+            tickers, args.warmup)
+    else:
+        warmup, feed = {}, YFinancePollingFeed(
+            tickers, args.interval, args.poll_seconds)
+
+    for ticker in tickers:
+        print(json.dumps(session.bootstrap(
+            ticker, {"cash": args.initial_capital, "stock": 0},
+            prices=warmup.get(ticker))))
+
+    session.run(feed, on_update=lambda update: print(json.dumps(update)))
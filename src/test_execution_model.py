@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from execution_model import (ExecutionModel, affordable_quantity, commission, fill_price,
+                             participation_limit)
+
+
+def test_fill_price_crosses_half_the_estimated_spread():
+    assert fill_price(1, 100.0, 104.0, 96.0, spread_fraction=0.5) == pytest.approx(102.0)
+    assert fill_price(-1, 100.0, 104.0, 96.0, spread_fraction=0.5) == pytest.approx(98.0)
+    assert fill_price(1, 100.0, 104.0, 96.0) == pytest.approx(100.0)
+
+
+def test_commission_is_zero_without_a_fill():
+    fees = commission(np.array([0, 10, 100]), 50.0, fixed=1.0, bps=10)
+    assert fees.tolist() == pytest.approx([0.0, 1.5, 6.0])
+
+
+def test_participation_limit_and_affordable_quantity():
+    assert participation_limit(None, 0.1) == np.inf
+    assert participation_limit(12345, None) == np.inf
+    assert participation_limit(np.array([12345, np.nan]), 0.1).tolist() == [1234.0, 0.0]
+    # 1 美元固定费用 + 10 bp：(1000 - 1) / (10 * 1.001) = 99.8
+    assert affordable_quantity(1000.0, 10.0, fixed=1.0, bps=10) == 99.0
+    assert affordable_quantity(0.5, 10.0, fixed=1.0) == 0.0
+
+
+def test_default_model_is_frictionless():
+    filled, price, fees = ExecutionModel().fill(1, 10, 100.0, 101.0, 99.0, volume=1, cash=1e6)
+    assert (filled, price, fees) == (10.0, 100.0, 0.0)
+
+
+def test_fill_applies_volume_cash_and_position_limits():
+    model = ExecutionModel(commission_fixed=1.0, commission_bps=10, spread_fraction=0.5,
+                           participation_rate=0.01)
+    filled, price, fees = model.fill(1, 500, 100.0, 104.0, 96.0, volume=30_000, cash=20_000.0)
+    # 成交价 102；成交量上限 300 股，资金上限 floor(19999 / 102.102) = 195 股
+    assert (filled, price) == (195.0, pytest.approx(102.0))
+    assert fees == pytest.approx(1.0 + 195 * 102.0 * 0.001)
+
+    filled, price, _ = model.fill(-1, 500, 100.0, 104.0, 96.0, volume=30_000, position=120)
+    assert (filled, price) == (120.0, pytest.approx(98.0))
+
+
+def test_fill_is_vectorized_over_orders():
+    model = ExecutionModel(participation_rate=0.1)
+    quantity = np.array([50, 500, 5])
+    filled, price, fees = model.fill(np.ones(3), quantity, np.array([10.0, 20.0, 30.0]),
+                                     np.array([11.0, 21.0, 31.0]), np.array([9.0, 19.0, 29.0]),
+                                     volume=np.array([1000, 1000, 1000]),
+                                     cash=np.array([1e6, 1e6, 100.0]))
+    assert filled.tolist() == [50.0, 100.0, 3.0]
+    assert price.tolist() == [10.0, 20.0, 30.0] and fees.tolist() == [0.0, 0.0, 0.0]
@@ -0,0 +1,114 @@
+import csv
+
+import numpy as np
+import pytest
+
+import streaming
+from benchmark_fixtures import replay, synthesize_fixtures
+from benchmark_pipeline import clear_caches
+from main import run_hedge_fund_state
+from streaming import FileReplayFeed, StreamingSession
+from tools.instrumentation import tracer
+from tools.price_arrays import PriceArrays
+
+# 离线测试：基本面、新闻和 LLM 来自合成 fixture，K 线来自回放文件
+
+TICKER = "T000"
+END_DATE = "2024-06-28"
+WARMUP = 240
+STREAMED = 12
+PORTFOLIO = {"cash": 100000.0, "stock": 0}
+
+
+def _bars(ticker: str, count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    times = np.datetime64("2024-06-20T13:30") + np.arange(count) * np.timedelta64(5, "m")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+    return [{"ticker": ticker.lower(), "time": str(t), "open": c * 0.999, "high": c * 1.002,
+             "low": c * 0.998, "close": c, "volume": int(v)}
+            for t, c, v in zip(times, close, rng.integers(10_000, 50_000, count))]
+
+
+@pytest.fixture(scope="module")
+def fixtures(tmp_path_factory):
+    path = tmp_path_factory.mktemp("fixtures")
+    synthesize_fixtures(str(path), [TICKER], "2024-01-02", END_DATE)
+    return str(path)
+
+
+@pytest.fixture
+def offline(fixtures, tmp_path, monkeypatch):
+    """Replay the fixture set inside an empty working directory with cold caches"""
+    monkeypatch.chdir(tmp_path)
+    clear_caches()
+    with replay(fixtures):
+        yield tmp_path
+    clear_caches()
+
+
+@pytest.fixture
+def bar_file(tmp_path):
+    bars = _bars(TICKER, WARMUP + STREAMED, seed=7) + _bars("OTHER", 3, seed=8)
+    path = tmp_path / "bars.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(bars[0]))
+        writer.writeheader()
+        writer.writerows(bars)
+    return str(path)
+
+
+def test_file_replay_feed_splits_warmup(bar_file):
+    history, remaining = FileReplayFeed(bar_file).split_warmup([TICKER], WARMUP)
+    remaining = list(remaining)
+
+    assert list(history) == [TICKER]
+    assert len(history[TICKER]) == WARMUP
+    assert [bar["ticker"] for bar in remaining] == [TICKER] * STREAMED + ["OTHER"] * 3
+    assert np.datetime64(remaining[0]["time"]) > history[TICKER].dates[-1]
+
+
+def test_bars_rerun_only_the_price_subgraph(offline, bar_file, monkeypatch):
+    calls = []
+    for name in ("feature_frame_agent", "technical_analyst_agent", "risk_management_agent"):
+        node = getattr(streaming, name)
+        monkeypatch.setattr(streaming, name,
+                            lambda state, node=node, name=name: calls.append(name) or node(state))
+
+    history, feed = FileReplayFeed(bar_file).split_warmup([TICKER], WARMUP)
+    session = StreamingSession(interval="5m")
+    session.bootstrap(TICKER, PORTFOLIO, end_date=END_DATE, prices=history[TICKER])
+    tracer.clear()
+
+    updates = []
+    session.run(feed, on_update=updates.append)
+
+    # 只有价格相关的三个节点按每根 K 线重算，没有外部调用，未订阅的股票被忽略
+    assert len(updates) == STREAMED
+    assert calls == ["feature_frame_agent", "technical_analyst_agent",
+                     "risk_management_agent"] * STREAMED
+    assert not any(totals["calls"] for totals in tracer.summary().values())
+    assert "decision" not in updates[-1]
+    assert session.states[TICKER]["signals"]["sentiment_agent"] is not None
+
+
+def test_streamed_signals_match_full_run(offline, bar_file):
+    history, feed = FileReplayFeed(bar_file).split_warmup([TICKER], WARMUP)
+    feed = [bar for bar in feed if bar["ticker"] == TICKER]
+    session = StreamingSession(interval="5m")
+    session.bootstrap(TICKER, PORTFOLIO, end_date=END_DATE, prices=history[TICKER])
+    for bar in feed:
+        update = session.on_bar(bar)
+
+    streamed = session.states[TICKER]["signals"]
+    full = run_hedge_fund_state(
+        TICKER, "2024-05-01", END_DATE, PORTFOLIO, interval="5m",
+        prices=PriceArrays.from_records(_bars(TICKER, WARMUP + STREAMED, seed=7)))["signals"]
+
+    assert update["close"] == pytest.approx(float(feed[-1]["close"]))
+    technical, expected = streamed["technical_analyst_agent"], full["technical_analyst_agent"]
+    assert technical.signal == expected.signal
+    assert technical.confidence == pytest.approx(expected.confidence)
+    risk, expected = streamed["risk_management_agent"], full["risk_management_agent"]
+    assert (risk.trading_action, risk.risk_score) == (expected.trading_action, expected.risk_score)
+    assert risk.max_position_size == pytest.approx(expected.max_position_size)
+    assert risk.risk_metrics == pytest.approx(expected.risk_metrics)
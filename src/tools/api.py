@@ -1,14 +1,32 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Union
 import pandas as pd
-import yfinance as yf
+from tools.fundamentals_store import fundamentals_store
+from tools.instrumentation import traced
+from tools.price_arrays import PriceArrays
+from tools.transport import ReplayMiss, transport
 from datetime import datetime, timedelta
 import random
 import json
 
 
-def get_financial_metrics(ticker: str) -> Dict[str, Any]:
-    """获取财务指标数据，包含缓存机制和时间戳"""
-    stock = yf.Ticker(ticker)
+@traced("yfinance")
+def get_financial_metrics(ticker: str, as_of: str = None, price: float = None) -> Dict[str, Any]:
+    """
+    获取财务指标数据，包含缓存机制和时间戳
+
+    Args:
+        as_of: Optional date (YYYY-MM-DD); metrics are then computed from the
+            statements published by that date (point-in-time, for backtests)
+        price: Share price on as_of, used for market cap and price ratios
+    """
+    if as_of is not None:
+        metrics = fundamentals_store.financial_metrics(ticker, as_of, price)
+        if metrics is None:
+            print(f"Warning: No financial statements for {ticker} as of {as_of}")
+            return [_empty_metrics()]
+        return [metrics]
+
+    stock = transport.ticker(ticker)
     info = stock.info
 
     try:
@@ -66,35 +84,53 @@ def get_financial_metrics(ticker: str) -> Dict[str, Any]:
 
     except Exception as e:
         print(f"Error getting financial metrics: {e}")
-        return [{
-            "market_cap": 0,
-            "pe_ratio": 0,
-            "price_to_book": 0,
-            "dividend_yield": 0,
-            "revenue": 0,
-            "net_income": 0,
-            "return_on_equity": 0,
-            "net_margin": 0,
-            "operating_margin": 0,
-            "revenue_growth": 0,
-            "earnings_growth": 0,
-            "book_value_growth": 0,
-            "current_ratio": 0,
-            "debt_to_equity": 0,
-            "free_cash_flow_per_share": 0,
-            "earnings_per_share": 0,
-            "price_to_earnings_ratio": 0,
-            "price_to_book_ratio": 0,
-            "price_to_sales_ratio": 0,
-            "data_timestamp": None,
-            "days_since_update": None,
-            "is_data_recent": False
-        }]
-
-
-def get_financial_statements(ticker: str) -> Dict[str, Any]:
-    """获取财务报表数据"""
-    stock = yf.Ticker(ticker)
+        return [_empty_metrics()]
+
+
+def _empty_metrics() -> Dict[str, Any]:
+    return {
+        "market_cap": 0,
+        "pe_ratio": 0,
+        "price_to_book": 0,
+        "dividend_yield": 0,
+        "revenue": 0,
+        "net_income": 0,
+        "return_on_equity": 0,
+        "net_margin": 0,
+        "operating_margin": 0,
+        "revenue_growth": 0,
+        "earnings_growth": 0,
+        "book_value_growth": 0,
+        "current_ratio": 0,
+        "debt_to_equity": 0,
+        "free_cash_flow_per_share": 0,
+        "earnings_per_share": 0,
+        "price_to_earnings_ratio": 0,
+        "price_to_book_ratio": 0,
+        "price_to_sales_ratio": 0,
+        "data_timestamp": None,
+        "days_since_update": None,
+        "is_data_recent": False
+    }
+
+
+@traced("yfinance")
+def get_financial_statements(ticker: str, as_of: str = None) -> Dict[str, Any]:
+    """
+    获取财务报表数据
+
+    Args:
+        as_of: Optional date (YYYY-MM-DD); only statements published by then
+            are returned (point-in-time, for backtests)
+    """
+    if as_of is not None:
+        line_items = fundamentals_store.financial_statements(ticker, as_of)
+        if line_items:
+            return line_items
+        print(f"Warning: No financial statements for {ticker} as of {as_of}")
+        return [_empty_line_item(), _empty_line_item()]
+
+    stock = transport.ticker(ticker)
 
     try:
         financials = stock.financials  # 获取所有财务数据
@@ -129,19 +165,24 @@ def get_financial_statements(ticker: str) -> Dict[str, Any]:
     except Exception as e:
         print(f"Warning: Error getting financial statements: {e}")
         # 返回两个相同的默认数据
-        default_item = {
-            "free_cash_flow": 0,
-            "net_income": 0,
-            "depreciation_and_amortization": 0,
-            "capital_expenditure": 0,
-            "working_capital": 0
-        }
+        default_item = _empty_line_item()
         return [default_item, default_item]
 
 
+def _empty_line_item() -> Dict[str, Any]:
+    return {
+        "free_cash_flow": 0,
+        "net_income": 0,
+        "depreciation_and_amortization": 0,
+        "capital_expenditure": 0,
+        "working_capital": 0
+    }
+
+
+@traced("yfinance")
 def get_insider_trades(ticker: str) -> List[Dict[str, Any]]:
     """获取内部交易数据"""
-    stock = yf.Ticker(ticker)
+    stock = transport.ticker(ticker)
     try:
         # 获取实际的内部交易数据
         insider_trades = stock.insider_trades
@@ -163,9 +204,10 @@ def get_insider_trades(ticker: str) -> List[Dict[str, Any]]:
         return []
 
 
+@traced("yfinance")
 def get_market_data(ticker: str) -> Dict[str, Any]:
     """获取市场数据"""
-    stock = yf.Ticker(ticker)
+    stock = transport.ticker(ticker)
     info = stock.info
 
     return {
@@ -173,13 +215,42 @@ def get_market_data(ticker: str) -> Dict[str, Any]:
         "volume": info.get("volume", 0),
         "average_volume": info.get("averageVolume", 0),
         "fifty_two_week_high": info.get("fiftyTwoWeekHigh", 0),
-        "fifty_two_week_low": info.get("fiftyTwoWeekLow", 0)
+        "fifty_two_week_low": info.get("fiftyTwoWeekLow", 0),
+        "sector": info.get("sector")
     }
 
 
-def get_price_history(ticker: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-    """获取历史价格数据，返回与原项目相同格式的数据"""
-    stock = yf.Ticker(ticker)
+# 支持的 K 线周期：每年的 bar 数（用于年化）与 yfinance 允许的最长回看天数
+INTERVALS = {
+    "1d": {"periods_per_year": 252, "max_lookback_days": None},
+    "1h": {"periods_per_year": 252 * 7, "max_lookback_days": 729},
+    "5m": {"periods_per_year": 252 * 78, "max_lookback_days": 59},
+    "1m": {"periods_per_year": 252 * 390, "max_lookback_days": 7},
+}
+
+
+def validate_interval(interval: str) -> str:
+    if interval not in INTERVALS:
+        raise ValueError(
+            f"Unsupported interval '{interval}', expected one of {list(INTERVALS)}")
+    return interval
+
+
+@traced("yfinance")
+def get_price_history(ticker: str, start_date: str = None, end_date: str = None, interval: str = "1d") -> PriceArrays:
+    """
+    获取历史价格数据，以列式数组（PriceArrays）返回
+
+    Args:
+        ticker: Stock code
+        start_date: Start date (YYYY-MM-DD), defaults to 3 months before end_date
+        end_date: End date (YYYY-MM-DD), defaults to now. Exclusive for daily
+            bars; for intraday bars the whole end date is included.
+        interval: Bar size, one of INTERVALS (1d, 1h, 5m, 1m). Intraday
+            start dates are clamped to the interval's lookback before end_date.
+    """
+    validate_interval(interval)
+    stock = transport.ticker(ticker)
 
     # 如果没有提供日期，默认获取过去3个月的数据
     if not end_date:
@@ -192,37 +263,33 @@ def get_price_history(ticker: str, start_date: str = None, end_date: str = None)
     else:
         start_date = datetime.strptime(start_date, "%Y-%m-%d")
 
-        # 获取历史数据
-        df = stock.history(start=start_date, end=end_date)
-
-        # 转换为原项目格式的列表
-        prices = []
-        for date, row in df.iterrows():
-            price_dict = {
-                "time": date.strftime("%Y-%m-%d"),
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-                "volume": int(row["Volume"])
-            }
-            prices.append(price_dict)
+    # 分钟/小时线 yfinance 只提供最近一段时间的数据
+    # 回看上限从请求的结束日期（只取日期）往前算，请求键不随运行时刻变化，录制后可以回放；
+    # 少算一天，结束日期为今天时起点仍在 yfinance 的窗口内
+    max_lookback = INTERVALS[interval]["max_lookback_days"]
+    if max_lookback is not None:
+        earliest = end_date.replace(hour=0, minute=0, second=0, microsecond=0) \
+            - timedelta(days=max_lookback - 1)
+        if start_date < earliest:
+            start_date = earliest
+        end_date = end_date + timedelta(days=1)
 
-        return prices
+    # 获取历史数据
+    df = stock.history(start=start_date, end=end_date, interval=interval)
+    if df.empty:
+        return PriceArrays.empty()
 
+    return PriceArrays.from_yfinance(df)
 
-def prices_to_df(prices: List[Dict[str, Any]]) -> pd.DataFrame:
-    """将价格列表转换为 DataFrame，保持与原项目相同的格式"""
-    df = pd.DataFrame(prices)
-    df["Date"] = pd.to_datetime(df["time"])
-    df.set_index("Date", inplace=True)
-    numeric_cols = ["open", "close", "high", "low", "volume"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-    df.sort_index(inplace=True)
-    return df
 
+def prices_to_df(prices: Union[PriceArrays, List[Dict[str, Any]]]) -> pd.DataFrame:
+    """将价格数据转换为以 Date 为索引的 DataFrame（兼容旧的字典列表格式）"""
+    if not isinstance(prices, PriceArrays):
+        prices = PriceArrays.from_records(prices)
+    return prices.to_df()
 
+
+@traced("yfinance")
 def get_price_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
     """获取价格数据并转换为DataFrame格式"""
     try:
@@ -234,7 +301,7 @@ def get_price_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
         if start == end:
             end = start + timedelta(days=1)
 
-        stock = yf.Ticker(ticker)
+        stock = transport.ticker(ticker)
         df = stock.history(start=start, end=end)
 
         if df.empty:
@@ -268,3 +335,52 @@ def get_price_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
         print(f"Error in get_price_data for {ticker}: {str(e)}")
         # 返回空DataFrame但包含所需的列
         return pd.DataFrame(columns=["Date", "open", "high", "low", "close", "volume"])
+
+
+PANEL_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+@traced("yfinance")
+def get_price_panel(tickers: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+    """
+    批量获取多只股票的价格数据（一次请求）
+
+    Args:
+        tickers: Stock codes
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD, exclusive like yfinance)
+
+    Returns:
+        Dict mapping each OHLCV field to a (dates x tickers) DataFrame.
+        Tickers without data are left out; missing bars are NaN.
+    """
+    try:
+        raw = transport.download(list(tickers), start=start_date, end=end_date,
+                          group_by="column", auto_adjust=True,
+                          threads=True, progress=False)
+    except ReplayMiss:
+        # 回放缺少记录时不能当作"没有数据"，否则基准相关特征会悄悄消失
+        raise
+    except Exception as e:
+        print(f"Error in get_price_panel: {str(e)}")
+        raw = pd.DataFrame()
+
+    if raw.empty:
+        print(
+            f"Warning: No price data found for {len(tickers)} tickers between {start_date} and {end_date}")
+        return {field: pd.DataFrame(columns=list(tickers)) for field in PANEL_FIELDS}
+
+    if raw.index.tz is not None:
+        raw.index = raw.index.tz_localize(None)
+    raw.index.name = "Date"
+
+    panel = {}
+    for field in PANEL_FIELDS:
+        frame = raw[field.capitalize()]
+        if isinstance(frame, pd.Series):  # 单只股票时 yfinance 不返回多级列
+            frame = frame.to_frame(tickers[0])
+        panel[field] = frame.astype(float)
+
+    # 去掉整段没有数据的股票
+    available = panel["close"].columns[panel["close"].notna().any()]
+    return {field: frame[available] for field, frame in panel.items()}
@@ -0,0 +1,168 @@
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# 协方差风险模型：零均值日收益的二阶矩，Ledoit-Wolf 收缩到等方差对角阵。
+# 所有 N x N 运算按列块进行，几千只股票时临时内存为 block x N 而不是 N x N 的多份拷贝。
+
+BLOCK_SIZE = 512
+
+Holdings = Union[Dict[str, float], pd.Series, np.ndarray]
+
+
+def blocked_gram(x: np.ndarray, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """X.T @ X computed block by block (upper triangle, then mirrored)"""
+    n = x.shape[1]
+    gram = np.empty((n, n))
+    for i in range(0, n, block_size):
+        left = x[:, i:i + block_size]
+        for j in range(i, n, block_size):
+            block = left.T @ x[:, j:j + block_size]
+            gram[i:i + block_size, j:j + block_size] = block
+            if j != i:
+                gram[j:j + block_size, i:i + block_size] = block.T
+    return gram
+
+
+def _shrink(gram: np.ndarray, sum_norm4: float, n_obs: int) -> Tuple[np.ndarray, float]:
+    """Ledoit-Wolf shrinkage of gram / n_obs towards mean-variance * identity"""
+    sample = gram / n_obs
+    n = sample.shape[0]
+    mu = np.trace(sample) / n
+    sample_norm = float(np.sum(sample * sample))
+    # ||S - mu I||^2 = ||S||^2 - 2 mu tr(S) + n mu^2 = ||S||^2 - n mu^2
+    dispersion = sample_norm - n * mu * mu
+    # 抽样误差：(1/T^2) * sum_t ||x_t x_t' - S||^2 = (sum_t ||x_t||^4 / T - ||S||^2) / T
+    error = max(sum_norm4 / n_obs - sample_norm, 0.0) / n_obs
+    shrinkage = min(error, dispersion) / dispersion if dispersion > 0 else 1.0
+    covariance = sample * (1 - shrinkage)
+    covariance[np.diag_indices(n)] += shrinkage * mu
+    return covariance, shrinkage
+
+
+def shrinkage_covariance(returns: Union[pd.DataFrame, np.ndarray],
+                         block_size: int = BLOCK_SIZE) -> Tuple[np.ndarray, float]:
+    """
+    Ledoit-Wolf shrinkage covariance of a (periods x assets) return panel.
+
+    Returns are treated as zero-mean (per-period risk) and missing values as
+    0. Returns the covariance matrix and the shrinkage intensity (0-1).
+    """
+    x = np.nan_to_num(np.asarray(returns, dtype=float))
+    norms = np.einsum("ij,ij->i", x, x)
+    return _shrink(blocked_gram(x, block_size), float(np.sum(norms * norms)), len(x))
+
+
+def returns_panel(closes: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Aligned (dates x tickers) simple returns from per-ticker close series"""
+    panel = pd.DataFrame(closes).sort_index()
+    return panel.pct_change(fill_method=None).iloc[1:]
+
+
+class CovarianceModel:
+    """
+    Rolling shrinkage covariance of a universe, updated one period at a time.
+
+    fit() takes the initial window; update() adds a period and evicts the
+    oldest with a blocked rank-1 correction of the running X'X (O(N^2), no
+    N x N temporaries) instead of recomputing it. portfolio_risk() gives the
+    volatility, parametric VaR and its marginal / component breakdown for any
+    holdings.
+    """
+
+    def __init__(self, window: int = 252, block_size: int = BLOCK_SIZE):
+        self.window = window
+        self.block_size = block_size
+        self.tickers: List[str] = []
+        self._rows: Optional[np.ndarray] = None
+        self._norms4: Optional[np.ndarray] = None
+        self._next = 0
+        self._count = 0
+        self._gram: Optional[np.ndarray] = None
+        self._updates = 0
+        self._cached: Optional[Tuple[np.ndarray, float]] = None
+
+    def __len__(self):
+        return self._count
+
+    def fit(self, returns: pd.DataFrame) -> "CovarianceModel":
+        self.tickers = list(returns.columns)
+        x = np.nan_to_num(returns.to_numpy(dtype=float))[-self.window:]
+        self._rows = np.zeros((self.window, x.shape[1]))
+        self._norms4 = np.zeros(self.window)
+        self._count = len(x)
+        self._next = self._count % self.window
+        self._rows[:self._count] = x
+        self._norms4[:self._count] = np.einsum("ij,ij->i", x, x) ** 2
+        self._gram = blocked_gram(x, self.block_size)
+        self._cached = None
+        return self
+
+    def _rank_one(self, row: np.ndarray, sign: float):
+        for i in range(0, len(row), self.block_size):
+            self._gram[i:i + self.block_size] += sign * \
+                np.outer(row[i:i + self.block_size], row)
+
+    def update(self, returns: Union[pd.Series, np.ndarray]):
+        """Add one period of returns (a Series is aligned to the model's tickers)"""
+        if isinstance(returns, pd.Series):
+            returns = returns.reindex(self.tickers)
+        row = np.nan_to_num(np.asarray(returns, dtype=float))
+        if self._count == self.window:
+            self._rank_one(self._rows[self._next], -1.0)
+        else:
+            self._count += 1
+        self._rank_one(row, 1.0)
+        self._rows[self._next] = row
+        self._norms4[self._next] = float(row @ row) ** 2
+        self._next = (self._next + 1) % self.window
+        self._updates += 1
+        if self._updates % self.window == 0:
+            # 定期重新计算，避免增量更新累计浮点误差
+            self._gram = blocked_gram(self._rows[:self._count], self.block_size)
+        self._cached = None
+
+    def covariance(self) -> Tuple[np.ndarray, float]:
+        """(covariance matrix, shrinkage intensity) of the current window"""
+        if self._cached is None:
+            if not self._count:
+                raise ValueError("CovarianceModel has no data, call fit() first")
+            self._cached = _shrink(self._gram, float(self._norms4.sum()), self._count)
+        return self._cached
+
+    def covariance_frame(self) -> pd.DataFrame:
+        covariance, _ = self.covariance()
+        return pd.DataFrame(covariance, index=self.tickers, columns=self.tickers)
+
+    def _exposures(self, holdings: Holdings) -> np.ndarray:
+        if isinstance(holdings, dict):
+            holdings = pd.Series(holdings, dtype=float)
+        if isinstance(holdings, pd.Series):
+            return holdings.reindex(self.tickers).fillna(0.0).to_numpy(dtype=float)
+        return np.asarray(holdings, dtype=float)
+
+    def portfolio_risk(self, holdings: Holdings, confidence: float = 0.95) -> Dict[str, object]:
+        """
+        One-period risk of holdings (market values per ticker, or weights).
+
+        Returns:
+            dict: volatility, value_at_risk (negative for a loss, like the
+            risk kernels), and per-ticker marginal_var (VaR change per unit
+            of exposure) and component_var (contributions summing to the VaR)
+        """
+        covariance, shrinkage = self.covariance()
+        exposures = self._exposures(holdings)
+        sigma_w = covariance @ exposures
+        volatility = float(np.sqrt(max(exposures @ sigma_w, 0.0)))
+        z = NormalDist().inv_cdf(1 - confidence)
+        marginal = z * sigma_w / volatility if volatility > 0 else np.zeros_like(sigma_w)
+        component = exposures * marginal
+        return {
+            "volatility": volatility,
+            "value_at_risk": z * volatility,
+            "marginal_var": dict(zip(self.tickers, marginal.tolist())),
+            "component_var": dict(zip(self.tickers, component.tolist())),
+            "shrinkage": shrinkage,
+        }
@@ -0,0 +1,137 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Any, Dict, List
+
+# 日志详细程度：quiet 只记录每日汇总，normal 增加每个 agent 的信号，
+# debug 再增加各 agent 的分析细节
+VERBOSITY_LEVELS = ("quiet", "normal", "debug")
+
+# 已启动、尚未停止的 listener 及其 handlers；进程退出时统一停止（atexit 只注册一次）
+_running: Dict[logging.handlers.QueueListener, List[logging.Handler]] = {}
+_running_lock = threading.Lock()
+_atexit_registered = False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, "event", None)
+        if event is None:
+            event = {"event": "log", "message": record.getMessage()}
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            **event,
+        }
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class BufferedFileHandler(logging.Handler):
+    """File handler that leaves flushing to the OS buffer instead of every record"""
+
+    def __init__(self, filename: str, buffer_size: int = 1 << 16, encoding: str = "utf-8"):
+        super().__init__()
+        self.stream = open(filename, "a", encoding=encoding,
+                           buffering=buffer_size)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if self.stream and not self.stream.closed:
+            self.stream.flush()
+
+    def close(self):
+        try:
+            if self.stream and not self.stream.closed:
+                self.stream.close()
+        finally:
+            super().close()
+
+
+def attach_queue_handlers(logger: logging.Logger, handlers: List[logging.Handler]) -> logging.handlers.QueueListener:
+    """
+    Route a logger through a queue so the handlers run on a background thread.
+
+    Args:
+        logger: Logger to attach to (existing handlers are removed)
+        handlers: Handlers that do the actual formatting and I/O
+
+    Returns:
+        The started QueueListener; call stop() to drain and flush it.
+    """
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    global _atexit_registered
+    with _running_lock:
+        _running[listener] = list(handlers)
+        if not _atexit_registered:
+            atexit.register(stop_all_listeners)
+            _atexit_registered = True
+    return listener
+
+
+def stop_listener(listener: logging.handlers.QueueListener, handlers: List[logging.Handler]):
+    """Drain the queue and flush the handlers, safe to call more than once"""
+    with _running_lock:
+        running = _running.pop(listener, None) is not None
+    if running:
+        listener.stop()
+    for handler in handlers:
+        try:
+            handler.flush()
+        except (OSError, ValueError):
+            # 退出时控制台流可能已被关闭（与 logging.shutdown 的处理一致）
+            pass
+
+
+def stop_all_listeners():
+    """Stop every listener still running (registered with atexit)"""
+    with _running_lock:
+        running = list(_running.items())
+    for listener, handlers in running:
+        stop_listener(listener, handlers)
+
+
+def setup_event_log(name: str, log_file: str, verbosity: str = "normal"):
+    """
+    Create a JSON-lines event logger written asynchronously to log_file.
+
+    Returns:
+        tuple: (logger, listener)
+    """
+    if verbosity not in VERBOSITY_LEVELS:
+        raise ValueError(
+            f"Unknown verbosity '{verbosity}', expected one of {list(VERBOSITY_LEVELS)}")
+
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG if verbosity == "debug" else logging.INFO)
+    logger.propagate = False
+
+    handler = BufferedFileHandler(log_file)
+    handler.setFormatter(JsonLinesFormatter())
+    listener = attach_queue_handlers(logger, [handler])
+    return logger, listener
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any):
+    """Log a structured event; the fields become keys of the JSON record"""
+    if logger.isEnabledFor(level):
+        record: Dict[str, Any] = {"event": event, **fields}
+        logger.log(level, event, extra={"event": record})
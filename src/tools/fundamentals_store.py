@@ -0,0 +1,267 @@
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tools.instrumentation import traced, tracer
+from tools.transport import transport
+
+# 时点（point-in-time）基本面：每期报表按“可获得日期”（报告期末 + 披露滞后）建立索引，
+# 回测中按决策日查询，只能看到当时已经公布的报表，避免未来函数。
+# 市场数据（市值、成交量、52 周区间）同样按决策日由报表股数和决策日前的价格计算，
+# 内部交易只保留决策日及之前的记录。唯一沿用当前 yfinance info 的是行业分类。
+
+# 年报期末到公布之间的保守滞后天数（10-K 最晚 60-90 天）
+REPORTING_LAG_DAYS = 90
+
+STATEMENTS = ("income", "cash_flow", "balance")
+
+# yfinance 新旧版本的科目名称不同，按顺序取第一个存在的
+LINE_ITEM_NAMES = {
+    "revenue": ("Total Revenue",),
+    "net_income": ("Net Income",),
+    "operating_income": ("Operating Income",),
+    "diluted_eps": ("Diluted EPS",),
+    "free_cash_flow": ("Free Cash Flow",),
+    "depreciation": ("Depreciation", "Depreciation And Amortization"),
+    "capital_expenditure": ("Capital Expenditure",),
+    "current_assets": ("Total Current Assets", "Current Assets"),
+    "current_liabilities": ("Total Current Liabilities", "Current Liabilities"),
+    "stockholders_equity": ("Stockholders Equity", "Total Stockholder Equity"),
+    "total_debt": ("Total Debt",),
+    "shares": ("Ordinary Shares Number", "Share Issued"),
+}
+
+
+def _item(statement: pd.Series, name: str, default: float = 0.0) -> float:
+    for label in LINE_ITEM_NAMES[name]:
+        value = statement.get(label)
+        if value is not None and pd.notna(value):
+            return float(value)
+    return default
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+@dataclass
+class TickerFundamentals:
+    """One ticker's statements, one column per period, oldest period first"""
+    period_ends: np.ndarray   # datetime64[ns]
+    available: np.ndarray     # datetime64[ns], period end + reporting lag
+    income: pd.DataFrame
+    cash_flow: pd.DataFrame
+    balance: pd.DataFrame
+
+    def periods_as_of(self, as_of) -> int:
+        """Number of periods published on or before as_of"""
+        return int(np.searchsorted(self.available, np.datetime64(as_of, "ns"), side="right"))
+
+    def period(self, i: int) -> Dict[str, pd.Series]:
+        return {name: getattr(self, name).iloc[:, i] for name in STATEMENTS}
+
+
+@traced("yfinance")
+def load_statements(ticker: str, reporting_lag_days: int = REPORTING_LAG_DAYS) -> TickerFundamentals:
+    """Download the annual statements of ticker and index them by availability date"""
+    stock = transport.ticker(ticker)
+    income = stock.financials
+    if income is None or income.empty:
+        raise ValueError(f"No financial statements available for {ticker}")
+    periods = sorted(income.columns)
+    # 现金流量表和资产负债表按利润表的报告期对齐
+    frames = {
+        "income": income,
+        "cash_flow": stock.cashflow,
+        "balance": stock.balance_sheet,
+    }
+    frames = {name: (frame if frame is not None else pd.DataFrame()).reindex(columns=periods)
+              for name, frame in frames.items()}
+    period_ends = pd.DatetimeIndex(periods).tz_localize(None).values.astype("datetime64[ns]")
+    return TickerFundamentals(
+        period_ends=period_ends,
+        available=period_ends + np.timedelta64(reporting_lag_days, "D"),
+        **frames,
+    )
+
+
+class FundamentalsStore:
+    """
+    Session store of point-in-time fundamentals.
+
+    Each ticker's statements are downloaded once; every later query (one per
+    backtest day) is a searchsorted lookup on the availability dates and only
+    sees the periods published by then. Downloads run outside the store lock,
+    so other tickers are served meanwhile; a query for a ticker that is being
+    downloaded waits for that download.
+    """
+
+    def __init__(self, reporting_lag_days: int = REPORTING_LAG_DAYS, loader=load_statements):
+        self.reporting_lag_days = reporting_lag_days
+        self._loader = loader
+        self._tickers: Dict[str, Optional[TickerFundamentals]] = {}
+        self._loading: Dict[str, Future] = {}
+        self._fetches = 0
+        self._lookups = 0
+        self._lock = threading.Lock()
+
+    def load(self, ticker: str) -> Optional[TickerFundamentals]:
+        with self._lock:
+            self._lookups += 1
+            if ticker in self._tickers:
+                tracer.count("yfinance", "load_statements", cache_hits=1)
+                return self._tickers[ticker]
+            loading = self._loading.get(ticker)
+            if loading is None:
+                future = self._loading[ticker] = Future()
+                self._fetches += 1
+        if loading is not None:
+            return loading.result()
+
+        # 下载不占用锁：其他股票的查询不必等这只股票的网络请求
+        try:
+            fundamentals = self._loader(ticker, self.reporting_lag_days)
+        except Exception as e:
+            print(f"Error loading point-in-time fundamentals for {ticker}: {e}")
+            fundamentals = None
+        with self._lock:
+            self._tickers[ticker] = fundamentals
+            self._loading.pop(ticker, None)
+        future.set_result(fundamentals)
+        return fundamentals
+
+    def periods(self, ticker: str, as_of: str, count: int = 2) -> List[Dict[str, Any]]:
+        """
+        The latest count periods available on as_of, most recent first.
+
+        Returns:
+            list: {"period_end", "income", "cash_flow", "balance"} per period
+        """
+        fundamentals = self.load(ticker)
+        if fundamentals is None:
+            return []
+        available = fundamentals.periods_as_of(as_of)
+        return [
+            {"period_end": pd.Timestamp(fundamentals.period_ends[i]), **fundamentals.period(i)}
+            for i in range(available - 1, max(available - count, 0) - 1, -1)
+        ]
+
+    def shares_outstanding(self, ticker: str, as_of: str) -> float:
+        periods = self.periods(ticker, as_of, count=1)
+        return _item(periods[0]["balance"], "shares") if periods else 0.0
+
+    def financial_metrics(self, ticker: str, as_of: str, price: float = None) -> Optional[Dict[str, Any]]:
+        """
+        The get_financial_metrics fields computed from the statements available
+        on as_of. Price ratios and market cap need the price on as_of.
+        """
+        periods = self.periods(ticker, as_of)
+        if not periods:
+            return None
+        latest = periods[0]
+        previous = periods[1] if len(periods) > 1 else latest
+
+        revenue = _item(latest["income"], "revenue")
+        net_income = _item(latest["income"], "net_income")
+        equity = _item(latest["balance"], "stockholders_equity")
+        shares = _item(latest["balance"], "shares")
+        free_cash_flow = _item(latest["cash_flow"], "free_cash_flow")
+        market_cap = price * shares if price else 0.0
+
+        def growth(statement: str, name: str) -> float:
+            if previous is latest:
+                return 0.0
+            prior = _item(previous[statement], name)
+            return _ratio(_item(latest[statement], name) - prior, prior or 1)
+
+        days_since_update = (pd.Timestamp(as_of) - latest["period_end"]).days
+        return {
+            "market_cap": market_cap,
+            "pe_ratio": _ratio(market_cap, net_income),
+            "price_to_book": _ratio(market_cap, equity),
+            "dividend_yield": 0,
+            "revenue": revenue,
+            "net_income": net_income,
+            "return_on_equity": _ratio(net_income, equity),
+            "net_margin": _ratio(net_income, revenue),
+            "operating_margin": _ratio(_item(latest["income"], "operating_income"), revenue),
+            "revenue_growth": growth("income", "revenue"),
+            "earnings_growth": growth("income", "net_income"),
+            "book_value_growth": growth("balance", "stockholders_equity"),
+            "current_ratio": _ratio(_item(latest["balance"], "current_assets"),
+                                    _item(latest["balance"], "current_liabilities")),
+            "debt_to_equity": _ratio(_item(latest["balance"], "total_debt"), equity),
+            "free_cash_flow_per_share": _ratio(free_cash_flow, shares),
+            "earnings_per_share": _item(latest["income"], "diluted_eps", _ratio(net_income, shares)),
+            "price_to_earnings_ratio": _ratio(market_cap, net_income),
+            "price_to_book_ratio": _ratio(market_cap, equity),
+            "price_to_sales_ratio": _ratio(market_cap, revenue),
+            "data_timestamp": latest["period_end"].strftime("%Y-%m-%d"),
+            "days_since_update": days_since_update,
+            "is_data_recent": days_since_update <= 100,
+        }
+
+    def market_data(self, ticker: str, as_of: str, prices) -> Dict[str, Any]:
+        """
+        The get_market_data fields on as_of: market cap from the shares
+        published by then, volumes and the 52-week range from the daily bars
+        (PriceArrays) up to as_of. market_cap is 0 when the statements give
+        no share count.
+        """
+        keep = prices.dates <= np.datetime64(as_of, "ns")
+        close, high, low, volume = (getattr(prices, name)[keep] for name in ("close", "high", "low", "volume"))
+        if not len(close):
+            return {"market_cap": 0, "volume": 0, "average_volume": 0,
+                    "fifty_two_week_high": 0, "fifty_two_week_low": 0}
+        return {
+            "market_cap": float(close[-1]) * self.shares_outstanding(ticker, as_of),
+            "volume": int(volume[-1]),
+            # yfinance 的 averageVolume 为 3 个月均量
+            "average_volume": int(volume[-63:].mean()),
+            "fifty_two_week_high": float(high[-252:].max()),
+            "fifty_two_week_low": float(low[-252:].min()),
+        }
+
+    def financial_statements(self, ticker: str, as_of: str) -> List[Dict[str, Any]]:
+        """The get_financial_statements line items of the two latest periods available on as_of"""
+        line_items = [
+            {
+                "free_cash_flow": _item(period["cash_flow"], "free_cash_flow"),
+                "net_income": _item(period["income"], "net_income"),
+                "depreciation_and_amortization": _item(period["cash_flow"], "depreciation"),
+                "capital_expenditure": _item(period["cash_flow"], "capital_expenditure"),
+                "working_capital": _item(period["balance"], "current_assets") -
+                _item(period["balance"], "current_liabilities"),
+            }
+            for period in self.periods(ticker, as_of)
+        ]
+        if len(line_items) == 1:
+            line_items.append(line_items[0])
+        return line_items
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"fetches": self._fetches, "lookups": self._lookups,
+                    "tickers": len(self._tickers)}
+
+    def clear(self):
+        with self._lock:
+            self._tickers.clear()
+
+
+fundamentals_store = FundamentalsStore()
+
+
+def is_historical(date: str) -> bool:
+    """Whether date is before today (data as of then must be point-in-time)"""
+    return date < datetime.now().strftime("%Y-%m-%d")
+
+
+def insider_trades_as_of(trades: List[Dict[str, Any]], as_of: str) -> List[Dict[str, Any]]:
+    """The get_insider_trades records dated on or before as_of"""
+    return [trade for trade in trades if str(trade.get("date", ""))[:10] <= as_of]
@@ -0,0 +1,246 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tools.price_arrays import PRICE_COLUMNS, PriceArrays
+
+# 运行追踪：每个图节点和每次外部调用（yfinance、Alpha Vantage、网页抓取、Gemini）
+# 记录一个 span（开始时间、耗时、所在节点、字节数等），同时按 kind:name 累计
+# 调用次数、耗时、字节数、缓存命中、重试次数和等待时间。
+# 调用嵌套时（如 get_financial_metrics 内的 load_statements），外层调用的
+# self_seconds 不含内层调用的耗时，按 self_seconds 汇总不会重复计算。
+
+# 当前正在执行的图节点，外部调用的 span 用它标注来源
+current_node: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_node", default=None)
+
+# 当前未结束的外部调用 span（节点 span 不算），内层调用结束时把耗时记到它名下
+_current_call: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "current_call", default=None)
+
+# 单次运行保留的 span 上限，超出后只累计汇总（流式模式下长期运行）
+MAX_SPANS = 100_000
+
+COUNTERS = ("calls", "errors", "seconds", "self_seconds", "max_seconds", "bytes",
+            "cache_hits", "retries", "sleep_seconds")
+
+
+def payload_bytes(obj: Any, serialize: bool = True) -> int:
+    """
+    Approximate size of a returned payload (frames, arrays, text, JSON-like objects)
+
+    Args:
+        serialize: Size other objects by serializing them to JSON; when False
+            they count as 0, so sizing never costs more than a length lookup
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8"))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, PriceArrays):
+        return int(obj.dates.nbytes + sum(getattr(obj, name).nbytes for name in PRICE_COLUMNS))
+    if isinstance(obj, dict) and obj and all(
+            isinstance(v, (pd.DataFrame, np.ndarray)) for v in obj.values()):
+        return sum(payload_bytes(v) for v in obj.values())
+    if not serialize:
+        return 0
+    try:
+        return len(json.dumps(obj, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Tracer:
+    """
+    Thread-safe per-run trace of graph nodes and outbound calls.
+
+    span() times a block and yields a dict the caller can add fields to
+    (bytes, status...); count() adds to the totals without a span: requests
+    served from a local cache instead of the service (cache_hits), retries
+    and the time slept before them. trace() gives the
+    spans plus the aggregate summary; export() writes it as JSON.
+
+    A call's self time excludes the calls made inside it, so self_seconds
+    adds up across kinds without counting a nested download twice.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.max_spans = max_spans
+        self._spans: List[Dict[str, Any]] = []
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._origin = time.perf_counter()
+
+    def _counters(self, kind: str, name: str) -> Dict[str, float]:
+        return self._totals.setdefault(f"{kind}:{name}", dict.fromkeys(COUNTERS, 0))
+
+    def count(self, kind: str, name: str, **counts: float):
+        """Add to the aggregate counters of kind:name (e.g. cache_hits=1, retries=1, sleep_seconds=2)"""
+        with self._lock:
+            totals = self._counters(kind, name)
+            for key, value in counts.items():
+                totals[key] += value
+
+    @contextmanager
+    def span(self, kind: str, name: str, **fields: Any):
+        """Time the enclosed block as one kind:name call; yields the span's field dict"""
+        record: Dict[str, Any] = dict(fields)
+        parent = _current_call.get()
+        children = {"seconds": 0.0}
+        token = _current_call.set(children) if kind != "node" else None
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if token is not None:
+                _current_call.reset(token)
+            # 并行的内层调用可能比外层还长，自身耗时不小于 0
+            self_seconds = max(seconds - children["seconds"], 0.0) if kind != "node" else seconds
+            node = current_node.get()
+            with self._lock:
+                if parent is not None and kind != "node":
+                    parent["seconds"] += seconds
+                totals = self._counters(kind, name)
+                totals["calls"] += 1
+                totals["seconds"] += seconds
+                totals["self_seconds"] += self_seconds
+                totals["max_seconds"] = max(totals["max_seconds"], seconds)
+                totals["errors"] += "error" in record
+                totals["bytes"] += record.get("bytes", 0)
+                if len(self._spans) < self.max_spans:
+                    self._spans.append({
+                        "kind": kind,
+                        "name": name,
+                        "node": node if kind != "node" else None,
+                        "start_ms": round((start - self._origin) * 1000, 3),
+                        "duration_ms": round(seconds * 1000, 3),
+                        "self_ms": round(self_seconds * 1000, 3),
+                        "thread": threading.current_thread().name,
+                        **record,
+                    })
+                else:
+                    self._dropped += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregate counters per kind:name, most self time first"""
+        with self._lock:
+            ordered = sorted(self._totals.items(),
+                             key=lambda item: item[1]["self_seconds"], reverse=True)
+            return {
+                key: {
+                    **counts,
+                    "mean_ms": counts["seconds"] / counts["calls"] * 1000 if counts["calls"] else 0.0,
+                }
+                for key, counts in ordered
+            }
+
+    def trace(self, **extra: Any) -> Dict[str, Any]:
+        """The whole run: spans in start order, summary and any extra sections"""
+        summary = self.summary()
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span["start_ms"])
+            dropped = self._dropped
+        return {
+            "started": datetime.fromtimestamp(self._started).isoformat(timespec="seconds"),
+            "elapsed_ms": round((time.perf_counter() - self._origin) * 1000, 3),
+            "spans": spans,
+            "dropped_spans": dropped,
+            "summary": summary,
+            **extra,
+        }
+
+    def export(self, path: str, **extra: Any):
+        """Write trace(**extra) to path as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(**extra), f, ensure_ascii=False, indent=2, default=str)
+
+    def report(self) -> str:
+        """Text table of where the run's time goes"""
+        lines = [f"{'Call':<40} {'Calls':>6} {'Total ms':>10} {'Self ms':>10} {'Mean ms':>9} {'KB':>9} "
+                 f"{'Hits':>5} {'Retries':>7} {'Sleep s':>7}",
+                 "-" * 111]
+        for key, s in self.summary().items():
+            lines.append(f"{key:<40} {s['calls']:>6} {s['seconds'] * 1000:>10.1f} "
+                         f"{s['self_seconds'] * 1000:>10.1f} {s['mean_ms']:>9.2f} "
+                         f"{s['bytes'] / 1024:>9.1f} {s['cache_hits']:>5} {s['retries']:>7} "
+                         f"{s['sleep_seconds']:>7.1f}")
+        return "\n".join(lines)
+
+    def clear(self):
+        """Start a new run"""
+        with self._lock:
+            self._spans.clear()
+            self._totals.clear()
+            self._dropped = 0
+            self._started = time.time()
+            self._origin = time.perf_counter()
+
+
+tracer = Tracer()
+
+
+def shallow_bytes(obj: Any) -> int:
+    """payload_bytes without serializing: 0 for results that have no cheap length"""
+    return payload_bytes(obj, serialize=False)
+
+
+def traced(kind: str, name: str = None, size: Callable[[Any], int] = shallow_bytes):
+    """
+    Record every call of the decorated function as a kind:name span.
+
+    Args:
+        kind: Service called (yfinance, alpha_vantage, gemini...)
+        name: Call name, defaults to the function name
+        size: Bytes of the result, None to skip. The default only counts
+            results with a cheap length (text, frames, arrays); pass
+            payload_bytes to also serialize dicts and lists.
+    """
+    def decorator(func):
+        call_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(kind, call_name) as span:
+                result = func(*args, **kwargs)
+                if size is not None:
+                    span["bytes"] = size(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def traced_node(node_name: str):
+    """Wrap a graph node so it is timed and the outbound calls it makes are attributed to it"""
+    def decorator(node):
+        @wraps(node)
+        def wrapper(state):
+            token = current_node.set(node_name)
+            try:
+                with tracer.span("node", node_name):
+                    return node(state)
+            finally:
+                current_node.reset(token)
+        return wrapper
+    return decorator
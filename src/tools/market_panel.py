@@ -0,0 +1,144 @@
+import threading
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+from tools.api import get_price_panel
+from tools.instrumentation import tracer
+
+# 大盘基准与行业 ETF（按 yfinance 的 sector 字段映射）
+MARKET_BENCHMARK = "SPY"
+SECTOR_ETFS = {
+    "Technology": "XLK",
+    "Financial Services": "XLF",
+    "Healthcare": "XLV",
+    "Consumer Cyclical": "XLY",
+    "Consumer Defensive": "XLP",
+    "Energy": "XLE",
+    "Industrials": "XLI",
+    "Basic Materials": "XLB",
+    "Real Estate": "XLRE",
+    "Utilities": "XLU",
+    "Communication Services": "XLC",
+}
+
+Prices = Union[pd.Series, pd.DataFrame]
+
+
+def sector_benchmark(sector: Optional[str]) -> Optional[str]:
+    """Sector ETF for a yfinance sector name, None if unknown"""
+    return SECTOR_ETFS.get(sector) if sector else None
+
+
+class BenchmarkPanel:
+    """
+    Session cache of benchmark and sector ETF closes.
+
+    The whole ETF set is downloaded in one request that runs to the end of
+    the requested end date's month, so every ticker and every backtest day
+    in that month is served from memory. The bounds depend only on the
+    requested dates, so the request key is the same in a later replay.
+    Slices never extend past the requested end date.
+
+    In a long-lived process the panel is also refetched when a request
+    needs a closed session that was not over yet when the panel was
+    downloaded, so a later day in the same month does not miss its bars.
+    """
+
+    def __init__(self, symbols: List[str] = None):
+        self.symbols = symbols or [MARKET_BENCHMARK] + \
+            sorted(set(SECTOR_ETFS.values()))
+        self._closes: Optional[pd.DataFrame] = None
+        self._start: Optional[str] = None
+        self._end: Optional[str] = None
+        self._fetched_on: Optional[pd.Timestamp] = None
+        self._fetches = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self, start_date: str, end_date: str):
+        # 取到 end_date 所在月的月末：回测逐日推进时每月只下载一次，
+        # 且下载范围不随运行当天变化，回放时请求键不变
+        end = (pd.Timestamp(end_date[:10]) + pd.offsets.MonthBegin(1)).strftime("%Y-%m-%d")
+        self._closes = get_price_panel(self.symbols, start_date, end)["close"]
+        self._start = start_date
+        self._end = end
+        self._fetched_on = pd.Timestamp.now().normalize()
+        self._fetches += 1
+
+    def _stale(self, end_date: str) -> bool:
+        # 决策日只用到前一交易日的收盘价：该日在下载时还没收盘、面板里也没有它时重新下载；
+        # 下载之后仍然缺的日子只可能是休市日，不会反复下载
+        needed = min(pd.Timestamp(end_date[:10]), pd.Timestamp.now().normalize()) - pd.Timedelta(days=1)
+        if self._fetched_on > needed:
+            return False
+        return self._closes.empty or self._closes.index[-1] < needed
+
+    def closes(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """Benchmark closes between start_date and end_date (inclusive)"""
+        with self._lock:
+            if self._closes is None or start_date < self._start or end_date[:10] >= self._end \
+                    or self._stale(end_date):
+                self._fetch(start_date, end_date)
+            else:
+                tracer.count("yfinance", "get_price_panel", cache_hits=1)
+            closes = self._closes
+        return closes.loc[start_date:end_date]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"fetches": self._fetches,
+                    "rows": 0 if self._closes is None else len(self._closes)}
+
+    def clear(self):
+        with self._lock:
+            self._closes = None
+            self._start = None
+            self._end = None
+            self._fetched_on = None
+
+
+benchmark_panel = BenchmarkPanel()
+
+
+##### Kernels #####
+# 输入可以是单只股票的 Series，也可以是 (日期 x 股票) 的 DataFrame；
+# benchmark 为与之按日期对齐的 Series，所有列一次计算。
+
+def _rolling_moments(returns: Prices, benchmark_returns: pd.Series, window: int):
+    """Rolling covariance with and variance of the benchmark, plus the asset variance"""
+    mean_x = returns.rolling(window).mean()
+    mean_y = benchmark_returns.rolling(window).mean()
+    if isinstance(returns, pd.DataFrame):
+        cross = returns.mul(benchmark_returns, axis=0).rolling(window).mean()
+        cov = cross - mean_x.mul(mean_y, axis=0)
+    else:
+        cov = (returns * benchmark_returns).rolling(window).mean() - \
+            mean_x * mean_y
+    var_x = (returns ** 2).rolling(window).mean() - mean_x ** 2
+    var_y = (benchmark_returns ** 2).rolling(window).mean() - mean_y ** 2
+    return cov, var_x, var_y
+
+
+def _divide(numerator: Prices, denominator: pd.Series) -> Prices:
+    if isinstance(numerator, pd.DataFrame):
+        return numerator.div(denominator, axis=0)
+    return numerator / denominator
+
+
+def rolling_beta(returns: Prices, benchmark_returns: pd.Series, window: int = 63) -> Prices:
+    """Rolling OLS beta of the returns on the benchmark's returns"""
+    cov, _, var_y = _rolling_moments(returns, benchmark_returns, window)
+    return _divide(cov, var_y)
+
+
+def rolling_correlation(returns: Prices, benchmark_returns: pd.Series, window: int = 63) -> Prices:
+    """Rolling Pearson correlation with the benchmark's returns"""
+    cov, var_x, var_y = _rolling_moments(returns, benchmark_returns, window)
+    return _divide(cov / var_x.clip(lower=0) ** 0.5, var_y.clip(lower=0) ** 0.5)
+
+
+def relative_strength(closes: Prices, benchmark_closes: pd.Series, window: int = 63) -> Prices:
+    """Excess growth over the benchmark across the window: (1 + r) / (1 + r_b) - 1"""
+    growth = closes / closes.shift(window)
+    benchmark_growth = benchmark_closes / benchmark_closes.shift(window)
+    return _divide(growth, benchmark_growth) - 1
@@ -2,10 +2,11 @@ import os
 import sys
 import json
 from datetime import datetime, timedelta
-import requests
-from bs4 import BeautifulSoup
 from tools.openrouter_config import get_chat_completion, logger as api_logger
+from tools.instrumentation import tracer
+from tools.transport import transport
 import logging
+import threading
 import time
 import pandas as pd
 
@@ -18,6 +19,9 @@ import pandas as pd
 #                     ])
 logger = logging.getLogger(__name__)
 
+# 情绪缓存文件是整体读改写的，服务模式下多个线程会同时写入
+_sentiment_cache_lock = threading.Lock()
+
 
 def fetch_article_content(url: str) -> str:
     """Fetch article content from URL using BeautifulSoup
@@ -28,8 +32,14 @@ def fetch_article_content(url: str) -> str:
     Returns:
         str: Article content or empty string if failed
     """
+    # 只有抓取新闻原文时才需要 bs4
+    from bs4 import BeautifulSoup
+
     try:
-        response = requests.get(url, timeout=10)
+        with tracer.span("http", "fetch_article_content") as span:
+            response = transport.get(url, timeout=10)
+            span["bytes"] = len(response.content)
+            span["status"] = response.status_code
         if response.status_code == 200:
             soup = BeautifulSoup(response.text, 'html.parser')
             # Remove script and style elements
@@ -93,6 +103,7 @@ def get_stock_news(symbol: str, date: str = None, max_news: int = 10) -> list:
                 cached_news = data.get("news", [])
                 if len(cached_news) >= max_news:
                     logger.info(f"Using cached news data: {news_file}")
+                    tracer.count("alpha_vantage", "news_sentiment", cache_hits=1)
                     return cached_news[:max_news]
                 else:
                     logger.info(
@@ -112,7 +123,10 @@ def get_stock_news(symbol: str, date: str = None, max_news: int = 10) -> list:
         api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
         url = f'https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={symbol}&time_from={date_str}&time_to={next_date}&limit={max_news}&apikey={api_key}'
 
-        response = requests.get(url)
+        with tracer.span("alpha_vantage", "news_sentiment") as span:
+            response = transport.get(url)
+            span["bytes"] = len(response.content)
+            span["status"] = response.status_code
         data = response.json()
 
         if "feed" not in data:
@@ -222,13 +236,15 @@ def get_stock_news(symbol: str, date: str = None, max_news: int = 10) -> list:
         return []
 
 
-def get_news_sentiment(news_list: list, date: str = None, num_of_news: int = 5) -> float:
+def get_news_sentiment(news_list: list, date: str = None, num_of_news: int = 5, symbol: str = None) -> float:
     """Analyze news sentiment using LLM
 
     Args:
         news_list (list): List of news articles
         date (str, optional): The date for sentiment analysis (YYYY-MM-DD). If None, uses current date.
         num_of_news (int, optional): Number of news articles to analyze. Defaults to 5.
+        symbol (str, optional): Stock symbol the news is about; part of the cache key,
+            so tickers analyzed on the same date do not share a score
 
     Returns:
         float: Sentiment score between -1 and 1
@@ -244,15 +260,17 @@ def get_news_sentiment(news_list: list, date: str = None, num_of_news: int = 5)
     cache_file = "src/data/sentiment_cache.json"
     os.makedirs(os.path.dirname(cache_file), exist_ok=True)
 
-    # Check cache using just the date as key
+    # Check cache (key: symbol and date, or just the date without a symbol)
+    cache_key = f"{symbol}:{date}" if symbol else date
     if os.path.exists(cache_file):
         logger.info("Found sentiment analysis cache file")
         try:
             with open(cache_file, 'r', encoding='utf-8') as f:
                 cache = json.load(f)
-                if date in cache:
+                if cache_key in cache:
                     logger.info("Using cached sentiment analysis result")
-                    return cache[date]
+                    tracer.count("gemini", "get_chat_completion", cache_hits=1)
+                    return cache[cache_key]
                 logger.info("No matching sentiment analysis cache found")
         except Exception as e:
             logger.error(f"Failed to read sentiment cache: {e}")
@@ -322,13 +340,21 @@ def get_news_sentiment(news_list: list, date: str = None, num_of_news: int = 5)
         # Ensure score is between -1 and 1
         sentiment_score = max(-1.0, min(1.0, sentiment_score))
 
-        # Cache result using date as key
-        cache[date] = sentiment_score
+        # Cache result under the symbol and date
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            with _sentiment_cache_lock:
+                # 重新读取，保留其他线程在此期间写入的结果
+                if os.path.exists(cache_file):
+                    with open(cache_file, 'r', encoding='utf-8') as f:
+                        cache = json.load(f)
+                cache[cache_key] = sentiment_score
+                # 先写临时文件再替换，读取方不会看到写了一半的文件
+                tmp_file = f"{cache_file}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, cache_file)
             logger.info(
-                f"Successfully cached sentiment score {sentiment_score} for date {date}")
+                f"Successfully cached sentiment score {sentiment_score} for {cache_key}")
         except Exception as e:
             logger.error(f"Error writing cache: {e}")
 
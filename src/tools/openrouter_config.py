@@ -1,59 +1,44 @@
 import os
+import threading
 import time
 import logging
-import google.generativeai as genai
 from dotenv import load_dotenv
 from dataclasses import dataclass
 import backoff
 from typing import Optional, Dict, Any
+from tools.event_log import attach_queue_handlers
+from tools.instrumentation import traced, tracer
+from tools.transport import ReplayMiss, transport
+
+# 导入本模块没有副作用：日志文件、.env 和 Gemini 客户端（google.generativeai
+# 导入约 0.8 秒）都在第一次调用 LLM 时才初始化
 
 # 设置日志记录
+# 默认 INFO；设置 API_LOG_LEVEL=DEBUG 可记录完整的请求/响应内容
 logger = logging.getLogger('api_calls')
-logger.setLevel(logging.DEBUG)
-
-# 移除所有现有的处理器
-for handler in logger.handlers[:]:
-    logger.removeHandler(handler)
+logger.setLevel(getattr(logging, os.getenv(
+    "API_LOG_LEVEL", "INFO").upper(), logging.INFO))
 
-# 创建日志目录
+# 日志目录
 log_dir = os.path.join(os.path.dirname(os.path.dirname(
     os.path.dirname(os.path.abspath(__file__)))), 'logs')
-os.makedirs(log_dir, exist_ok=True)
-
-# 设置文件处理器
-log_file = os.path.join(log_dir, f'api_calls_{time.strftime("%Y%m%d")}.log')
-print(f"Creating log file at: {log_file}")
-
-try:
-    file_handler = logging.FileHandler(log_file, encoding='utf-8', mode='a')
-    file_handler.setLevel(logging.DEBUG)
-    print("Successfully created file handler")
-except Exception as e:
-    print(f"Error creating file handler: {str(e)}")
-
-# 设置控制台处理器
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-
-# 设置日志格式
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
 
-# 添加处理器
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# 立即测试日志记录
-logger.debug("Logger initialization completed")
-logger.info("API logging system started")
+# 获取项目根目录
+project_root = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+env_path = os.path.join(project_root, '.env')
 
 # 状态图标
 SUCCESS_ICON = "✓"
 ERROR_ICON = "✗"
 WAIT_ICON = "⟳"
 
+# Gemini 客户端，首次调用时由 gemini_model() 创建；回放时由 fixture 替换
+GEMINI_MODEL = "gemini-1.5-pro"
+model = None
+_init_lock = threading.Lock()
+_logging_ready = False
+
 
 @dataclass
 class ChatMessage:
@@ -70,33 +55,76 @@ class ChatCompletion:
     choices: list[ChatChoice]
 
 
-# 获取项目根目录
-project_root = os.path.dirname(os.path.dirname(
-    os.path.dirname(os.path.abspath(__file__))))
-env_path = os.path.join(project_root, '.env')
-
-# 加载环境变量
-if os.path.exists(env_path):
-    load_dotenv(env_path, override=True)
-    logger.info(f"{SUCCESS_ICON} 已加载环境变量: {env_path}")
-else:
-    logger.warning(f"{ERROR_ICON} 未找到环境变量文件: {env_path}")
-
-# 验证环境变量
-api_key = os.getenv("GEMINI_API_KEY")
-model = os.getenv("GEMINI_MODEL")
-
-if not api_key:
-    logger.error(f"{ERROR_ICON} 未找到 GEMINI_API_KEY 环境变量")
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-if not model:
-    model = "gemini-1.5-flash"
-    logger.info(f"{WAIT_ICON} 使用默认模型: {model}")
-
-# 初始化 Gemini 客户端
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-pro')
-logger.info(f"{SUCCESS_ICON} Gemini model initialized successfully")
+def setup_api_logging():
+    """Attach the api_calls file and console handlers (once, on the first LLM call)"""
+    global _logging_ready
+    with _init_lock:
+        if _logging_ready:
+            return
+        _logging_ready = True
+
+        # 设置日志格式
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = []
+
+        # 设置文件处理器
+        log_file = os.path.join(log_dir, f'api_calls_{time.strftime("%Y%m%d")}.log')
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.FileHandler(log_file, encoding='utf-8', mode='a')
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except Exception as e:
+            print(f"Error creating file handler: {str(e)}")
+
+        # 设置控制台处理器，控制台只显示警告和错误
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.WARNING)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+        # 处理器在后台线程中运行，API 调用路径上只做入队
+        attach_queue_handlers(logger, handlers)
+        logger.info(f"API logging system started: {log_file}")
+
+
+def gemini_model():
+    """
+    The Gemini client, created on first use
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set
+    """
+    global model
+    setup_api_logging()
+    with _init_lock:
+        if model is not None:
+            return model
+
+        # 加载环境变量
+        if os.path.exists(env_path):
+            load_dotenv(env_path, override=True)
+            logger.info(f"{SUCCESS_ICON} 已加载环境变量: {env_path}")
+        else:
+            logger.warning(f"{ERROR_ICON} 未找到环境变量文件: {env_path}")
+
+        # 验证环境变量
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.error(f"{ERROR_ICON} 未找到 GEMINI_API_KEY 环境变量")
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        # 初始化 Gemini 客户端
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        logger.info(f"{SUCCESS_ICON} Gemini model initialized successfully")
+        return model
+
+
+def _record_backoff(details):
+    tracer.count("gemini", "generate_content", retries=1, sleep_seconds=details["wait"])
 
 
 @backoff.on_exception(
@@ -104,34 +132,43 @@ logger.info(f"{SUCCESS_ICON} Gemini model initialized successfully")
     (Exception),
     max_tries=5,
     max_time=300,
-    giveup=lambda e: "AFC is enabled" not in str(e)
+    giveup=lambda e: "AFC is enabled" not in str(e),
+    on_backoff=_record_backoff
 )
+@traced("gemini", "generate_content", size=lambda response: len(response.text.encode("utf-8")) if response else 0)
 def generate_content_with_retry(model_name, contents, config=None):
     """带重试机制的内容生成函数"""
     try:
         logger.info(f"{WAIT_ICON} Calling Gemini API...")
-        logger.info(f"Request content: {contents[:500]}..." if len(
-            str(contents)) > 500 else f"Request content: {contents}")
-        
-        response = model.generate_content(contents)
-        
+        logger.debug("Request content: %s", contents)
+
+        # 客户端未建好时只传工厂：回放命中存档就不需要创建客户端和 API key
+        if model is not None:
+            response = transport.generate_content(model, contents)
+        else:
+            response = transport.generate_content(gemini_model, contents, model_name=f"models/{GEMINI_MODEL}")
+
         logger.info(f"{SUCCESS_ICON} API call successful")
-        logger.info(f"Response: {response.text[:500]}..." if len(
-            str(response.text)) > 500 else f"Response: {response.text}")
+        logger.debug("Response: %s", response.text)
         return response
     except Exception as e:
         logger.error(f"{ERROR_ICON} API call failed: {str(e)}")
         raise e
 
 
+@traced("gemini", size=lambda content: len(content.encode("utf-8")) if content else 0)
 def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay=1):
     """获取聊天完成结果，包含重试逻辑"""
+    setup_api_logging()
+    # 缺少 GEMINI_API_KEY 时直接报错，而不是重试后返回 None；回放不需要客户端
+    if transport.mode != "replay":
+        gemini_model()
     try:
         if model is None:
             model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
         logger.info(f"{WAIT_ICON} 使用模型: {model}")
-        logger.debug(f"消息内容: {messages}")
+        logger.debug("消息内容: %s", messages)
 
         for attempt in range(max_retries):
             try:
@@ -167,6 +204,8 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
                     if attempt < max_retries - 1:
                         retry_delay = initial_retry_delay * (2 ** attempt)
                         logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
+                        tracer.count("gemini", "get_chat_completion",
+                                     retries=1, sleep_seconds=retry_delay)
                         time.sleep(retry_delay)
                         continue
                     return None
@@ -176,16 +215,22 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
                 chat_choice = ChatChoice(message=chat_message)
                 completion = ChatCompletion(choices=[chat_choice])
 
-                logger.debug(f"API 原始响应: {response.text}")
+                logger.debug("API 原始响应: %s", response.text)
                 logger.info(f"{SUCCESS_ICON} 成功获取响应")
                 return completion.choices[0].message.content
 
+            except ReplayMiss as e:
+                # 回放时重试也拿不到结果
+                logger.error(f"{ERROR_ICON} {str(e)}")
+                return None
             except Exception as e:
                 logger.error(
                     f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
                 if attempt < max_retries - 1:
                     retry_delay = initial_retry_delay * (2 ** attempt)
                     logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
+                    tracer.count("gemini", "get_chat_completion",
+                                 retries=1, sleep_seconds=retry_delay)
                     time.sleep(retry_delay)
                 else:
                     logger.error(f"{ERROR_ICON} 最终错误: {str(e)}")
@@ -0,0 +1,196 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+# 仓位计算：由分析师信号得到每只股票的得分（方向 x 置信度，-1 到 1），结合收益协方差
+# 一次性求出整个组合的目标权重，再换算成目标股数。所有核函数都对股票维度向量化，
+# 协方差只做一次线性求解，500 只股票的调仓在毫秒级完成。
+
+SIZING_METHODS = ("llm", "volatility", "kelly", "mean_variance")
+
+SIGNAL_DIRECTIONS = {"bullish": 1.0, "buy": 1.0, "bearish": -1.0, "sell": -1.0}
+
+# 主动集迭代的上限，正常情况下几次即收敛
+MAX_ACTIVE_SET_ITERATIONS = 50
+
+Scores = Union[Sequence[float], np.ndarray]
+
+
+##### Signals #####
+def _confidence(value) -> float:
+    """Confidence as a 0-1 float ("65%", 65 and 0.65 are the same)"""
+    if isinstance(value, str):
+        value = value.strip().rstrip("%") or 0
+    value = float(value or 0)
+    return min(max(value / 100 if value > 1 else value, 0.0), 1.0)
+
+
+def signal_score(signal: str, confidence) -> float:
+    """Direction times confidence: +1 fully bullish, -1 fully bearish, 0 neutral"""
+    return SIGNAL_DIRECTIONS.get(str(signal).lower(), 0.0) * _confidence(confidence)
+
+
+def consensus_score(analyst_signals: Dict[str, Dict], exclude: Sequence[str] = ("risk_management",)) -> float:
+    """Average score of the analyst signals (the risk agent only sets limits)"""
+    scores = [signal_score(s.get("signal"), s.get("confidence", 0))
+              for agent, s in analyst_signals.items() if agent not in exclude]
+    return float(np.mean(scores)) if scores else 0.0
+
+
+##### Kernels #####
+def _regularize(covariance: np.ndarray) -> np.ndarray:
+    """Add a tiny ridge so that names without history do not make the matrix singular"""
+    covariance = np.array(covariance, dtype=float)
+    n = len(covariance)
+    floor = 1e-8 * max(np.trace(covariance) / n, 1e-12) if n else 0.0
+    covariance[np.diag_indices(n)] += floor
+    return covariance
+
+
+def apply_constraints(weights: np.ndarray, max_weight: float = 1.0, max_gross: float = 1.0,
+                      long_only: bool = True) -> np.ndarray:
+    """Clip each weight to [0 or -max_weight, max_weight], then scale to the gross limit"""
+    weights = np.clip(weights, 0.0 if long_only else -max_weight, max_weight)
+    gross = float(np.abs(weights).sum())
+    return weights * (max_gross / gross) if gross > max_gross else weights
+
+
+def volatility_target_weights(scores: Scores, covariance: np.ndarray,
+                              target_volatility: float = 0.15) -> np.ndarray:
+    """
+    Inverse-volatility weights scaled so the portfolio hits target_volatility.
+
+    Each name gets score / volatility; the book is then scaled using the full
+    covariance (correlations included) to the target. Volatility and the
+    target must be in the same units (e.g. both annualized).
+    """
+    scores = np.asarray(scores, dtype=float)
+    volatilities = np.sqrt(np.maximum(np.diag(covariance), 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raw = np.where(volatilities > 0, scores / volatilities, 0.0)
+    volatility = float(np.sqrt(max(raw @ covariance @ raw, 0.0)))
+    return raw * (target_volatility / volatility) if volatility > 0 else raw
+
+
+def kelly_weights(expected_returns: Scores, covariance: np.ndarray, fraction: float = 0.5) -> np.ndarray:
+    """Fractional multi-asset Kelly: fraction * inverse(covariance) @ expected_returns"""
+    return fraction * np.linalg.solve(_regularize(covariance), np.asarray(expected_returns, dtype=float))
+
+
+def mean_variance_weights(expected_returns: Scores, covariance: np.ndarray, risk_aversion: float = 5.0,
+                          lower: float = 0.0, upper: float = 1.0) -> np.ndarray:
+    """
+    Maximize mu'w - risk_aversion / 2 * w'Σw subject to lower <= w <= upper.
+
+    Primal-dual active set: names whose weight plus scaled dual pushes past a
+    bound are pinned to it, the remaining names are solved jointly (one
+    linear solve per iteration), and the sets are updated until they stop
+    changing, which takes a handful of iterations.
+    """
+    mu = np.asarray(expected_returns, dtype=float)
+    hessian = risk_aversion * _regularize(covariance)
+    scale = 1.0 / np.diag(hessian)
+    weights = np.clip(np.zeros(len(mu)), lower, upper)
+    dual = mu - hessian @ weights
+    at_upper = at_lower = None
+    for _ in range(MAX_ACTIVE_SET_ITERATIONS):
+        trial = weights + scale * dual
+        upper_set, lower_set = trial > upper, trial < lower
+        if at_upper is not None and np.array_equal(upper_set, at_upper) and \
+                np.array_equal(lower_set, at_lower):
+            break
+        at_upper, at_lower = upper_set, lower_set
+        free = ~(at_upper | at_lower)
+        weights = np.where(at_upper, upper, np.where(at_lower, lower, 0.0))
+        if free.any():
+            bound = ~free
+            rhs = mu[free] - hessian[np.ix_(free, bound)] @ weights[bound]
+            weights[free] = np.linalg.solve(hessian[np.ix_(free, free)], rhs)
+        dual = mu - hessian @ weights
+        dual[free] = 0.0
+    return np.clip(weights, lower, upper)
+
+
+def target_quantities(weights: np.ndarray, equity: float, prices: np.ndarray) -> np.ndarray:
+    """Whole shares worth weights * equity (rounded towards zero)"""
+    prices = np.asarray(prices, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quantities = np.where(prices > 0, np.asarray(weights) * equity / prices, 0.0)
+    return np.trunc(quantities)
+
+
+##### Sizer #####
+@dataclass
+class PositionSizer:
+    """
+    Turns signal scores and a return covariance into target positions.
+
+    Attributes:
+        method: volatility, kelly or mean_variance
+        target_volatility: Annualized portfolio volatility for volatility targeting
+        kelly_fraction: Share of the full Kelly bet
+        risk_aversion: Mean-variance risk aversion
+        expected_return: Annualized excess return of a score of 1
+        max_weight: Largest weight of a single name
+        max_gross: Largest sum of absolute weights (1 = fully invested, no leverage)
+        long_only: Whether short weights are allowed
+        periods_per_year: Periods per year of the covariance (252 for daily returns)
+    """
+    method: str = "volatility"
+    target_volatility: float = 0.15
+    kelly_fraction: float = 0.5
+    risk_aversion: float = 5.0
+    expected_return: float = 0.10
+    max_weight: float = 0.25
+    max_gross: float = 1.0
+    long_only: bool = True
+    periods_per_year: int = 252
+
+    def __post_init__(self):
+        if self.method not in SIZING_METHODS[1:]:
+            raise ValueError(f"Unknown sizing method: {self.method}")
+
+    def weights(self, scores: Scores, covariance: np.ndarray) -> np.ndarray:
+        """Target weights (fractions of equity) for every name"""
+        scores = np.clip(np.asarray(scores, dtype=float), -1.0, 1.0)
+        covariance = np.asarray(covariance, dtype=float) * self.periods_per_year
+        if self.method == "volatility":
+            weights = volatility_target_weights(scores, covariance, self.target_volatility)
+        elif self.method == "kelly":
+            weights = kelly_weights(scores * self.expected_return, covariance, self.kelly_fraction)
+        else:
+            weights = mean_variance_weights(
+                scores * self.expected_return, covariance, self.risk_aversion,
+                lower=0.0 if self.long_only else -self.max_weight, upper=self.max_weight)
+        return apply_constraints(weights, self.max_weight, self.max_gross, self.long_only)
+
+    def target_quantities(self, scores: Scores, covariance: np.ndarray,
+                          equity: float, prices: np.ndarray) -> np.ndarray:
+        return target_quantities(self.weights(scores, covariance), equity, prices)
+
+
+def add_sizing_arguments(parser):
+    """Register the position sizing options on an argparse parser"""
+    parser.add_argument('--sizing', type=str, choices=SIZING_METHODS, default='llm',
+                        help='Position sizing: llm (portfolio manager quantities), volatility, kelly or mean_variance (default: llm)')
+    parser.add_argument('--target-volatility', type=float, default=0.15,
+                        help='Annualized portfolio volatility for --sizing volatility (default: 0.15)')
+    parser.add_argument('--kelly-fraction', type=float, default=0.5,
+                        help='Fraction of the full Kelly bet for --sizing kelly (default: 0.5)')
+    parser.add_argument('--risk-aversion', type=float, default=5.0,
+                        help='Risk aversion for --sizing mean_variance (default: 5)')
+    parser.add_argument('--max-weight', type=float, default=0.25,
+                        help='Largest weight of a single name (default: 0.25)')
+
+
+def sizer_from_args(args) -> Optional[PositionSizer]:
+    if args.sizing == "llm":
+        return None
+    return PositionSizer(
+        method=args.sizing,
+        target_volatility=args.target_volatility,
+        kelly_fraction=args.kelly_fraction,
+        risk_aversion=args.risk_aversion,
+        max_weight=args.max_weight,
+    )
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+@dataclass
+class PriceArrays:
+    """
+    Columnar OHLCV history as carried in state["data"]["prices"].
+
+    One contiguous NumPy array per field plus a datetime64 index, sorted by
+    date. Replaces the list of per-bar dicts: no per-row Python objects are
+    created and turning it into a DataFrame does not re-parse anything.
+    """
+    __slots__ = ("dates", "open", "high", "low", "close", "volume")
+
+    dates: np.ndarray    # datetime64[ns]
+    open: np.ndarray     # float64
+    high: np.ndarray     # float64
+    low: np.ndarray      # float64
+    close: np.ndarray    # float64
+    volume: np.ndarray   # int64
+
+    @classmethod
+    def empty(cls) -> "PriceArrays":
+        return cls(np.array([], dtype="datetime64[ns]"),
+                   *(np.array([], dtype=float) for _ in range(4)),
+                   np.array([], dtype=np.int64))
+
+    @classmethod
+    def from_yfinance(cls, df: pd.DataFrame) -> "PriceArrays":
+        """From a yfinance history() frame (capitalized columns, tz-aware index)"""
+        index = df.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_localize(None)
+        order = np.argsort(index.values, kind="stable")
+        return cls(
+            index.values.astype("datetime64[ns]")[order],
+            df["Open"].to_numpy(dtype=np.float64)[order],
+            df["High"].to_numpy(dtype=np.float64)[order],
+            df["Low"].to_numpy(dtype=np.float64)[order],
+            df["Close"].to_numpy(dtype=np.float64)[order],
+            df["Volume"].fillna(0).to_numpy(dtype=np.int64)[order],
+        )
+
+    @classmethod
+    def from_panel(cls, panel: Dict[str, pd.DataFrame], ticker: str) -> "PriceArrays":
+        """One ticker's column of a get_price_panel() result; bars without a close are dropped"""
+        if ticker not in panel["close"].columns:
+            return cls.empty()
+        frame = pd.DataFrame({col: panel[col][ticker] for col in PRICE_COLUMNS})
+        frame = frame[frame["close"].notna()]
+        return cls(
+            frame.index.values.astype("datetime64[ns]"),
+            *(frame[col].to_numpy(dtype=np.float64) for col in PRICE_COLUMNS[:4]),
+            frame["volume"].fillna(0).to_numpy(dtype=np.int64),
+        )
+
+    @classmethod
+    def from_records(cls, prices: List[Dict[str, Any]]) -> "PriceArrays":
+        """From the legacy list of {"time", "open", ...} dicts"""
+        if not prices:
+            return cls.empty()
+        dates = np.array([p["time"] for p in prices], dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        columns = [np.array([p[col] for p in prices], dtype=np.float64)[order]
+                   for col in PRICE_COLUMNS[:4]]
+        volume = np.array([p["volume"] for p in prices],
+                          dtype=np.int64)[order]
+        return cls(dates[order], *columns, volume)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def tail(self, n: int) -> "PriceArrays":
+        """Last n bars (views, no copy)"""
+        start = max(len(self) - n, 0)
+        return PriceArrays(*(getattr(self, name)[start:] for name in self.__slots__))
+
+    def to_df(self) -> pd.DataFrame:
+        """DataFrame indexed by Date with the OHLCV columns"""
+        return pd.DataFrame(
+            {col: getattr(self, col) for col in PRICE_COLUMNS},
+            index=pd.DatetimeIndex(self.dates, name="Date"),
+            copy=False,
+        )
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """The legacy list-of-dicts form (for JSON output)"""
+        # 日线只保留日期，分钟/小时线保留到分钟
+        intraday = bool(np.any(self.dates != self.dates.astype("datetime64[D]")))
+        times = np.datetime_as_string(self.dates, unit="m" if intraday else "D")
+        return [
+            {"time": str(t), "open": float(o), "high": float(h), "low": float(l),
+             "close": float(c), "volume": int(v)}
+            for t, o, h, l, c, v in zip(times, self.open, self.high,
+                                        self.low, self.close, self.volume)
+        ]
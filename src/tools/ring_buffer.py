@@ -0,0 +1,169 @@
+from typing import Optional
+
+import numpy as np
+
+from tools.price_arrays import PRICE_COLUMNS, PriceArrays
+
+# 回看窗口：每个 (股票, 字段) 一个定长环形缓冲区。
+# 底层数组长度为 2 * capacity，每个值同时写入 i 和 i + capacity 两个位置，
+# 这样最近 N 个值在数组中总是连续的，可以不复制直接交给 NumPy 计算。
+
+FIELD_DTYPES = {
+    "dates": "datetime64[ns]",
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.int64,
+}
+
+
+class RingBuffer:
+    """
+    Fixed-capacity FIFO of scalars backed by a single NumPy array.
+
+    append() and replace_last() are O(1) and never reallocate; once full the
+    oldest value is evicted. view() returns the values oldest-first as a
+    contiguous read-only slice of the backing array (no copy). A view is only
+    valid until the next write; copy it to keep it.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._end = 0   # 下一个写入位置，取值 [0, capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def append(self, value):
+        self._data[self._end] = value
+        self._data[self._end + self.capacity] = value
+        self._end = (self._end + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, values: np.ndarray):
+        """Append many values at once (only the last capacity are kept)"""
+        values = np.asarray(values, dtype=self._data.dtype)[-self.capacity:]
+        n = len(values)
+        if n == 0:
+            return
+        slots = (self._end + np.arange(n)) % self.capacity
+        self._data[slots] = values
+        self._data[slots + self.capacity] = values
+        self._end = (self._end + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def replace_last(self, value):
+        if not self._size:
+            raise IndexError("replace_last on an empty buffer")
+        slot = (self._end - 1) % self.capacity
+        self._data[slot] = value
+        self._data[slot + self.capacity] = value
+
+    @property
+    def last(self):
+        if not self._size:
+            return None
+        return self._data[(self._end - 1) % self.capacity]
+
+    def view(self) -> np.ndarray:
+        stop = self._end + self.capacity
+        window = self._data[stop - self._size:stop]
+        window.flags.writeable = False
+        return window
+
+    def clear(self):
+        self._end = 0
+        self._size = 0
+
+
+class PriceWindow:
+    """
+    The most recent capacity OHLCV bars of one ticker, one RingBuffer per field.
+
+    Used to roll a lookback window forward bar by bar (backtester, streaming)
+    without refetching or reallocating the history.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._fields = {name: RingBuffer(capacity, dtype)
+                        for name, dtype in FIELD_DTYPES.items()}
+        self._cursor = 0
+
+    @classmethod
+    def from_prices(cls, prices: PriceArrays, capacity: int) -> "PriceWindow":
+        window = cls(capacity)
+        window.extend(prices)
+        return window
+
+    def __len__(self):
+        return len(self._fields["dates"])
+
+    @property
+    def last_time(self) -> Optional[np.datetime64]:
+        return self._fields["dates"].last
+
+    def append(self, time, open, high, low, close, volume) -> bool:
+        """
+        Add a bar. A bar with the same timestamp as the last one replaces it
+        (live feeds revise the forming bar); older bars are ignored.
+
+        Returns:
+            bool: Whether the window changed
+        """
+        bar_time = np.datetime64(time, "ns")
+        last_time = self.last_time
+        if last_time is not None and bar_time < last_time:
+            return False
+        values = (bar_time, open, high, low, close, volume)
+        if last_time is not None and bar_time == last_time:
+            for buffer, value in zip(self._fields.values(), values):
+                buffer.replace_last(value)
+        else:
+            for buffer, value in zip(self._fields.values(), values):
+                buffer.append(value)
+        return True
+
+    def append_bar(self, bar: dict) -> bool:
+        """append() from a {"time", "open", ...} record"""
+        return self.append(bar["time"], *(float(bar[field]) for field in PRICE_COLUMNS))
+
+    def extend(self, prices: PriceArrays):
+        """Append a block of bars newer than the last one"""
+        last_time = self.last_time
+        if last_time is not None:
+            prices = prices.tail(len(prices) - int(
+                np.searchsorted(prices.dates, last_time, side="right")))
+        for name, buffer in self._fields.items():
+            buffer.extend(getattr(prices, name))
+
+    def roll(self, history: PriceArrays, until) -> PriceArrays:
+        """
+        Advance through a preloaded history up to (excluding) until.
+
+        Successive calls must use the same history and non-decreasing dates;
+        each call only appends the bars added since the previous one.
+
+        Returns:
+            PriceArrays: View of the window after rolling forward
+        """
+        stop = int(np.searchsorted(
+            history.dates, np.datetime64(until, "ns"), side="left"))
+        if stop > self._cursor:
+            self.extend(PriceArrays(*(getattr(history, name)[self._cursor:stop]
+                                      for name in PriceArrays.__slots__)))
+            self._cursor = stop
+        return self.view()
+
+    def view(self) -> PriceArrays:
+        """Zero-copy PriceArrays over the window (valid until the next append)"""
+        return PriceArrays(*(self._fields[name].view() for name in PriceArrays.__slots__))
@@ -0,0 +1,210 @@
+from statistics import NormalDist
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tools.ring_buffer import RingBuffer
+
+# 风险核函数：输入为收益率或价格序列（Series 或 ndarray），返回逐期的完整时间序列，
+# 最后一个值即当前风险；回测可直接用来画风险随时间的变化。
+# 历史法 VaR/CVaR 与回撤基于滑动窗口视图（不复制数据）一次计算所有窗口。
+
+Series = Union[pd.Series, np.ndarray]
+
+
+def _values(series: Series) -> np.ndarray:
+    return np.asarray(series, dtype=float)
+
+
+def _like(series: Series, values: np.ndarray) -> Series:
+    """Wrap values with the index of series when it is a pandas Series"""
+    if isinstance(series, pd.Series):
+        return pd.Series(values, index=series.index, name=series.name)
+    return values
+
+
+def _pad(values: np.ndarray, length: int) -> np.ndarray:
+    """Left-pad per-window results with NaN up to the series length"""
+    return np.concatenate([np.full(length - len(values), np.nan), values])
+
+
+def _windows(values: np.ndarray, window: int) -> np.ndarray:
+    if len(values) < window:
+        return np.empty((0, window))
+    return sliding_window_view(values, window)
+
+
+def _tail_mean(windows: np.ndarray, var: np.ndarray) -> np.ndarray:
+    """Mean of the values at or below each window's VaR"""
+    tail = windows <= var[:, None]
+    return (windows * tail).sum(axis=1) / tail.sum(axis=1)
+
+
+##### Value at Risk #####
+def historical_var(returns: Series, confidence: float = 0.95) -> float:
+    """Historical VaR of the whole sample (the (1 - confidence) quantile, negative for losses)"""
+    values = _values(returns)
+    values = values[~np.isnan(values)]
+    return float(np.quantile(values, 1 - confidence)) if len(values) else float("nan")
+
+
+def historical_cvar(returns: Series, confidence: float = 0.95) -> float:
+    """Historical CVaR (expected shortfall) of the whole sample"""
+    values = _values(returns)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return float("nan")
+    return float(values[values <= np.quantile(values, 1 - confidence)].mean())
+
+
+def rolling_historical_var(returns: Series, window: int = 252, confidence: float = 0.95) -> Series:
+    values = _values(returns)
+    var = np.quantile(_windows(values, window), 1 - confidence, axis=1)
+    return _like(returns, _pad(var, len(values)))
+
+
+def rolling_historical_cvar(returns: Series, window: int = 252, confidence: float = 0.95) -> Series:
+    values = _values(returns)
+    windows = _windows(values, window)
+    cvar = _tail_mean(windows, np.quantile(windows, 1 - confidence, axis=1))
+    return _like(returns, _pad(cvar, len(values)))
+
+
+def rolling_parametric_var(returns: Series, window: int = 252, confidence: float = 0.95) -> Series:
+    """Gaussian VaR: mean + z * std over the window"""
+    rolling = pd.Series(_values(returns)).rolling(window)
+    z = NormalDist().inv_cdf(1 - confidence)
+    return _like(returns, (rolling.mean() + z * rolling.std()).to_numpy())
+
+
+def rolling_parametric_cvar(returns: Series, window: int = 252, confidence: float = 0.95) -> Series:
+    """Gaussian CVaR: mean - std * pdf(z) / (1 - confidence) over the window"""
+    rolling = pd.Series(_values(returns)).rolling(window)
+    z = NormalDist().inv_cdf(1 - confidence)
+    shortfall = NormalDist().pdf(z) / (1 - confidence)
+    return _like(returns, (rolling.mean() - shortfall * rolling.std()).to_numpy())
+
+
+##### Drawdown #####
+def drawdown(prices: Series, window: int = None) -> Series:
+    """Drop from the running peak (all-time, or the trailing window's once it is full)"""
+    values = pd.Series(_values(prices))
+    peak = values.cummax() if window is None else values.rolling(window).max()
+    return _like(prices, (values / peak - 1).to_numpy())
+
+
+def rolling_max_drawdown(prices: Series, window: int = 252) -> Series:
+    """Largest peak-to-trough drop within each trailing window"""
+    values = _values(prices)
+    windows = _windows(values, window)
+    worst = (windows / np.maximum.accumulate(windows, axis=1) - 1).min(axis=1)
+    return _like(prices, _pad(worst, len(values)))
+
+
+##### Volatility #####
+def rolling_volatility(returns: Series, window: int = 21, periods_per_year: int = 252) -> Series:
+    """Annualized rolling standard deviation"""
+    volatility = pd.Series(_values(returns)).rolling(window).std() * np.sqrt(periods_per_year)
+    return _like(returns, volatility.to_numpy())
+
+
+def volatility_percentile(volatility: Series, lookback: int = None) -> Series:
+    """Percentile rank (0-1) of each volatility among the preceding ones (or the trailing lookback)"""
+    values = pd.Series(_values(volatility))
+    rolling = values.expanding() if lookback is None else values.rolling(lookback, min_periods=1)
+    return _like(volatility, rolling.rank(pct=True).to_numpy())
+
+
+def volatility_zscore(current: float, volatility: Series) -> float:
+    """How many standard deviations current is above the mean of a volatility history"""
+    values = pd.Series(_values(volatility))
+    return float((current - values.mean()) / values.std())
+
+
+##### Incremental #####
+class IncrementalRisk:
+    """
+    Risk of one price series updated one bar at a time (streaming).
+
+    Keeps the last window returns and window + 1 prices in ring buffers.
+    Volatility and parametric VaR/CVaR use running sums (O(1) per bar);
+    historical VaR/CVaR and the drawdowns are computed on the zero-copy
+    window views (O(window), vectorized). update(..., replace=True) revises
+    the last bar instead of adding one.
+    """
+
+    def __init__(self, window: int = 252, confidence: float = 0.95, periods_per_year: int = 252):
+        self.window = window
+        self.confidence = confidence
+        self.periods_per_year = periods_per_year
+        self._returns = RingBuffer(window)
+        self._prices = RingBuffer(window + 1)
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._updates = 0
+        z = NormalDist().inv_cdf(1 - confidence)
+        self._z = z
+        self._shortfall = NormalDist().pdf(z) / (1 - confidence)
+
+    @classmethod
+    def from_prices(cls, prices: Series, **kwargs) -> "IncrementalRisk":
+        risk = cls(**kwargs)
+        for price in _values(prices)[-(risk.window + 1):]:
+            risk.update(price)
+        return risk
+
+    def _add_return(self, value: float):
+        if len(self._returns) == self.window:
+            evicted = self._returns.view()[0]
+            self._sum -= evicted
+            self._sum_sq -= evicted * evicted
+        self._returns.append(value)
+        self._sum += value
+        self._sum_sq += value * value
+
+    def _resync(self):
+        # 定期按窗口重新求和，避免累计浮点误差
+        returns = self._returns.view()
+        self._sum = float(returns.sum())
+        self._sum_sq = float((returns * returns).sum())
+
+    def update(self, price: float, replace: bool = False):
+        price = float(price)
+        if replace and len(self._prices):
+            self._prices.replace_last(price)
+            if len(self._prices) > 1:
+                prices = self._prices.view()
+                old = self._returns.last
+                new = prices[-1] / prices[-2] - 1
+                self._returns.replace_last(new)
+                self._sum += new - old
+                self._sum_sq += new * new - old * old
+            return
+        previous = self._prices.last
+        self._prices.append(price)
+        if previous is not None:
+            self._add_return(price / previous - 1)
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._resync()
+
+    def metrics(self) -> Dict[str, Optional[float]]:
+        n = len(self._returns)
+        if n < 2:
+            return {}
+        mean = float(self._sum) / n
+        std = max(float(self._sum_sq) / n - mean * mean, 0.0) ** 0.5 * (n / (n - 1)) ** 0.5
+        returns = self._returns.view()
+        var = float(np.quantile(returns, 1 - self.confidence))
+        prices = self._prices.view()
+        return {
+            "volatility": std * self.periods_per_year ** 0.5,
+            "historical_var": var,
+            "historical_cvar": float(returns[returns <= var].mean()),
+            "parametric_var": mean + self._z * std,
+            "parametric_cvar": mean - self._shortfall * std,
+            "drawdown": float(prices[-1] / prices.max() - 1),
+            "max_drawdown": float((prices / np.maximum.accumulate(prices) - 1).min()),
+        }
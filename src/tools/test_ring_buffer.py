@@ -0,0 +1,71 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from tools.price_arrays import PriceArrays
+from tools.ring_buffer import PriceWindow, RingBuffer
+
+
+def _history(count: int, start: str = "2024-01-02") -> PriceArrays:
+    dates = np.datetime64(start, "ns") + np.arange(count) * np.timedelta64(1, "D")
+    close = 100 + np.arange(count, dtype=float)
+    return PriceArrays(dates, close - 1, close + 1, close - 2, close,
+                       np.arange(count, dtype=np.int64) * 10)
+
+
+def test_append_keeps_the_last_capacity_values_in_order():
+    buffer, expected = RingBuffer(5), deque(maxlen=5)
+    for value in range(13):
+        buffer.append(value)
+        expected.append(value)
+        assert buffer.view().tolist() == list(expected)
+    assert len(buffer) == 5 and buffer.last == 12
+
+
+def test_extend_matches_repeated_append():
+    buffer, expected = RingBuffer(7), deque(maxlen=7)
+    for block in (np.arange(3), np.arange(10, 12), np.arange(100, 120), np.array([])):
+        buffer.extend(block)
+        expected.extend(block)
+        assert buffer.view().tolist() == list(expected)
+
+
+def test_view_is_a_read_only_window_of_the_backing_array():
+    buffer = RingBuffer(4)
+    buffer.extend(np.arange(6.0))
+    view = buffer.view()
+
+    assert view.base is not None and np.shares_memory(view, buffer._data)
+    with pytest.raises(ValueError):
+        view[0] = -1.0
+
+
+def test_replace_last_revises_only_the_newest_value():
+    buffer = RingBuffer(3)
+    with pytest.raises(IndexError):
+        buffer.replace_last(1.0)
+    buffer.extend(np.arange(5.0))
+    buffer.replace_last(-1.0)
+    assert buffer.view().tolist() == [2.0, 3.0, -1.0]
+
+
+def test_price_window_revises_the_forming_bar_and_ignores_older_bars():
+    window = PriceWindow.from_prices(_history(5), capacity=3)
+    last = str(window.last_time)
+
+    assert window.append(last, 1, 2, 0.5, 1.5, 7)
+    assert not window.append("2024-01-01", 1, 1, 1, 1, 1)
+    view = window.view()
+    assert len(view) == 3 and view.close[-1] == 1.5 and view.volume[-1] == 7
+    assert view.close[:2].tolist() == [102.0, 103.0]
+
+
+def test_roll_matches_slicing_the_history():
+    history = _history(400)
+    window = PriceWindow(252)
+    for until in ("2024-01-05", "2024-03-01", "2024-03-02", "2024-12-31", "2025-02-04"):
+        rolled = window.roll(history, until)
+        mask = history.dates < np.datetime64(until, "ns")
+        assert np.array_equal(rolled.dates, history.dates[mask][-252:])
+        assert np.array_equal(rolled.close, history.close[mask][-252:])
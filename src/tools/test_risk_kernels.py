@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.risk_kernels import (IncrementalRisk, historical_cvar, historical_var,
+                                rolling_historical_cvar, rolling_historical_var,
+                                rolling_max_drawdown, rolling_parametric_var,
+                                rolling_volatility)
+
+WINDOW = 50
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(11)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, 300))),
+                     index=pd.bdate_range("2023-01-02", periods=300))
+
+
+def test_rolling_historical_kernels_match_a_loop_over_windows(prices):
+    returns = prices.pct_change().dropna()
+    var = rolling_historical_var(returns, WINDOW)
+    cvar = rolling_historical_cvar(returns, WINDOW)
+
+    assert var.index.equals(returns.index) and var.iloc[:WINDOW - 1].isna().all()
+    for end in (WINDOW, 120, len(returns)):
+        window = returns.iloc[end - WINDOW:end]
+        assert var.iloc[end - 1] == pytest.approx(historical_var(window))
+        assert cvar.iloc[end - 1] == pytest.approx(historical_cvar(window))
+
+
+def test_rolling_max_drawdown_matches_a_loop_over_windows(prices):
+    worst = rolling_max_drawdown(prices, WINDOW)
+    for end in (WINDOW, 200, len(prices)):
+        window = prices.iloc[end - WINDOW:end]
+        assert worst.iloc[end - 1] == pytest.approx((window / window.cummax() - 1).min())
+
+
+def test_incremental_risk_matches_the_batch_kernels(prices):
+    # 超过窗口长度的更新次数，覆盖淘汰旧值和定期重新求和
+    risk = IncrementalRisk.from_prices(prices.iloc[:WINDOW + 1], window=WINDOW)
+    for price in prices.iloc[WINDOW + 1:]:
+        risk.update(price)
+    returns = prices.pct_change().dropna()
+    metrics = risk.metrics()
+
+    assert metrics["volatility"] == pytest.approx(rolling_volatility(returns, WINDOW).iloc[-1])
+    assert metrics["parametric_var"] == pytest.approx(rolling_parametric_var(returns, WINDOW).iloc[-1])
+    assert metrics["historical_var"] == pytest.approx(rolling_historical_var(returns, WINDOW).iloc[-1])
+    assert metrics["historical_cvar"] == pytest.approx(rolling_historical_cvar(returns, WINDOW).iloc[-1])
+    assert metrics["max_drawdown"] == pytest.approx(rolling_max_drawdown(prices, WINDOW + 1).iloc[-1])
+
+
+def test_replace_revises_the_last_bar(prices):
+    revised = IncrementalRisk.from_prices(prices.iloc[:100], window=WINDOW)
+    revised.update(prices.iloc[100] * 1.05)
+    revised.update(prices.iloc[100], replace=True)
+    fresh = IncrementalRisk.from_prices(prices.iloc[:101], window=WINDOW)
+
+    assert revised.metrics() == pytest.approx(fresh.metrics())
+
+
+def test_resync_removes_accumulated_drift():
+    # 大偏移下逐项加减会累积浮点误差，按窗口重新求和后与直接求和一致
+    rng = np.random.default_rng(3)
+    risk = IncrementalRisk(window=WINDOW)
+    for price in 1e6 + np.cumsum(rng.normal(0, 1e4, 5 * WINDOW + 1)):
+        risk.update(price)
+    returns = risk._returns.view()
+
+    assert risk._updates % WINDOW == 1
+    assert risk._sum == pytest.approx(returns.sum(), rel=1e-12, abs=1e-15)
+    assert risk._sum_sq == pytest.approx((returns * returns).sum(), rel=1e-12)
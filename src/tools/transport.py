@@ -0,0 +1,365 @@
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# 外部数据源的统一出口：yfinance、HTTP（Alpha Vantage、新闻网页）和 Gemini 的请求都经过
+# 这里。live 直接请求；record 请求后把响应追加写入归档（已归档的请求直接从归档读取）；
+# replay 只读归档、不访问网络，归档里没有的请求抛出 ReplayMiss。回放的结果与录制时一致，
+# 回测可以离线、以磁盘速度重跑。
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+DEFAULT_ARCHIVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "data", "transport", "archive.bin")
+
+# 归档格式：文件头 + 若干条记录，每条记录为 (键长度, 负载长度) + UTF-8 键 + zlib 压缩的 pickle
+ARCHIVE_MAGIC = b"HFTRANS1"
+RECORD_HEADER = struct.Struct("<II")
+COMPRESSION_LEVEL = 6
+
+# 不写入请求键（也就不会落盘）的查询参数
+SECRET_PARAMS = ("apikey", "api_key", "key", "token")
+
+# 这些状态码是暂时性的，不录制，下次重新请求
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+
+
+class ReplayMiss(LookupError):
+    """A replayed request that is not in the archive"""
+
+
+##### Request Keys #####
+def _canonical(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ",".join(map(_canonical, value))
+    return str(value)
+
+
+def request_key(service: str, name: str, *parts: Any, **params: Any) -> str:
+    """Stable key of a request, e.g. yfinance/history/AAPL?end=...&interval=1d&start=..."""
+    key = "/".join([service, name, *map(_canonical, parts)])
+    query = "&".join(f"{k}={_canonical(v)}" for k, v in sorted(params.items()) if v is not None)
+    return f"{key}?{query}" if query else key
+
+
+def url_key(url: str) -> str:
+    """Key of an HTTP GET: the URL with sorted query parameters and the API keys removed"""
+    parsed = urlparse(url)
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                   if k.lower() not in SECRET_PARAMS)
+    return "http/" + urlunparse(parsed._replace(query=urlencode(query)))
+
+
+def prompt_key(model: Any, contents: Any, **kwargs: Any) -> str:
+    """Key of an LLM call: model name (or the model's own) plus a digest of the prompt and generation options"""
+    name = model if isinstance(model, str) else getattr(model, "model_name", None) or type(model).__name__
+    payload = json.dumps([str(contents), kwargs], sort_keys=True, default=str)
+    return request_key("gemini", "generate_content", name,
+                       hashlib.sha256(payload.encode("utf-8")).hexdigest())
+
+
+##### Archive #####
+class Archive:
+    """
+    Append-only file of (key, payload) records.
+
+    The offsets of all records are indexed in memory when the file is
+    opened, so a lookup is one seek and read plus decompression. Writing a
+    key again appends a new record that supersedes the old one. A record cut
+    off by a crash is dropped (and truncated before the next append).
+    Payloads are pickled, so only open archives you recorded yourself.
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        if writable:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a+b")
+        else:
+            self._file = open(path, "rb")
+        self._load_index()
+
+    def _load_index(self):
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0 and self.writable:
+            f.write(ARCHIVE_MAGIC)
+            f.flush()
+            return
+        f.seek(0)
+        if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError(f"{self.path} is not a transport archive")
+        offset = len(ARCHIVE_MAGIC)
+        while offset + RECORD_HEADER.size <= size:
+            key_length, payload_length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            payload_offset = offset + RECORD_HEADER.size + key_length
+            if payload_offset + payload_length > size:
+                break
+            key = f.read(key_length).decode("utf-8")
+            self._index[key] = (payload_offset, payload_length)
+            offset = payload_offset + payload_length
+            f.seek(offset)
+        if offset < size and self.writable:
+            # 上次写入中断留下的半条记录
+            f.truncate(offset)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str) -> Tuple[bool, Any, int]:
+        """(found, value, stored bytes) of key"""
+        location = self._index.get(key)
+        if location is None:
+            return False, None, 0
+        offset, length = location
+        with self._lock:
+            self._file.seek(offset)
+            payload = self._file.read(length)
+        return True, pickle.loads(zlib.decompress(payload)), length
+
+    def put(self, key: str, value: Any) -> int:
+        """Append value under key; returns the stored bytes"""
+        payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+        encoded = key.encode("utf-8")
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell() + RECORD_HEADER.size + len(encoded)
+            self._file.write(RECORD_HEADER.pack(len(encoded), len(payload)) + encoded + payload)
+            self._file.flush()
+            self._index[key] = (offset, len(payload))
+        return len(payload)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+##### Responses #####
+class ArchivedResponse:
+    """The parts of a requests.Response and of a Gemini response the pipeline reads"""
+
+    def __init__(self, content: bytes = b"", status_code: int = 200, encoding: str = "utf-8"):
+        self.content = content
+        self.status_code = status_code
+        self.encoding = encoding
+
+    @classmethod
+    def from_text(cls, text: str, status_code: int = 200) -> "ArchivedResponse":
+        return cls(text.encode("utf-8"), status_code)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+def _http_record(response) -> Dict[str, Any]:
+    return {"content": response.content, "status_code": response.status_code,
+            "encoding": response.encoding or "utf-8"}
+
+
+class TransportTicker:
+    """yf.Ticker whose requests go through the transport"""
+
+    def __init__(self, transport: "Transport", symbol: str):
+        self._transport = transport
+        self.ticker = symbol
+        self._stock = None
+
+    def _live(self):
+        if self._stock is None:
+            self._stock = self._transport.yfinance_client().Ticker(self.ticker)
+        return self._stock
+
+    def history(self, start=None, end=None, interval: str = "1d", **kwargs):
+        key = request_key("yfinance", "history", self.ticker,
+                          start=start, end=end, interval=interval, **kwargs)
+        return self._transport.fetch(
+            key, lambda: self._live().history(start=start, end=end, interval=interval, **kwargs))
+
+    def _attribute(self, name: str):
+        return self._transport.fetch(request_key("yfinance", name, self.ticker),
+                                     lambda: getattr(self._live(), name))
+
+    info = property(lambda self: self._attribute("info"))
+    financials = property(lambda self: self._attribute("financials"))
+    cashflow = property(lambda self: self._attribute("cashflow"))
+    balance_sheet = property(lambda self: self._attribute("balance_sheet"))
+    insider_trades = property(lambda self: self._attribute("insider_trades"))
+
+
+##### Transport #####
+class Transport:
+    """
+    Record/replay layer in front of yfinance, HTTP and the Gemini model.
+
+    The live clients (yfinance and requests modules) are imported on first
+    use and can be swapped, e.g. for the benchmark fixture clients. The
+    Gemini model is passed in by the caller.
+    """
+
+    def __init__(self, mode: str = "live", archive_path: str = DEFAULT_ARCHIVE):
+        self.mode = "live"
+        self.archive_path = archive_path
+        self.yfinance = None
+        self.requests = None
+        self._archive: Optional[Archive] = None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(("hits", "misses", "recorded", "bytes_read", "bytes_written"), 0)
+        self.configure(mode, archive_path)
+
+    def configure(self, mode: str, archive_path: Optional[str] = None):
+        """Switch mode and/or archive; the archive is opened on first use"""
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown transport mode: {mode}, expected one of {TRANSPORT_MODES}")
+        self.close()
+        self.mode = mode
+        if archive_path:
+            self.archive_path = archive_path
+
+    @contextmanager
+    def session(self, mode: str, archive_path: Optional[str] = None):
+        """Use mode and archive_path inside the block, then restore the previous setup"""
+        previous = (self.mode, self.archive_path)
+        self.configure(mode, archive_path)
+        try:
+            yield self
+        finally:
+            self.configure(*previous)
+
+    def archive(self) -> Archive:
+        with self._lock:
+            if self._archive is None:
+                self._archive = Archive(self.archive_path, writable=self.mode == "record")
+            return self._archive
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+    def _count(self, **counts: int):
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    def fetch(self, key: str, live: Callable[[], Any],
+              keep: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Value of the request key: from live() or from the archive, by mode.
+
+        Args:
+            key: Request key (see request_key)
+            live: Makes the real request
+            keep: Whether a live value should be archived (e.g. not a 503)
+        """
+        if self.mode == "live":
+            return live()
+        archive = self.archive()
+        found, value, size = archive.get(key)
+        if found:
+            self._count(hits=1, bytes_read=size)
+            return value
+        if self.mode == "replay":
+            self._count(misses=1)
+            raise ReplayMiss(f"Not in the transport archive: {key}")
+        value = live()
+        if keep(value):
+            self._count(recorded=1, bytes_written=archive.put(key, value))
+        return value
+
+    ##### Clients #####
+    def yfinance_client(self):
+        if self.yfinance is None:
+            import yfinance
+            self.yfinance = yfinance
+        return self.yfinance
+
+    def requests_client(self):
+        if self.requests is None:
+            import requests
+            self.requests = requests
+        return self.requests
+
+    def ticker(self, symbol: str) -> TransportTicker:
+        """Stands in for yf.Ticker(symbol)"""
+        return TransportTicker(self, symbol)
+
+    def download(self, tickers, start=None, end=None, **kwargs):
+        """Stands in for yf.download"""
+        key = request_key("yfinance", "download", tickers, start=start, end=end, **kwargs)
+        return self.fetch(key, lambda: self.yfinance_client().download(tickers, start=start, end=end, **kwargs))
+
+    def get(self, url: str, **kwargs):
+        """Stands in for requests.get; outside live mode the response is an ArchivedResponse"""
+        if self.mode == "live":
+            return self.requests_client().get(url, **kwargs)
+        record = self.fetch(url_key(url), lambda: _http_record(self.requests_client().get(url, **kwargs)),
+                            keep=lambda record: record["status_code"] not in TRANSIENT_STATUS)
+        return ArchivedResponse(**record)
+
+    def generate_content(self, model, contents, model_name: str = None, **kwargs):
+        """
+        model.generate_content(contents) through the archive; the response only carries .text
+
+        model may also be a factory of the client, keyed by model_name: it
+        is only called when the request goes out, so a replay needs neither
+        the client library nor its API key.
+        """
+        client = model if model_name is not None else (lambda: model)
+        if self.mode == "live":
+            return client().generate_content(contents, **kwargs)
+        text = self.fetch(prompt_key(model_name or model, contents, **kwargs),
+                          lambda: client().generate_content(contents, **kwargs).text)
+        return ArchivedResponse.from_text(text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            records = len(self._archive) if self._archive is not None else None
+        return {"mode": self.mode, "archive": self.archive_path if self.mode != "live" else None,
+                "records": records, **stats}
+
+    def clear(self):
+        """Reset the counters (the archive is kept)"""
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
+
+
+transport = Transport(os.getenv("TRANSPORT_MODE", "live"), os.getenv("TRANSPORT_ARCHIVE") or DEFAULT_ARCHIVE)
+atexit.register(transport.close)
+
+
+def add_transport_arguments(parser):
+    """Register the record/replay options on an argparse parser"""
+    parser.add_argument('--transport', type=str, choices=TRANSPORT_MODES, default=transport.mode,
+                        help='Data source: live services, record them to the archive, or replay the archive offline (default: live, or $TRANSPORT_MODE)')
+    parser.add_argument('--archive', type=str, default=transport.archive_path,
+                        help='Transport archive file for --transport record/replay (default: src/data/transport/archive.bin, or $TRANSPORT_ARCHIVE)')
+
+
+def configure_from_args(args):
+    transport.configure(args.transport, args.archive)